@@ -13,6 +13,13 @@ fi
 
 echo "WORKER_NUM=$WORKER_NUM"
 
+# threads per worker, long-polling and streaming job status requests hold a thread each
+if [ -z "$WORKER_THREADS" ]; then
+  WORKER_THREADS=4
+fi
+
+echo "WORKER_THREADS=$WORKER_THREADS"
+
 # set port
 if [ "$IS_HOST_NETWORK" = "1" ] && [ "$PORT0" ]; then
   PORT=$PORT0
@@ -31,11 +38,20 @@ fi
 
 echo "RELOAD_PARAM=$RELOAD_PARAM"
 
+# metrics of all gunicorn workers and task executors are aggregated through this directory
+if [ -z "$PROMETHEUS_MULTIPROC_DIR" ]; then
+  PROMETHEUS_MULTIPROC_DIR=/tmp/petplatform_metrics
+fi
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+export PROMETHEUS_MULTIPROC_DIR
+
+echo "PROMETHEUS_MULTIPROC_DIR=$PROMETHEUS_MULTIPROC_DIR"
+
 # initialize database
 python initialize_database.py
 
 # start app server with gunicorn
-python -m gunicorn app:app --workers $WORKER_NUM --bind "[::]:$PORT" $RELOAD_PARAM --timeout 60 --graceful-timeout 10 &
+python -m gunicorn app:app --workers $WORKER_NUM --threads $WORKER_THREADS --bind "[::]:$PORT" $RELOAD_PARAM --timeout 60 --graceful-timeout 10 &
 
 PID=$!
 trap 'echo "Stopping"; kill $PID' TERM INT
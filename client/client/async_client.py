@@ -0,0 +1,234 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Dict, Iterable, List, Mapping, Tuple
+
+try:
+    import aiohttp
+except ImportError as e:
+    raise ImportError(
+        "AsyncPlatformClient requires aiohttp, install it with `pip install petplatform-client[async]`") from e
+
+from .client import FINISHED_STATUS
+
+
+class AsyncPlatformClient:
+    """
+    asyncio counterpart of PlatformClient for drivers managing many jobs from one process.
+    All the calls share one pooled session, use it as an async context manager or call close().
+
+    Requests rejected with 429 are retried after their Retry-After, failed connects are always retried,
+    other failures only for read-only or idempotent calls so a job is never submitted twice.
+    """
+
+    def __init__(self,
+                 server_url: str,
+                 jwt_token: str,
+                 max_connections: int = 100,
+                 max_retries: int = 3,
+                 timeout: float = 30,
+                 max_retry_after: float = 60):
+        self._server_url = server_url.rstrip("/")
+        self._jwt_token = jwt_token
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+        self._session: "aiohttp.ClientSession" = None
+        # job_id -> (etag, job details) of the last fetched details
+        self._job_cache: Dict[str, Tuple[str, Dict]] = {}
+
+    def __repr__(self):
+        return f"AsyncPlatformClient({self._server_url}, {self._jwt_token})"
+
+    async def __aenter__(self) -> "AsyncPlatformClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # created lazily, a session must be bound to a running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"Authorization": f"Bearer {self._jwt_token}"},
+                                                  connector=aiohttp.TCPConnector(limit=self.max_connections),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def _backoff(self, attempt: int) -> float:
+        return min(0.5 * 2**attempt, self.max_retry_after) * random.uniform(0.5, 1.5)
+
+    async def _request(self,
+                       method: str,
+                       endpoint: str,
+                       params: Dict = None,
+                       json: Dict = None,
+                       headers: Dict = None,
+                       timeout: float = None,
+                       idempotent: bool = True) -> Tuple[int, Mapping, Dict]:
+        url = f"{self._server_url}/{endpoint.lstrip('/')}"
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout is not None else None
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().request(method,
+                                                       url,
+                                                       params=params,
+                                                       json=json,
+                                                       headers=headers,
+                                                       timeout=request_timeout) as response:
+                    retryable = response.status == 429 or (response.status >= 500 and idempotent)
+                    if retryable and attempt < self.max_retries:
+                        retry_after = response.headers.get("Retry-After")
+                        delay = float(retry_after) if retry_after else self._backoff(attempt)
+                        if delay <= self.max_retry_after:
+                            logging.debug(f"{method} {url} returned {response.status}, retry in {delay:.1f}s")
+                            attempt += 1
+                            await asyncio.sleep(delay)
+                            continue
+                    # the headers are case-insensitive, proxies and servers spell e.g. ETag differently
+                    if response.status == 304:
+                        return response.status, response.headers.copy(), {}
+                    body = await response.json(content_type=None)
+                    if not isinstance(body, dict) or body.get("success") is not True:
+                        errors = body.get("error_message", "unknown errors") if isinstance(body, dict) else body
+                        raise Exception(f"bad request: {errors}")
+                    return response.status, response.headers.copy(), body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # nothing was sent if the connect failed, otherwise the server may have handled the request
+                connect_failed = isinstance(e, aiohttp.ClientConnectorError)
+                if attempt >= self.max_retries or not (connect_failed or idempotent):
+                    raise
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt))
+
+    async def submit(self, params: Dict) -> str:
+        """
+        Submit a job and return its job id.
+        """
+        # with a job id in params, a retried submit is rejected by the server instead of creating a second job
+        idempotent = "job_id" in params
+        try:
+            _, _, body = await self._request("POST", "api/v1/jobs", json=params, idempotent=idempotent)
+        except Exception:
+            # e.g. the first attempt created the job before failing, and the retry was rejected as a duplicate
+            if not idempotent or not await self._exists(params["job_id"]):
+                raise
+            logging.info(f"job {params['job_id']} was created by an earlier attempt of its submit")
+            return params["job_id"]
+        return body["job_id"]
+
+    async def _exists(self, job_id: str) -> bool:
+        try:
+            await self.get(job_id)
+            return True
+        except Exception:
+            return False
+
+    async def rerun(self, job_id: str) -> bool:
+        await self._request("POST", f"api/v1/jobs/{job_id}/rerun")
+        return True
+
+    async def cancel(self, job_id: str) -> bool:
+        await self._request("POST", f"api/v1/jobs/{job_id}/cancel")
+        return True
+
+    async def get(self, job_id: str) -> Dict:
+        # revalidate the cached details, the server answers 304 without a body if the job has not changed
+        cached = self._job_cache.get(job_id)
+        headers = {"If-None-Match": cached[0]} if cached is not None else None
+        status, response_headers, body = await self._request("GET", f"api/v1/jobs/{job_id}", headers=headers)
+        if status == 304:
+            return cached[1]
+        if response_headers.get("ETag"):
+            self._job_cache[job_id] = (response_headers["ETag"], body["job"])
+        return body["job"]
+
+    async def get_all(self, status: str = None, hours: int = 24, limit: int = 10) -> List:
+        params = {"hours": hours, "limit": limit}
+        if status is not None:
+            params["status"] = status
+        _, _, body = await self._request("GET", "api/v1/jobs", params=params)
+        return body["jobs"]
+
+    async def batch_get(self, job_ids: List[str]) -> Dict:
+        _, _, body = await self._request("POST", "api/v1/jobs:batchGet", json={"job_ids": job_ids})
+        return {"jobs": body["jobs"], "not_found": body["not_found"]}
+
+    async def batch_submit(self, params_list: List[Dict]) -> List[str]:
+        idempotent = all("job_id" in params for params in params_list)
+        _, _, body = await self._request("POST",
+                                         "api/v1/jobs:batchSubmit",
+                                         json={"jobs": params_list},
+                                         idempotent=idempotent)
+        return body["job_ids"]
+
+    async def batch_cancel(self, job_ids: List[str]) -> Dict:
+        _, _, body = await self._request("POST", "api/v1/jobs:batchCancel", json={"job_ids": job_ids})
+        return {"cancelled": body["cancelled"], "not_found": body["not_found"]}
+
+    async def gather(self, aws: Iterable[Awaitable], limit: int = None, return_exceptions: bool = False) -> List:
+        """
+        Like asyncio.gather, but with at most `limit` (default max_connections) awaitables in flight,
+        e.g. `await client.gather([client.get(job_id) for job_id in job_ids], limit=50)`.
+        """
+        semaphore = asyncio.Semaphore(limit or self.max_connections)
+
+        async def run(aw: Awaitable):
+            async with semaphore:
+                return await aw
+
+        return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
+
+    async def wait(self,
+                   job_id: str,
+                   timeout: float = None,
+                   min_interval: float = 1,
+                   max_interval: float = 60,
+                   factor: float = 1.5) -> Dict:
+        """
+        Poll the job until it finishes and return its details, raise TimeoutError if it is still running
+        after timeout. The interval grows by factor while nothing changes and drops back to min_interval
+        on every change. Unchanged polls are answered with an empty 304, so thousands of waiters stay cheap.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        interval, last_job = min_interval, None
+        while True:
+            job = await self.get(job_id)
+            if job["job_status"] in FINISHED_STATUS:
+                return job
+            # get() returns the very same cached object as long as the server answers 304
+            interval = min_interval if job is not last_job else min(interval * factor, max_interval)
+            last_job = job
+            if deadline is not None:
+                if time.time() >= deadline:
+                    raise TimeoutError(f"job {job_id} is still running after {timeout} seconds")
+                interval = min(interval, max(deadline - time.time(), 0))
+            # jitter spreads the polls of jobs submitted together
+            await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+
+    async def submit_and_wait(self, params: Dict, timeout: float = None, **kwargs) -> Dict:
+        """
+        Submit a job and wait for it to finish, see wait() for the polling options.
+        """
+        job_id = await self.submit(params)
+        return await self.wait(job_id, timeout=timeout, **kwargs)
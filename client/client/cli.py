@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from datetime import datetime
 import os
 import json
 
@@ -74,6 +75,50 @@ def submit(ctx, json_file, json_string):
     click.echo(success)
 
 
+@cli.command(help="submit a list of jobs in one request")
+@click.option("--json-file",
+              type=click.Path(exists=True),
+              required=True,
+              help="path to a json file with a list of params")
+@click.pass_context
+def batch_submit(ctx, json_file):
+    client = ctx.obj["client"]
+    try:
+        with open(json_file, "r") as f:
+            params_list = json.load(f)
+    except Exception as e:
+        raise click.UsageError(f"not a valid json format file: {e}")
+    if not isinstance(params_list, list):
+        raise click.UsageError("the json file must contain a list of job parameters")
+
+    job_ids = client.batch_submit(params_list)
+    click.echo(job_ids)
+
+
+@cli.command(help="queue a small predict request, merged with others of the same model into one job")
+@click.option("--json-file", type=click.Path(exists=True), required=True, help="path to a json file")
+@click.pass_context
+def predict(ctx, json_file):
+    client = ctx.obj["client"]
+    try:
+        with open(json_file, "r") as f:
+            params = json.load(f)
+    except Exception as e:
+        raise click.UsageError(f"not a valid json format file: {e}")
+
+    request_id = client.predict(params)
+    click.echo(request_id)
+
+
+@cli.command(help="get the status and outputs of a predict request")
+@click.argument("request-id")
+@click.pass_context
+def get_prediction(ctx, request_id):
+    client = ctx.obj["client"]
+    prediction = client.get_prediction(request_id)
+    click.echo(prediction)
+
+
 @cli.command(help="cancel a running job")
 @click.argument("job-id")
 @click.pass_context
@@ -83,6 +128,15 @@ def cancel(ctx, job_id):
     click.echo(success)
 
 
+@cli.command(help="cancel a list of running jobs in one request")
+@click.argument("job-ids", nargs=-1, required=True)
+@click.pass_context
+def batch_cancel(ctx, job_ids):
+    client = ctx.obj["client"]
+    result = client.batch_cancel(list(job_ids))
+    click.echo(result)
+
+
 @cli.command(help="rerun a failed/canceled job")
 @click.argument("job-id")
 @click.pass_context
@@ -94,11 +148,55 @@ def rerun(ctx, job_id):
 
 @cli.command(help="get job info")
 @click.argument("job-id")
+@click.option("--timings", is_flag=True, default=False, help="show how long each task spent in each phase")
 @click.pass_context
-def get_job(ctx, job_id):
+def get_job(ctx, job_id, timings):
     client = ctx.obj["client"]
     job = client.get(job_id)
     click.echo(job)
+    if timings:
+        for task in job.get("task_details", []):
+            click.echo(f"{task['name']}:")
+            phases = [(phase, datetime.fromisoformat(value)) for phase, value in task.get("timings", {}).items()]
+            # the server returns the phases sorted by name, put them back in the order they happened
+            phases.sort(key=lambda item: item[1])
+            for (_, prev_time), (phase, phase_time) in zip(phases, phases[1:]):
+                click.echo(f"  {phase:<28}+{(phase_time - prev_time).total_seconds():.3f}s")
+            if len(phases) > 1:
+                click.echo(f"  {'total':<28}{(phases[-1][1] - phases[0][1]).total_seconds():.3f}s")
+
+
+@cli.command(help="get info of a list of jobs in one request")
+@click.argument("job-ids", nargs=-1, required=True)
+@click.pass_context
+def batch_get(ctx, job_ids):
+    client = ctx.obj["client"]
+    result = client.batch_get(list(job_ids))
+    click.echo(result)
+
+
+@cli.command(help="print the job details every time the job or one of its tasks changes, until it finishes")
+@click.argument("job-id")
+@click.pass_context
+def watch(ctx, job_id):
+    client = ctx.obj["client"]
+    for job in client.watch(job_id):
+        click.echo(job)
+
+
+@cli.command(help="wait for a job to finish, exit with a non-zero code if it did not succeed")
+@click.argument("job-id")
+@click.option("--timeout", type=float, default=None, help="give up after the given seconds")
+@click.pass_context
+def wait(ctx, job_id, timeout):
+    client = ctx.obj["client"]
+    try:
+        job = client.wait(job_id, timeout=timeout)
+    except TimeoutError as e:
+        click.echo(str(e))
+        ctx.exit(2)
+    click.echo(job)
+    ctx.exit(0 if job["job_status"] == "SUCCESS" else 1)
 
 
 @cli.command(help="list a limited number of jobs submitted in the past hours with given status")
@@ -116,5 +214,56 @@ def get_jobs(ctx, status, hours, limit):
     click.echo(response)
 
 
+@cli.command(help="export jobs in creation order as json lines, following the server side cursor")
+@click.option("--output",
+              type=click.Path(dir_okay=False),
+              default=None,
+              help="append to the given file instead of stdout")
+@click.option("--status", type=str, default=None, help="only export jobs with the given status")
+@click.option("--hours", type=int, default=None, help="only export jobs submitted within the past given hours")
+@click.option("--details", is_flag=True, default=False, help="include the task details and timings of each job")
+@click.option("--finished", is_flag=True, default=False, help="only export jobs once they have finished")
+@click.option("--cursor", type=int, default=0, help="resume after the cursor of the last exported job")
+@click.option("--page-size", type=int, default=100, help="number of jobs fetched per request")
+@click.option("--follow", is_flag=True, default=False, help="keep polling for new jobs")
+@click.option("--interval", type=float, default=10, help="seconds between two polls in follow mode")
+@click.pass_context
+def export_jobs(ctx, output, status, hours, details, finished, cursor, page_size, follow, interval):
+    client = ctx.obj["client"]
+    jobs = client.iter_jobs(status=status,
+                            hours=hours,
+                            details=details,
+                            finished=finished,
+                            cursor=cursor,
+                            page_size=page_size,
+                            follow=follow,
+                            poll_interval=interval)
+    with click.open_file(output or "-", "a" if output else "w") as f:
+        for job in jobs:
+            f.write(json.dumps(job) + "\n")
+            # flush per line, so a follower or a crash never loses exported jobs
+            f.flush()
+
+
+@cli.command(help="list the resource usage of the latest tasks of a mission")
+@click.argument("mission-name")
+@click.option("--limit", type=int, default=20, help="only show the latest tasks within the given limit")
+@click.option("--samples", is_flag=True, default=False, help="include the sampled time series of each task")
+@click.pass_context
+def get_mission_resources(ctx, mission_name, limit, samples):
+    client = ctx.obj["client"]
+    resources = client.get_mission_resources(mission_name, limit, samples)
+    click.echo(resources)
+
+
+@cli.command(help="show the health of the partner parties, admin only")
+@click.option("--refresh", is_flag=True, default=False, help="ping the partners before showing their health")
+@click.pass_context
+def get_parties_health(ctx, refresh):
+    client = ctx.obj["client"]
+    parties = client.get_parties_health(refresh)
+    click.echo(parties)
+
+
 if __name__ == "__main__":
     cli(obj={})
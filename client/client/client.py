@@ -11,16 +11,22 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Dict, List
+import json
+import time
+from typing import Dict, Iterator, List, Tuple
 
 from .utils.request_utils import get, post
 
+FINISHED_STATUS = ["SUCCESS", "FAILED", "CANCELED"]
+
 
 class PlatformClient:
 
     def __init__(self, server_url: str, jwt_token: str):
         self._server_url = server_url
         self._jwt_token = jwt_token
+        # job_id -> (etag, job details) of the last fetched details
+        self._job_cache: Dict[str, Tuple[str, Dict]] = {}
 
     def __str__(self):
         return f"PlatformClient instance with server_url={self._server_url} and jwt_token={self._jwt_token}"
@@ -43,6 +49,33 @@ class PlatformClient:
             raise Exception(f"bad request: {errors}")
         return True
 
+    def batch_submit(self, params_list: List[Dict]) -> List[str]:
+        address = self._get_address()
+        headers = self._get_headers()
+        response = post(address, "api/v1/jobs:batchSubmit", json={"jobs": params_list}, headers=headers)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return response["job_ids"]
+
+    def predict(self, params: Dict) -> str:
+        address = self._get_address()
+        headers = self._get_headers()
+        response = post(address, "api/v1/predictions", json=params, headers=headers)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return response["request_id"]
+
+    def get_prediction(self, request_id: str) -> Dict:
+        address = self._get_address()
+        headers = self._get_headers()
+        response = get(address, f"api/v1/predictions/{request_id}", headers=headers, return_json=True)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return response["prediction"]
+
     def rerun(self, job_id: str) -> bool:
         address = self._get_address()
         headers = self._get_headers()
@@ -61,14 +94,93 @@ class PlatformClient:
             raise Exception(f"bad request: {errors}")
         return True
 
+    def batch_cancel(self, job_ids: List[str]) -> Dict:
+        address = self._get_address()
+        headers = self._get_headers()
+        response = post(address, "api/v1/jobs:batchCancel", json={"job_ids": job_ids}, headers=headers)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return {"cancelled": response["cancelled"], "not_found": response["not_found"]}
+
     def get(self, job_id: str) -> Dict:
         address = self._get_address()
         headers = self._get_headers()
-        response = get(address, f"api/v1/jobs/{job_id}", headers=headers, return_json=True)
+        # revalidate the cached details, the server answers 304 without a body if the job has not changed
+        cached = self._job_cache.get(job_id)
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+        response = get(address, f"api/v1/jobs/{job_id}", headers=headers, return_json=False)
+        if response.status_code == 304:
+            return cached[1]
+        response_json = response.json()
+        if response_json.get("success") is not True:
+            errors = response_json.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        if response.headers.get("ETag"):
+            self._job_cache[job_id] = (response.headers["ETag"], response_json["job"])
+        return response_json["job"]
+
+    def batch_get(self, job_ids: List[str]) -> Dict:
+        address = self._get_address()
+        headers = self._get_headers()
+        response = post(address, "api/v1/jobs:batchGet", json={"job_ids": job_ids}, headers=headers)
         if response.get("success") is not True:
             errors = response.get("error_message", "unknown errors")
             raise Exception(f"bad request: {errors}")
-        return response["job"]
+        return {"jobs": response["jobs"], "not_found": response["not_found"]}
+
+    def wait(self, job_id: str, timeout: float = None, poll_timeout: float = 30) -> Dict:
+        """
+        Block until the job finishes and return its details, raise TimeoutError if it is still running after timeout.
+        Built on long-polling, each request returns as soon as the job changes.
+        """
+        address = self._get_address()
+        headers = self._get_headers()
+        deadline = None if timeout is None else time.time() + timeout
+        since_version, job = 0, None
+        while True:
+            wait_timeout = poll_timeout if deadline is None else max(min(poll_timeout, deadline - time.time()), 0)
+            response = get(address,
+                           f"api/v1/jobs/{job_id}/events",
+                           headers=headers,
+                           params={
+                               "since_version": since_version,
+                               "timeout": wait_timeout
+                           },
+                           timeout=wait_timeout + 10,
+                           return_json=True)
+            if response.get("success") is not True:
+                errors = response.get("error_message", "unknown errors")
+                raise Exception(f"bad request: {errors}")
+            if response["changed"]:
+                since_version, job = response["version"], response["job"]
+            if job is not None and job["job_status"] in FINISHED_STATUS:
+                return job
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(f"job {job_id} is still running after {timeout} seconds")
+
+    def watch(self, job_id: str, since_version: int = 0, timeout: float = 300) -> Iterator[Dict]:
+        """
+        Yield the job details every time a job or task status changes, until the job finishes
+        or the server closes the stream after timeout.
+        """
+        address = self._get_address()
+        headers = self._get_headers()
+        headers["Accept"] = "text/event-stream"
+        response = get(address,
+                       f"api/v1/jobs/{job_id}/events",
+                       headers=headers,
+                       params={
+                           "since_version": since_version,
+                           "timeout": timeout
+                       },
+                       timeout=timeout + 10,
+                       stream=True)
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[len("data: "):])
 
     def get_all(self, status: str = None, hours: int = 24, limit: int = 10) -> List:
         address = self._get_address()
@@ -83,3 +195,62 @@ class PlatformClient:
             errors = response.get("error_message", "unknown errors")
             raise Exception(f"bad request: {errors}")
         return response["jobs"]
+
+    def iter_jobs(self,
+                  status: str = None,
+                  hours: int = None,
+                  details: bool = False,
+                  finished: bool = False,
+                  cursor: int = 0,
+                  page_size: int = 100,
+                  follow: bool = False,
+                  poll_interval: float = 10) -> Iterator[Dict]:
+        """
+        Yield the jobs in creation order page by page, following the server side cursor. Each job carries
+        its "cursor", pass the last one back to resume. With follow=True, keep polling for new jobs forever,
+        combine it with finished=True to get every job once, in its final state.
+        """
+        address = self._get_address()
+        headers = self._get_headers()
+        params = {"limit": page_size, "details": str(details).lower(), "finished": str(finished).lower()}
+        if status is not None:
+            params["status"] = status
+        if hours is not None:
+            params["hours"] = hours
+        while True:
+            params["cursor"] = cursor
+            response = get(address, "api/v1/jobs", headers=headers, params=params, return_json=True)
+            if response.get("success") is not True:
+                errors = response.get("error_message", "unknown errors")
+                raise Exception(f"bad request: {errors}")
+            yield from response["jobs"]
+            cursor = response["next_cursor"]
+            # the server caps the page size, only its flag tells whether the export has caught up
+            if not response.get("has_more", len(response["jobs"]) >= page_size):
+                if not follow:
+                    return
+                time.sleep(poll_interval)
+
+    def get_mission_resources(self, mission_name: str, limit: int = 20, samples: bool = False) -> List:
+        address = self._get_address()
+        headers = self._get_headers()
+        params = {"limit": limit, "samples": str(samples).lower()}
+        response = get(address,
+                       f"api/v1/missions/{mission_name}/resources",
+                       headers=headers,
+                       params=params,
+                       return_json=True)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return response["resources"]
+
+    def get_parties_health(self, refresh: bool = False) -> Dict:
+        address = self._get_address()
+        headers = self._get_headers()
+        params = {"refresh": str(refresh).lower()}
+        response = get(address, "api/v1/parties/health", headers=headers, params=params, return_json=True)
+        if response.get("success") is not True:
+            errors = response.get("error_message", "unknown errors")
+            raise Exception(f"bad request: {errors}")
+        return response["parties"]
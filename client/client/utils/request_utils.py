@@ -15,7 +15,16 @@ import logging
 from typing import Dict
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout
+from urllib3.util.retry import Retry
+
+# one pooled session per process, so repeated calls reuse their connections.
+# only failed connects are retried, the request never reached the server so it is safe for every method
+_retry = Retry(total=3, connect=3, read=0, status=0, allowed_methods=None, backoff_factor=0.5)
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=_retry))
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=_retry))
 
 
 def send_request(method: str,
@@ -26,20 +35,22 @@ def send_request(method: str,
                  json: Dict = None,
                  data=None,
                  timeout=10,
-                 return_json=True):
+                 return_json=True,
+                 stream=False):
     url = "{address}/{endpoint}".format(address=address, endpoint=endpoint.lstrip('/'))
     request_headers = {"Content-Type": "application/json"}
     if headers:
         request_headers.update(headers)
     try:
         logging.debug(f"send {method} request to {url}, params={params}, json={json}, data={data}, headers={headers}")
-        response = requests.request(method,
+        response = _session.request(method,
                                     url,
                                     params=params,
                                     json=json,
                                     data=data,
                                     headers=request_headers,
-                                    timeout=timeout)
+                                    timeout=timeout,
+                                    stream=stream)
     except Timeout:
         logging.error(f"{method} request timed out: {address}/{endpoint}, headers={headers}, json={json}, data={data}")
         raise
@@ -55,8 +66,11 @@ def send_request(method: str,
                       f"data={data}")
         response.raise_for_status()
 
-    logging.debug(f"response: {response.json()}")
-    return response.json() if return_json else response
+    if not return_json:
+        return response
+    response_json = response.json()
+    logging.debug(f"response: {response_json}")
+    return response_json
 
 
 def delete(address: str,
@@ -69,8 +83,23 @@ def delete(address: str,
     return send_request("DELETE", address, endpoint, params, headers, json, None, timeout, return_json)
 
 
-def get(address: str, endpoint: str, params: Dict = None, headers: Dict = None, timeout=10, return_json=False):
-    return send_request("GET", address, endpoint, params, headers, None, None, timeout, return_json=return_json)
+def get(address: str,
+        endpoint: str,
+        params: Dict = None,
+        headers: Dict = None,
+        timeout=10,
+        return_json=False,
+        stream=False):
+    return send_request("GET",
+                        address,
+                        endpoint,
+                        params,
+                        headers,
+                        None,
+                        None,
+                        timeout,
+                        return_json=return_json,
+                        stream=stream)
 
 
 def patch(address: str,
@@ -22,6 +22,7 @@ setup(
     packages=find_packages('.', exclude=['tests']),
     package_dir={'': '.'},
     install_requires=['click', 'python-dotenv', 'requests'],
+    extras_require={'async': ['aiohttp>=3.8']},
     entry_points={
         'console_scripts': ['petplatform-cli=client.cli:cli'],
     },
@@ -16,18 +16,38 @@ import logging.config
 import flask
 from flask_sqlalchemy import SQLAlchemy
 
+from job_manager.party_monitor import party_monitor
+from job_manager.predict_batch import predict_batcher
+from job_manager.scheduler import scheduler
+from job_manager.service_supervisor import compiler_supervisor
 from models.base import Base
+import monitor
 import settings
+import tracing
 from views.default_views import default_views
 from views.v1 import v1
 
 logging.config.dictConfig(settings.LOGGING_CONFIG)
 app = flask.Flask(__name__)
+monitor.init_app(app)
+tracing.init_app(app)
 app.register_blueprint(default_views)
 app.register_blueprint(v1)
 app.config['SQLALCHEMY_DATABASE_URI'] = settings.PLATFORM_DB_URI
 db = SQLAlchemy(app=app, model_class=Base)
 
+if settings.SCHEDULER_INTERVAL > 0:
+    scheduler.start()
+
+if settings.PREDICT_BATCH_INTERVAL > 0:
+    predict_batcher.start()
+
+if settings.PETSQL_COMPILER_ENTRY:
+    compiler_supervisor.start()
+
+if settings.PARTY_PING_INTERVAL > 0:
+    party_monitor.start()
+
 if __name__ == '__main__':
     # Never run debug mode in production environment!
     app.run(debug=False)
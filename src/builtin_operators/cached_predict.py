@@ -0,0 +1,85 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import importlib
+import logging
+from typing import Dict, Tuple
+
+from job_manager.model_cache import model_cache
+
+
+def _import(path: Tuple[str, str]):
+    module_name, class_name = path
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+@contextlib.contextmanager
+def cached_model_loads(model_class):
+    """
+    Serve the load_model(model_path) of model_class from the model cache of the executor while the context is
+    open. The attributes a load sets on the model are cached, and set on the next models loaded from the same
+    file instead of reading and parsing it again. They are shared by these models, which only read them.
+    """
+    own = "load_model" in vars(model_class)
+    original = model_class.load_model
+
+    def load_model(model, model_path: str, *args, **kwargs):
+
+        def loader(path: str) -> Dict:
+            original(model, path, *args, **kwargs)
+            return dict(vars(model))
+
+        vars(model).update(model_cache.load(model_path, loader))
+
+    model_class.load_model = load_model
+    try:
+        yield
+    finally:
+        if own:
+            model_class.load_model = original
+        else:
+            del model_class.load_model
+
+
+class CachedModelPredict:
+    """
+    A predict operator of petml, operator, whose model, an instance of model, is loaded through the model cache
+    of the executor. Run in a long-lived executor, "executor: pooled" in the mission, the next tasks predicting
+    with the same model file skip loading it.
+    """
+
+    operator: Tuple[str, str] = None
+    model: Tuple[str, str] = None
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+        self.kwargs = kwargs
+
+    def run(self, configmap: Dict) -> bool:
+        operator_class = _import(self.operator)
+        with cached_model_loads(_import(self.model)):
+            success = operator_class(party=self.party, config_manager=self.config_manager, **self.kwargs).run(configmap)
+        logging.info(f"{len(model_cache)} models cached in the executor, {model_cache.size} bytes")
+        return success
+
+
+class XGBoostClassifierPredict(CachedModelPredict):
+    operator = ("petml.operators.boosting", "XGBoostClassifierPredict")
+    model = ("petml.fl.boosting", "XGBoostClassifier")
+
+
+class XGBoostRegressorPredict(CachedModelPredict):
+    operator = ("petml.operators.boosting", "XGBoostRegressorPredict")
+    model = ("petml.fl.boosting", "XGBoostRegressor")
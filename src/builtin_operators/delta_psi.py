@@ -0,0 +1,182 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+import json
+import logging
+import os
+from typing import Dict, Union
+
+from constants import TimeDuration
+from extensions import get_session_maker
+from job_manager.scratch import JobScratch, leftover_job_ids
+import settings
+from utils.artifact_utils import ARROW, CSV, PARQUET
+from utils.sorted_file_utils import diff_sorted, read_ids, sort_unique
+
+
+class DeltaPSIState:
+    """
+    The snapshot of the ids and the intersection of the last successful delta PSI run of a party, kept in the
+    mission cache dir and indexed in the mission context.
+    """
+
+    def __init__(self, config_manager, party: str):
+        self.mission_context = config_manager.mission_context
+        self.key = f"delta_psi.{party}"
+        self.state_dir = os.path.join(settings.MISSION_CACHE_DIR, config_manager.mission_name, "delta_psi", party)
+
+    def get(self) -> Union[Dict, None]:
+        value = self.mission_context.get(self.key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, state: Dict):
+        previous = self.get() or {}
+        if not self.mission_context.set(self.key, json.dumps(state), expire_time=TimeDuration.MONTH):
+            raise RuntimeError(f"fail to save {self.key}, updated by another job")
+        for name in ["snapshot", "intersection"]:
+            if previous.get(name) and previous[name] != state[name] and os.path.isfile(previous[name]):
+                os.remove(previous[name])
+
+    def prune(self) -> int:
+        """
+        Remove the snapshots and intersections no state refers to, left by the runs that failed or were
+        canceled, once their job is over, see leftover_job_ids. Return the number of files removed.
+        """
+        if not os.path.isdir(self.state_dir):
+            return 0
+        current = self.get() or {}
+        paths = {
+            os.path.join(self.state_dir, name): name.rsplit(".", 1)[0]
+            for name in os.listdir(self.state_dir)
+            if os.path.join(self.state_dir, name) not in (current.get("snapshot"), current.get("intersection"))
+        }
+        leftovers = leftover_job_ids(get_session_maker(), sorted(set(paths.values())))
+        removed = 0
+        for path, job_id in paths.items():
+            if job_id in leftovers:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def path(self, job_id: str, name: str) -> str:
+        os.makedirs(self.state_dir, mode=0o700, exist_ok=True)
+        return os.path.join(self.state_dir, f"{job_id}.{name}")
+
+
+def _is_reset(configmap: Dict, party: str) -> bool:
+    # "delta_psi": {"reset": true} in mission_params starts over from a full run
+    options = configmap.get(party, {}).get("delta_psi", configmap.get("common", {}).get("delta_psi")) or {}
+    return bool(options.get("reset"))
+
+
+def reads_psi_cache(configmap: Dict, party: str) -> bool:
+    """
+    Whether the PSI operator of the mission, "<module>:<class>" in configmap[party]["psi_operator"], declares
+    supports_psi_cache = True, i.e. only runs the crypto for the added ids of configmap[party]["psi_cache"].
+    """
+    operator = configmap.get(party, {}).get("psi_operator")
+    if not operator:
+        return False
+    module_name, class_name = operator.split(":")
+    return bool(getattr(getattr(importlib.import_module(module_name), class_name), "supports_psi_cache", False))
+
+
+class DeltaPSIPrepare:
+    """
+    Diff the input ids of the party against the snapshot of the last run. The added and removed ids are
+    written to the scratch dir of the job and published in the job context as delta_psi.added and delta_psi.removed,
+    for the PSI operator to only run the expensive crypto for added ids. Skipped when the PSI operator does not
+    read them, see reads_psi_cache, a full PSI then runs without the cost of sorting and diffing the ids.
+    """
+
+    # local to this party, no need to wait for the partners at the start barrier
+    start_barrier = False
+    artifact_formats = [CSV, ARROW, PARQUET]
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config = configmap[self.party]
+        job_id = self.config_manager.job_id
+        state = DeltaPSIState(self.config_manager, self.party)
+        previous = None if _is_reset(configmap, self.party) else state.get()
+        if not reads_psi_cache(configmap, self.party):
+            logging.info(f"{job_id} the PSI operator of {self.party} does not read psi_cache, run a full PSI")
+            delta = {"snapshot": None, "added": None, "removed": None, "full": True}
+            self.config_manager.job_context.set("delta_psi", delta, party=self.party)
+            return True
+
+        snapshot_path = state.path(job_id, "snapshot")
+        num_ids = sort_unique(read_ids(party_config["inputs"]["data"], party_config.get("column_name")), snapshot_path)
+        # intermediate artifacts, removed along with the scratch dir of the job
+        scratch_dir = JobScratch(job_id).create()
+        added_path = os.path.join(scratch_dir, f"{self.party}_delta_added")
+        removed_path = os.path.join(scratch_dir, f"{self.party}_delta_removed")
+        num_added, num_removed = diff_sorted(snapshot_path, previous and previous["snapshot"], added_path, removed_path)
+        logging.info(f"{job_id} delta psi of {self.party}: {num_ids} ids, {num_added} added, {num_removed} removed")
+        delta = {
+            "snapshot": snapshot_path,
+            "added": added_path,
+            "removed": removed_path,
+            "num_ids": num_ids,
+            "num_added": num_added,
+            "num_removed": num_removed,
+            "full": not (previous and previous["snapshot"])
+        }
+        self.config_manager.job_context.set("delta_psi", delta, party=self.party)
+        return True
+
+
+class DeltaPSIMerge:
+    """
+    Diff the intersection of this run against the one of the last run, write the ids that joined and left it
+    next to the output, then make this run the base of the next one.
+    """
+
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config = configmap[self.party]
+        job_id = self.config_manager.job_id
+        state = DeltaPSIState(self.config_manager, self.party)
+        previous = None if _is_reset(configmap, self.party) else state.get()
+        prepared = self.config_manager.job_context.get("delta_psi", party=self.party)
+
+        outputs = party_config["outputs"]
+        intersection_path = state.path(job_id, "intersection")
+        num_ids = sort_unique(read_ids(outputs["data"], party_config.get("column_name")), intersection_path)
+        added_path = outputs.get("added", os.path.join(settings.SAFE_WORK_DIR, f"{job_id}_{self.party}_psi_added"))
+        removed_path = outputs.get("removed", os.path.join(settings.SAFE_WORK_DIR,
+                                                           f"{job_id}_{self.party}_psi_removed"))
+        num_added, num_removed = diff_sorted(intersection_path, previous and previous["intersection"], added_path,
+                                             removed_path)
+        logging.info(f"{job_id} intersection of {self.party}: {num_ids} ids, {num_added} joined, {num_removed} left")
+
+        state.set({"job_id": job_id, "snapshot": prepared["snapshot"], "intersection": intersection_path})
+        state.prune()
+        intersection = {
+            "added": added_path,
+            "removed": removed_path,
+            "num_ids": num_ids,
+            "num_added": num_added,
+            "num_removed": num_removed
+        }
+        self.config_manager.job_context.set("delta_psi.intersection", intersection, party=self.party)
+        return True
@@ -0,0 +1,107 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import csv
+import itertools
+import logging
+import os
+from typing import Dict
+
+
+class ConcatInputs:
+    """
+    Concatenate the predict data of the requests of a batch, configmap[party]["batch"], into outputs.data in the
+    order of the batch. The files must share the same header, which is written once. The number of rows of each
+    request is published in the common job context, for SplitOutputs to split the results back.
+    """
+
+    # only moves files of this party around, nothing to start along with the partners
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config = configmap[self.party]
+        output_path = party_config["outputs"]["data"]
+        header, rows = None, []
+        with open(f"{output_path}.tmp", "w", newline="") as output:
+            writer = csv.writer(output)
+            for item in party_config["batch"]:
+                with open(item["predict_data"], "r", newline="") as f:
+                    reader = csv.reader(f)
+                    item_header = next(reader, [])
+                    if header is None:
+                        header = item_header
+                        writer.writerow(header)
+                    elif item_header != header:
+                        raise ValueError(f"header of {item['request_id']} differs from the one of the batch")
+                    count = 0
+                    for row in reader:
+                        if row:
+                            writer.writerow(row)
+                            count += 1
+                rows.append(count)
+        os.replace(f"{output_path}.tmp", output_path)
+        logging.info(f"concatenated {len(rows)} predict requests, {sum(rows)} rows of {self.party}")
+        self.config_manager.job_context.set(f"predict_batch.rows.{self.party}", rows, party="common")
+        return True
+
+
+class SplitOutputs:
+    """
+    Split the results of a batch, inputs.data, back to the inference_res_path of each request of the batch,
+    one result row per predict row in the same order, with the header of the results. Requests whose results
+    can not be written are published as predict_batch.failed in the common job context.
+    """
+
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config = configmap[self.party]
+        results_path = party_config["inputs"]["data"]
+        if not os.path.isfile(results_path):
+            # e.g. only the party holding the labels gets the predictions
+            logging.info(f"no predict results on {self.party}")
+            return True
+        rows_by_party: Dict = self.config_manager.job_context.get("predict_batch.rows", party="common") or {}
+        rows = rows_by_party.get(self.party)
+        if rows is None or any(other != rows for other in rows_by_party.values()):
+            raise ValueError(f"the parties disagree on the rows of the batch requests: {rows_by_party}")
+
+        failed = {}
+        with open(results_path, "r", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            for item, count in zip(party_config["batch"], rows):
+                results = list(itertools.islice(reader, count))
+                if len(results) != count:
+                    raise ValueError(f"{len(results)} results for the {count} rows of {item['request_id']}")
+                output_path = item["inference_res_path"]
+                try:
+                    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                    with open(f"{output_path}.tmp", "w", newline="") as output:
+                        writer = csv.writer(output)
+                        writer.writerow(header)
+                        writer.writerows(results)
+                    os.replace(f"{output_path}.tmp", output_path)
+                except OSError as e:
+                    logging.warning(f"write results of {item['request_id']} fail: {e}")
+                    failed[item["request_id"]] = str(e)
+        self.config_manager.job_context.set("predict_batch.failed", failed, party="common")
+        return True
@@ -0,0 +1,191 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import Dict, List
+
+from config.mission_cache import MissionCache
+import settings
+from utils.deep_merge import deep_merge
+
+# fields of the PETSQL config which do not change the result of a query, the table_url and engine_url are local
+# paths of each party, the tables themselves are represented by the hashes of the inputs
+_LOCAL_CONFIG_FIELDS = ("table_url", "engine_url", "task_id")
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def query_key(sql: str, config: Dict, input_hashes: Dict[str, List[str]]) -> str:
+    """
+    The cache key of a query, the same on every party, built from the query text, the PETSQL config without
+    its local fields and the hashes of the inputs of all the parties.
+    """
+    config = {k: v for k, v in (config or {}).items() if k not in _LOCAL_CONFIG_FIELDS}
+    payload = json.dumps({"sql": sql.strip(), "config": config, "inputs": input_hashes}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def common_query_key(common: Dict, input_hashes: Dict[str, List[str]]) -> str:
+    """
+    The cache key of the query of a common configmap which the query was merged into, its PETSQL config being
+    the shared config of the batch deep-merged with the config of the query.
+    """
+    return query_key(common["sql"], common.get("config"), input_hashes)
+
+
+def merge_query(common: Dict, item: Dict) -> Dict:
+    """
+    The common configmap of one query of a batch, merged the same way as by the foreach expansion.
+    """
+    return deep_merge(copy.deepcopy({k: v for k, v in common.items() if k != "queries"}), copy.deepcopy(item))
+
+
+def query_name(common: Dict) -> str:
+    return str(common.get("name") or f"query_{common.get('query_index', 0)}")
+
+
+def _result_cache(config_manager) -> MissionCache:
+    return MissionCache(config_manager.mission_name, "sql_results", ttl=settings.SQL_CACHE_TTL)
+
+
+def _input_hashes(config_manager) -> Dict[str, List[str]]:
+    hashes = config_manager.job_context.get("sql_batch.inputs", party="common") or {}
+    if not hashes:
+        raise ValueError("the inputs of the batch SQL job are not hashed")
+    return hashes
+
+
+class SQLHashInputs:
+    """
+    The shared input stage of a batch SQL job, run once for all its queries. The tables of this party,
+    inputs.data, are hashed and the hashes published in the common job context, so that every party derives
+    the same cache key for each query.
+    """
+
+    # hashing and cache lookups are local, the partners are not waited for
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        paths = configmap[self.party]["inputs"]["data"]
+        hashes = [hash_file(path) for path in (paths if isinstance(paths, list) else [paths])]
+        logging.info(f"hashed {len(hashes)} SQL inputs of {self.party}")
+        self.config_manager.job_context.set(f"sql_batch.inputs.{self.party}", hashes, party="common")
+        return True
+
+
+class SQLPlanQueries:
+    """
+    Look up the queries of a batch SQL job, common.queries, in the result cache of this party and publish the
+    keys found in the common job context. A query is only served from the cache when every party has it,
+    the others run it again on all parties.
+    """
+
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        common = configmap["common"]
+        hashes = _input_hashes(self.config_manager)
+        names = [query_name({**item, "query_index": index}) for index, item in enumerate(common["queries"])]
+        if len(set(names)) != len(names):
+            raise ValueError(f"the queries of a batch SQL job must have distinct names, got {names}")
+
+        index = _result_cache(self.config_manager).get()
+        cached = []
+        for item in common["queries"]:
+            key = common_query_key(merge_query(common, item), hashes)
+            if index is not None and os.path.isfile(os.path.join(index["dir"], key, "done")):
+                cached.append(key)
+        logging.info(f"{len(cached)} of {len(names)} queries cached on {self.party}")
+        self.config_manager.job_context.set(f"sql_batch.cached.{self.party}", cached, party="common")
+        return True
+
+
+class CachedPETSQL:
+    """
+    One query of a batch SQL job, its text and name merged into the common configmap. "{name}" in outputs.data
+    stands for the name of the query. When every party has the result cached, the cached result is copied to
+    the outputs, otherwise the query runs with PETSQL and its result is cached for the next jobs on the same
+    inputs.
+    """
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+        self.kwargs = kwargs
+        self.cache = _result_cache(config_manager)
+
+    def run(self, configmap: Dict) -> bool:
+        common, party_config = configmap["common"], configmap[self.party]
+        name = query_name(common)
+        key = common_query_key(common, _input_hashes(self.config_manager))
+        outputs = [path.replace("{name}", name) for path in party_config.get("outputs", {}).get("data", [])]
+        party_config.setdefault("outputs", {})["data"] = outputs
+
+        cached: Dict = self.config_manager.job_context.get("sql_batch.cached", party="common") or {}
+        index = self.cache.get()
+        if cached and all(key in keys for keys in cached.values()) and index is not None:
+            entry = os.path.join(index["dir"], key)
+            for i, path in enumerate(outputs):
+                shutil.copyfile(os.path.join(entry, str(i)), f"{path}.tmp")
+                os.replace(f"{path}.tmp", path)
+            logging.info(f"query {name} served from the cache of {self.party}")
+            return True
+
+        if isinstance(common.get("config"), dict) and common["config"].get("task_id"):
+            # the queries of a batch run side by side, each needs its own PETSQL task
+            common["config"] = {**common["config"], "task_id": f"{common['config']['task_id']}.{name}"}
+        from petsql.operators import PETSQL
+        success = PETSQL(party=self.party, config_manager=self.config_manager, **self.kwargs).run(configmap)
+        if success:
+            try:
+                self._store(self.cache.acquire(job_id=self.config_manager.job_id), key, outputs)
+            except Exception:
+                logging.exception(f"fail to cache the result of query {name}")
+        return success
+
+    @staticmethod
+    def _store(index: Dict, key: str, outputs: List[str]):
+        entry = os.path.join(index["dir"], key)
+        if os.path.isfile(os.path.join(entry, "done")):
+            return
+        staging = f"{entry}.{uuid.uuid4().hex[:8]}"
+        os.makedirs(staging, mode=0o700)
+        try:
+            for i, path in enumerate(outputs):
+                shutil.copyfile(path, os.path.join(staging, str(i)))
+            with open(os.path.join(staging, "done"), "w"):
+                pass
+            os.rename(staging, entry)
+        except OSError:
+            # e.g. a concurrent job stored the same query first
+            shutil.rmtree(staging, ignore_errors=True)
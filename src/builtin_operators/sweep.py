@@ -0,0 +1,142 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import csv
+import json
+import logging
+import math
+import os
+import shutil
+from typing import Dict, List
+
+from job_manager.sweep import expand_candidates
+
+# metrics of the candidates of a sweep, and whether higher is better
+METRICS = {"auc": True, "rmse": False, "mae": False}
+
+
+def _auc(labels: List[float], scores: List[float]) -> float:
+    # rank statistic, ties get their average rank, threshold free so raw margins and probabilities both work
+    order = sorted(range(len(scores)), key=lambda i: scores[i])
+    ranks = [0.0] * len(scores)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and scores[order[j + 1]] == scores[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    positives = sum(1 for label in labels if label > 0)
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        raise ValueError("auc needs both positive and negative labels")
+    rank_sum = sum(rank for rank, label in zip(ranks, labels) if label > 0)
+    return (rank_sum - positives * (positives + 1) / 2) / (positives * negatives)
+
+
+def compute_metric(metric: str, labels: List[float], scores: List[float]) -> float:
+    if len(labels) != len(scores):
+        raise ValueError(f"{len(scores)} predictions for {len(labels)} labels")
+    if metric == "auc":
+        return _auc(labels, scores)
+    if metric == "rmse":
+        return math.sqrt(sum((s - y)**2 for y, s in zip(labels, scores)) / len(labels))
+    if metric == "mae":
+        return sum(abs(s - y) for y, s in zip(labels, scores)) / len(labels)
+    raise ValueError(f"unknown metric {metric}, expect one of {list(METRICS)}")
+
+
+def _read_column(path: str, column_name: str = None) -> List[float]:
+    """
+    A column of a csv file with a header, its last column by default.
+    """
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        index = header.index(column_name) if column_name is not None else len(header) - 1
+        return [float(row[index]) for row in reader if row]
+
+
+class SweepEvaluate:
+    """
+    Score the predictions of every candidate of a sweep, inputs.predictions with "{index}" standing for the index
+    of the candidate, against the labels of the validation data, inputs.predict_data. Only the party holding the
+    labels, column label_name, scores them, the scores are published in the common job context.
+    """
+
+    # scores the predictions already written, without a network session
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config, spec = configmap[self.party], configmap["common"]["sweep"]
+        metric = spec.get("metric", "auc")
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric}, expect one of {list(METRICS)}")
+        label_name = party_config.get("label_name", "label")
+        valid_data = party_config["inputs"]["predict_data"]
+        with open(valid_data, "r", newline="") as f:
+            header = next(csv.reader(f), [])
+        if label_name not in header:
+            logging.info(f"{self.party} holds no label, leave the evaluation of the sweep to the partners")
+            return True
+
+        labels = _read_column(valid_data, label_name)
+        results = []
+        for index, candidate in enumerate(expand_candidates(spec)):
+            predictions = party_config["inputs"]["predictions"].replace("{index}", str(index))
+            value = compute_metric(metric, labels, _read_column(predictions))
+            logging.info(f"sweep candidate {index} {candidate}: {metric} {value}")
+            results.append({"index": index, "params": candidate, metric: value})
+        self.config_manager.job_context.set(f"sweep.metrics.{self.party}", results, party="common")
+        return True
+
+
+class SweepReport:
+    """
+    Pick the best candidate of a sweep from the scores published by SweepEvaluate, copy the model of this party
+    for it, inputs.models with "{index}" standing for the index of the candidate, to outputs.model_path, and
+    write the scores of all the candidates to outputs.report when given.
+    """
+
+    start_barrier = False
+
+    def __init__(self, party: str, config_manager, **kwargs):
+        self.party = party
+        self.config_manager = config_manager
+
+    def run(self, configmap: Dict) -> bool:
+        party_config, spec = configmap[self.party], configmap["common"]["sweep"]
+        metric = spec.get("metric", "auc")
+        metrics_by_party: Dict = self.config_manager.job_context.get("sweep.metrics", party="common") or {}
+        results = next((metrics_by_party[party] for party in sorted(metrics_by_party) if metrics_by_party[party]), None)
+        if results is None:
+            raise ValueError("no party has evaluated the candidates of the sweep")
+        pick = max if METRICS[metric] else min
+        best = pick(results, key=lambda result: result[metric])
+        logging.info(f"best sweep candidate {best['index']} {best['params']}: {metric} {best[metric]}")
+
+        outputs = party_config.get("outputs", {})
+        model_path = party_config["inputs"]["models"].replace("{index}", str(best["index"]))
+        if outputs.get("model_path") and os.path.isfile(model_path):
+            shutil.copyfile(model_path, f"{outputs['model_path']}.tmp")
+            os.replace(f"{outputs['model_path']}.tmp", outputs["model_path"])
+        if outputs.get("report"):
+            with open(outputs["report"], "w") as f:
+                json.dump({"metric": metric, "best": best, "candidates": results}, f, indent=2)
+        self.config_manager.job_context.set("sweep.best", best, party="common")
+        return True
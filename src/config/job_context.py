@@ -54,6 +54,13 @@ class JobContext:
         # key not found in local party or common
         return None
 
+    def get_all(self) -> Dict:
+        with self.session_maker() as session:
+            job = session.query(Job).filter_by(job_id=self.job_id).first()
+            if job is None:
+                raise ValueError(f"{self.job_id} not found")
+        return json.loads(job.job_context)
+
     def set(self, key: str, value: Union[str, Dict, List], party: str, max_retry=3) -> bool:
         with self.session_maker() as session:
             keys, updated_context = key.split("."), {party: {}}
@@ -0,0 +1,120 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, Union
+
+from .mission_context import MissionContext
+import settings
+
+
+class MissionCache:
+    """
+    A file-backed cache shared by the jobs of a mission, e.g. the hashed and encrypted id sets and the key
+    material of repeated PSI runs against the same partner. Files are kept under
+    MISSION_CACHE_DIR/<mission>/<namespace>/<generation>, the mission context only stores the index of the
+    current generation, so every worker and job of the mission agrees on it.
+
+    A generation lives for ttl seconds, after which a new one with fresh key material is created. Everything
+    derived from the old key has to be recomputed, which bounds how long a key is used. The previous generation
+    is kept for jobs still reading it, older ones are removed on rotation.
+
+    Used by the task executor for the "psi_cache" of operators declaring supports_psi_cache, and by the result
+    cache of the batch SQL operators.
+    """
+
+    key_size = 32
+
+    def __init__(self, mission_name: str, namespace: str, ttl: int = None):
+        self.mission_context = MissionContext(mission_name)
+        self.namespace = namespace
+        self.ttl = ttl or settings.PSI_CACHE_TTL
+        self.root = os.path.join(settings.MISSION_CACHE_DIR, mission_name, namespace)
+
+    @property
+    def index_key(self) -> str:
+        return f"__cache.{self.namespace}"
+
+    def get(self) -> Union[Dict, None]:
+        value = self.mission_context.get(self.index_key)
+        if value is None:
+            return None
+        index = json.loads(value)
+        if not os.path.isfile(index["key_file"]):
+            # the files are gone, e.g. the volume was wiped, the index alone is useless
+            return None
+        return index
+
+    def acquire(self, rotate: bool = False, job_id: str = None) -> Dict:
+        """
+        The current generation, a new one is created if there is none, it has expired or rotate is set.
+        A job asking for rotation only rotates once, its other tasks share the generation it created.
+        """
+        index = self.get()
+        if index is None or (rotate and index.get("job_id") != job_id):
+            index = self.rotate(job_id)
+        return index
+
+    def rotate(self, job_id: str = None) -> Dict:
+        generation = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        generation_dir = os.path.join(self.root, generation)
+        os.makedirs(generation_dir, mode=0o700)
+        key_file = os.path.join(generation_dir, "key")
+        # the key is only ever readable by the platform user
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.urandom(self.key_size).hex())
+        utcnow = datetime.utcnow()
+        index = {
+            "generation": generation,
+            "dir": generation_dir,
+            "key_file": key_file,
+            "create_time": utcnow.isoformat(),
+            "expire_time": (utcnow + timedelta(seconds=self.ttl)).isoformat(),
+            "job_id": job_id
+        }
+        try:
+            updated = self.mission_context.set(self.index_key, json.dumps(index), expire_time=self.ttl)
+        except Exception:
+            logging.exception(f"fail to update the index of cache {self.namespace}")
+            updated = False
+        if not updated:
+            # another job rotated concurrently, use its generation
+            shutil.rmtree(generation_dir, ignore_errors=True)
+            index = self.get()
+            if index is None:
+                raise RuntimeError(f"fail to rotate cache {self.namespace}")
+            return index
+        self._prune(keep=generation)
+        logging.info(f"rotated cache {self.namespace} to generation {generation}")
+        return index
+
+    def _prune(self, keep: str):
+        # keep the new and the previous generation, generations sort by their creation time
+        generations = sorted(name for name in os.listdir(self.root) if name != keep)
+        for name in generations[:-1]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+def get_psi_cache_options(configmap: Dict, party: str) -> Union[Dict, None]:
+    # "psi_cache": true or {"ttl": seconds, "rotate": true} in mission_params, either common or for the given party
+    options = configmap.get(party, {}).get("psi_cache", configmap.get("common", {}).get("psi_cache"))
+    if not options:
+        return None
+    return options if isinstance(options, dict) else {}
@@ -31,6 +31,7 @@ class Status:
     SUCC = "SUCCESS"
 
     status = [CANC, FAIL, INIT, RUNN, SUCC]
+    finished = [CANC, FAIL, SUCC]
 
     @classmethod
     def validate(cls, status: str):
@@ -15,8 +15,10 @@ from flask import g, request, jsonify
 from functools import wraps
 import jwt
 import logging
+import math
 
-from exceptions.exceptions import BaseError, ValidationError, AuthorizationError
+from decorators.rate_limit import get_buckets
+from exceptions.exceptions import BaseError, ValidationError, AuthorizationError, TooManyRequestsError
 from extensions import get_session_maker
 from models.user import User, Role
 from models.job import Job
@@ -92,14 +94,49 @@ def is_node(f):
     return wrapper
 
 
+def is_admin(f):
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            if not hasattr(g, "validated_user") or g.validated_user["role"] != Role.admin:
+                raise ValueError
+        except Exception:
+            raise AuthorizationError("Unauthorized operation")
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
+def rate_limited(f):
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        for bucket in get_buckets(g.validated_user):
+            retry_after = bucket.take()
+            if retry_after > 0:
+                raise TooManyRequestsError(f"rate limit of {bucket.key} exceeded, please retry later", retry_after)
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
+
 def log_and_handle_exceptions(f):
 
     def log_and_return_error(error, code):
-        logging.exception(str(error))
-        return jsonify({
+        response = jsonify({
             "success": False,
             "error_message": str(error),
-        }), code
+        })
+        if isinstance(error, TooManyRequestsError):
+            # expected under load, tell clients when to come back instead of letting them retry right away
+            logging.warning(str(error))
+            response.headers["Retry-After"] = str(max(1, math.ceil(error.retry_after)))
+        else:
+            logging.exception(str(error))
+        return response, code
 
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -0,0 +1,96 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from models.rate_bucket import RateBucket
+from models.user import Role
+import settings
+from utils.db_utils import session_commit_with_retry
+
+
+def parse_rate_limit(value: str) -> Optional[Tuple[float, float]]:
+    """
+    Parse a "<requests per second>/<burst>" limit, an empty value means unlimited.
+    """
+    if not value:
+        return None
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    burst = float(burst or rate)
+    if rate <= 0 or burst < 1:
+        raise ValueError(f"invalid rate limit {value}")
+    return rate, burst
+
+
+class TokenBucket:
+    """
+    A token bucket kept in the DB, so the limit is shared by all the workers and replicas
+    connected to the same database. Concurrent takes are serialized by the version of the row.
+    """
+
+    max_retry = 3
+
+    def __init__(self, key: str, rate: float, burst: float):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    def take(self) -> float:
+        """
+        Take a token, return 0 on success or the seconds to wait until a token is available.
+        """
+        for _ in range(self.max_retry):
+            with self.session_maker() as session:
+                now = time.time()
+                record = session.query(RateBucket).filter_by(key=self.key).first()
+                if record is None:
+                    record = RateBucket(key=self.key, tokens=self.burst, refill_time=now)
+                    session.add(record)
+                tokens = min(self.burst, record.tokens + (now - record.refill_time) * self.rate)
+                if tokens < 1:
+                    return (1 - tokens) / self.rate
+                record.tokens = tokens - 1
+                record.refill_time = now
+                try:
+                    session_commit_with_retry(session)
+                    return 0
+                except (IntegrityError, StaleDataError):
+                    # another worker took a token concurrently, retry with the fresh state
+                    session.rollback()
+        logging.debug(f"rate bucket {self.key} is contended")
+        return 1 / self.rate
+
+
+def get_buckets(user: dict) -> list:
+    """
+    The buckets a request of the user takes from: one of the user and one shared by the role.
+    Partner nodes only take from the node bucket, so operators can never throttle them.
+    """
+    buckets = []
+    role = user["role"]
+    if role != Role.node:
+        user_limit = parse_rate_limit(settings.RATE_LIMIT_USER)
+        if user_limit is not None:
+            buckets.append(TokenBucket(f"user:{user['name']}", *user_limit))
+    role_limit = parse_rate_limit(getattr(settings, f"RATE_LIMIT_{role.upper()}", ""))
+    if role_limit is not None:
+        buckets.append(TokenBucket(f"role:{role.upper()}", *role_limit))
+    return buckets
@@ -37,3 +37,17 @@ class NotFoundError(BaseError):
 
     def __init__(self, message):
         super().__init__(message)
+
+
+class TooManyRequestsError(BaseError):
+
+    def __init__(self, message, retry_after: float = 1):
+        super().__init__(message, code=429)
+        self.retry_after = retry_after
+
+
+class PartyUnavailableError(TooManyRequestsError):
+
+    def __init__(self, message, retry_after: float = 1):
+        super().__init__(message, retry_after)
+        self.code = 503
@@ -15,19 +15,30 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from monitor.metrics import observe_db_engine
 import settings
 
 
 def get_engine(db_uri=None, create_tables=False):
     db_uri = db_uri or settings.PLATFORM_DB_URI
     engine = create_engine(db_uri)
+    observe_db_engine(engine)
     if create_tables:
         from models.base import Base
         from models.global_config import GlobalConfig
         from models.job import Job
+        from models.lease import Lease
         from models.mission import Mission
         from models.mission_context import MissionContext
+        from models.party_call import PartyCall
+        from models.port_lease import PortLease
+        from models.predict_request import PredictRequest
+        from models.rate_bucket import RateBucket
         from models.task import Task
+        from models.task_barrier import TaskBarrier
+        from models.task_profile import TaskProfile
+        from models.task_resource import TaskResource
+        from models.task_timing import TaskTiming
         from models.user import User
         Base.metadata.create_all(engine)
     return engine
@@ -22,10 +22,19 @@ from sqlalchemy import MetaData
 
 from extensions import get_session_maker
 from models.task import Task
+from models.task_barrier import TaskBarrier
+from models.task_profile import TaskProfile
+from models.task_resource import TaskResource
+from models.task_timing import TaskTiming
 from models.job import Job
+from models.lease import Lease
+from models.rate_bucket import RateBucket
 from models.mission import Mission
 from models.global_config import GlobalConfig
 from models.mission_context import MissionContext
+from models.party_call import PartyCall
+from models.port_lease import PortLease
+from models.predict_request import PredictRequest
 from models.user import User, Status
 
 
@@ -148,7 +157,10 @@ def initialize_database(url):
 
 
 def clear_database(url):
-    all_tables = [GlobalConfig, MissionContext, Mission, Job, Task, User]
+    all_tables = [
+        GlobalConfig, MissionContext, Mission, Job, Task, User, Lease, RateBucket, TaskTiming, TaskResource,
+        TaskProfile, PredictRequest, TaskBarrier, PortLease, PartyCall
+    ]
     meta = MetaData()
     with get_session_maker(url)() as session:
         meta.reflect(bind=session.bind)
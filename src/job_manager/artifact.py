@@ -0,0 +1,79 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from job_manager.scratch import JobScratch
+from utils.artifact_utils import CSV, convert, detect_format, with_format
+
+
+class ArtifactNegotiator:
+    """
+    Matches the artifacts of a task with the formats its operator supports, declared as the `artifact_formats`
+    class attribute of the operator, csv only by default. Inputs in another format are converted before the
+    run, outputs are written by the operator in a supported format and converted to the requested one after it.
+    The format the operator should use for its own files is passed as `artifact_format` in its configmap.
+    """
+
+    def __init__(self, job_id: str, task_name: str, supported: List[str] = None):
+        self.job_id = job_id
+        self.task_name = task_name
+        self.supported = supported or [CSV]
+        self._inputs: List[str] = []
+        self._outputs: List[Tuple[str, str]] = []
+
+    def _scratch_path(self, kind: str, key: str, artifact_format: str) -> str:
+        # in the scratch dir of the job, out of reach of the other jobs, which can only name files of SAFE_WORK_DIR
+        name = f"{self.task_name}_{kind}_{key}"
+        return with_format(os.path.join(JobScratch(self.job_id).create(), name), artifact_format)
+
+    def prepare(self, configmap: Dict, party: str) -> Dict:
+        party_config = configmap.setdefault(party, {})
+        preferred = party_config.get("artifact_format", configmap.get("common", {}).get("artifact_format"))
+        chosen = preferred if preferred in self.supported else self.supported[0]
+        party_config["artifact_format"] = chosen
+
+        inputs = party_config.get("inputs", {})
+        for key, path in inputs.items():
+            if not isinstance(path, str) or not os.path.isfile(path) or detect_format(path) in self.supported:
+                continue
+            converted = self._scratch_path("input", key, chosen)
+            logging.info(f"convert input {key} of {self.job_id}.{self.task_name}: {path} -> {converted}")
+            inputs[key] = convert(path, converted, chosen)
+            self._inputs.append(converted)
+
+        outputs = party_config.get("outputs", {})
+        for key, path in outputs.items():
+            if not isinstance(path, str) or detect_format(path) in self.supported:
+                continue
+            outputs[key] = self._scratch_path("output", key, chosen)
+            self._outputs.append((outputs[key], path))
+        return configmap
+
+    def finish(self, success: bool):
+        """
+        Convert the outputs to their requested format after a successful run and remove the scratch files.
+        """
+        try:
+            if success:
+                for written, requested in self._outputs:
+                    if os.path.isfile(written):
+                        logging.info(f"convert output of {self.job_id}.{self.task_name}: {written} -> {requested}")
+                        convert(written, requested)
+        finally:
+            for path in self._inputs + [written for written, _ in self._outputs]:
+                if os.path.isfile(path):
+                    os.remove(path)
+            self._inputs, self._outputs = [], []
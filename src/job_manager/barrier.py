@@ -0,0 +1,143 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+import json
+import logging
+import time
+from typing import Dict, List, Union
+
+from sqlalchemy.exc import IntegrityError
+
+from constants import Status
+from models.job import Job
+from models.task import Task
+from models.task_barrier import TaskBarrier
+from monitor.metrics import START_BARRIER_WAIT
+import settings
+from utils.db_utils import session_commit_with_retry
+
+
+def record_ready(session_maker, job_id: str, task_name: str, party: str, port: int = None, network: Dict = None):
+    """
+    Record that a task is ready to run, reported by its own party or by a partner, along with the port it
+    listens on in the socket network scheme, and the network chosen for the tasks by the deciding party.
+    """
+    network = json.dumps(network) if network is not None else None
+    with session_maker() as session:
+        if session.query(Job.job_id).filter_by(job_id=job_id).first() is None:
+            raise ValueError(f"{job_id} not found")
+        record = session.query(TaskBarrier).filter_by(job_id=job_id, task_name=task_name).first()
+        if record is None:
+            session.add(
+                TaskBarrier(job_id=job_id,
+                            task_name=task_name,
+                            party=party,
+                            port=port,
+                            network=network,
+                            ready_time=datetime.utcnow()))
+        else:
+            record.party, record.port, record.network, record.ready_time = party, port, network, datetime.utcnow()
+        try:
+            session_commit_with_retry(session)
+        except IntegrityError:
+            # reported twice at the same time, e.g. retried by the partner
+            session.rollback()
+
+
+def reset_barriers(session, job_id: str, task_names: List[str]):
+    # called on rerun, the readiness of the previous attempt must not release the next one
+    session.query(TaskBarrier).filter(TaskBarrier.job_id == job_id,
+                                      TaskBarrier.task_name.in_(task_names)).delete(synchronize_session=False)
+
+
+class StartBarrier:
+    """
+    Readiness handshake of the tasks of paired operators, e.g. psi_a and psi_b, which otherwise start whenever
+    their own party triggers them, and sit on their ports and resources waiting for each other. A task reports
+    that it is ready to its partners once its configmap and network config are resolved, and waits until all its
+    peers, peers being {task name: party}, have reported the same, so that they all start at the same time.
+    """
+
+    def __init__(self,
+                 job_id: str,
+                 task_name: str,
+                 peers: Dict[str, str],
+                 timeout: float = None,
+                 poll_interval: float = None):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.job_id = job_id
+        self.task_name = task_name
+        self.peers = peers
+        self.timeout = settings.START_BARRIER_TIMEOUT if timeout is None else timeout
+        self.poll_interval = settings.START_BARRIER_POLL_INTERVAL if poll_interval is None else poll_interval
+
+    def ready(self, port: int = None, network: Dict = None):
+        from network.request import request_manager
+        record_ready(self.session_maker, self.job_id, self.task_name, settings.PARTY, port, network)
+        params = {"party": settings.PARTY, "port": port, "network": network}
+        for party in sorted(set(self.peers.values())):
+            request_manager.task_ready(party, self.job_id, self.task_name, params)
+
+    def network(self) -> Union[Dict, None]:
+        """
+        The network chosen by a peer, see network.probe.
+        """
+        with self.session_maker() as session:
+            records = session.query(TaskBarrier).filter(TaskBarrier.job_id == self.job_id,
+                                                        TaskBarrier.task_name.in_(list(self.peers))).all()
+            return next((json.loads(record.network) for record in records if record.network), None)
+
+    def ports(self) -> Dict[str, int]:
+        """
+        The ports the peers reported along with their readiness, by party.
+        """
+        with self.session_maker() as session:
+            records = session.query(TaskBarrier).filter(TaskBarrier.job_id == self.job_id,
+                                                        TaskBarrier.task_name.in_(list(self.peers))).all()
+            return {record.party: record.port for record in records if record.port is not None}
+
+    def _check(self) -> bool:
+        with self.session_maker() as session:
+            job = session.query(Job.status).filter_by(job_id=self.job_id).first()
+            if job is None or job.status in Status.finished:
+                raise RuntimeError(f"{self.job_id} is {job.status.lower() if job else 'gone'}, stop waiting for peers")
+            failed = session.query(Task.name).filter(Task.job_id == self.job_id, Task.name.in_(list(self.peers)),
+                                                     Task.status.in_([Status.FAIL, Status.CANC])).all()
+            if failed:
+                raise RuntimeError(f"peers {sorted(name for name, in failed)} of {self.task_name} have stopped")
+            ready = session.query(TaskBarrier.task_name).filter(TaskBarrier.job_id == self.job_id,
+                                                                TaskBarrier.task_name.in_(list(self.peers))).count()
+        return ready == len(self.peers)
+
+    def wait(self, mission_name: str = "", operator: str = "") -> float:
+        """
+        Block until every peer is ready, return the seconds waited. Raise TimeoutError after timeout seconds.
+        """
+        start_time = time.perf_counter()
+        result = "released"
+        try:
+            while not self._check():
+                if time.perf_counter() - start_time > self.timeout:
+                    result = "timeout"
+                    raise TimeoutError(f"peers {sorted(self.peers)} of {self.task_name} not ready in {self.timeout}s")
+                time.sleep(self.poll_interval)
+        except RuntimeError:
+            result = "aborted"
+            raise
+        finally:
+            waited = time.perf_counter() - start_time
+            START_BARRIER_WAIT.labels(mission_name, operator, result).observe(waited)
+        logging.info(f"{self.job_id}.{self.task_name} released after waiting {waited:.3f}s for {sorted(self.peers)}")
+        return waited
@@ -0,0 +1,200 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import json
+import logging
+from typing import Dict, List, Tuple
+
+from constants import Status
+from job_manager.core import JobManager
+from job_manager.timing import get_jobs_timings
+from models.job import Job
+from models.task import Task
+from models.task_profile import TaskProfile
+from models.task_resource import TaskResource
+from network.health import party_health
+from network.request import request_manager
+import settings
+from utils.db_utils import session_commit_with_retry
+from utils.id_utils import generate_job_id
+
+
+class BatchJobManager:
+    """
+    Gets, submits and cancels many jobs of a user at once, with a fixed number of set-based queries
+    and a single transaction instead of one round trip per job. Partners are informed with one batch
+    request per party.
+    """
+
+    def __init__(self, user_name: str):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.user_name = user_name
+
+    @staticmethod
+    def _validate_size(items: List, name: str):
+        if not isinstance(items, list) or not items:
+            raise ValueError(f"{name} must be a non-empty list")
+        if len(items) > settings.MAX_BATCH_SIZE:
+            raise ValueError(f"too many {name}, at most {settings.MAX_BATCH_SIZE} are allowed in one batch")
+
+    def _get_jobs(self, session, job_ids: List[str]) -> Dict[str, "Job"]:
+        # jobs of other users are treated as not found, same as the permission check of single job apis
+        query = session.query(Job).filter(Job.job_id.in_(job_ids), Job.user_name == self.user_name)
+        return {job.job_id: job for job in query.all()}
+
+    def get_jobs_details(self, job_ids: List[str]) -> Dict:
+        self._validate_size(job_ids, "job_ids")
+        job_ids = list(dict.fromkeys(job_ids))
+        with self.session_maker() as session:
+            jobs = self._get_jobs(session, job_ids)
+            found_ids = list(jobs.keys())
+            tasks, resources, profiles = defaultdict(list), defaultdict(dict), defaultdict(dict)
+            if found_ids:
+                for task in session.query(Task).filter(Task.job_id.in_(found_ids)).all():
+                    tasks[task.job_id].append(task)
+                for resource in session.query(TaskResource).filter(TaskResource.job_id.in_(found_ids)).all():
+                    resources[resource.job_id][resource.task_name] = resource.summary()
+                for profile in session.query(TaskProfile).filter(TaskProfile.job_id.in_(found_ids)).all():
+                    profiles[profile.job_id][profile.task_name] = profile.to_dict()
+            timings = get_jobs_timings(session, found_ids) if found_ids else {}
+        details = [
+            JobManager.build_details(jobs[job_id], tasks[job_id], timings.get(job_id), resources[job_id],
+                                     profiles[job_id]) for job_id in job_ids if job_id in jobs and tasks[job_id]
+        ]
+        not_found = [job_id for job_id in job_ids if job_id not in jobs or not tasks[job_id]]
+        return {"jobs": details, "not_found": not_found}
+
+    def export_jobs(self,
+                    cursor: int = 0,
+                    limit: int = 100,
+                    status: str = None,
+                    hours: int = None,
+                    details: bool = False,
+                    finished: bool = False) -> Tuple[List[Dict], int, bool]:
+        """
+        A page of the jobs after cursor in creation order, the cursor of the next page, and whether more jobs
+        are ready to be fetched after it. The page holds at most MAX_BATCH_SIZE jobs whatever the limit.
+        With finished=True the page stops at the first job still running, so that following the cursor
+        yields every job exactly once, in its final state.
+        """
+        with self.session_maker() as session:
+            query = session.query(Job).filter(Job.user_name == self.user_name, Job.id > cursor)
+            if status is not None:
+                query = query.filter(Job.status == status)
+            if hours is not None:
+                query = query.filter(Job.create_time >= datetime.utcnow() - timedelta(hours=hours))
+            limit = min(limit, settings.MAX_BATCH_SIZE)
+            # one more job than the page tells whether there is a next page
+            jobs = query.order_by(Job.id).limit(limit + 1).all()
+        has_more = len(jobs) > limit
+        jobs = jobs[:limit]
+        if finished:
+            running = [i for i, job in enumerate(jobs) if job.status not in Status.finished]
+            if running:
+                jobs = jobs[:running[0]]
+                has_more = False
+        records = [job.export_to_dict() for job in jobs]
+        if details and records:
+            job_details = {job["job_id"]: job for job in self.get_jobs_details([r["job_id"] for r in records])["jobs"]}
+            for record in records:
+                record.update(job_details.get(record["job_id"], {}))
+        next_cursor = jobs[-1].id if jobs else cursor
+        return records, next_cursor, has_more
+
+    def submit(self, params_list: List[Dict]) -> List[str]:
+        self._validate_size(params_list, "jobs")
+        with self.session_maker() as session:
+            # admit the whole batch or nothing, the jobs of each main party count against the quota of that party
+            JobManager.check_platform_admission(session, len(params_list))
+            main_parties = Counter(params.get("main_party", settings.PARTY) for params in params_list)
+            for main_party, new_jobs in main_parties.items():
+                JobManager.check_user_admission(session, self.user_name, main_party, new_jobs)
+
+            job_ids, jobs, tasks = [], [], []
+            missions = {}
+            partner_params = defaultdict(list)
+            for params in params_list:
+                job_id = params.get("job_id")
+                if job_id is None:
+                    # generated ids only differ in a random suffix within the same second
+                    job_id = generate_job_id()
+                    while job_id in job_ids:
+                        job_id = generate_job_id()
+                elif job_id in job_ids:
+                    raise ValueError(f"duplicated job_id {job_id} in batch")
+                job_manager = JobManager(job_id)
+
+                # jobs of the same mission share one lookup
+                mission_name = params.get("mission_name", "ecdh_psi_optimized")
+                mission_version = params.get("mission_version", "latest")
+                if (mission_name, mission_version) not in missions:
+                    missions[(mission_name, mission_version)] = job_manager._get_mission(mission_name, mission_version)
+                mission = missions[(mission_name, mission_version)]
+
+                job, job_tasks, partners = job_manager._build_job(params, mission, self.user_name)
+                for party in partners:
+                    partner_params[party].append(params)
+                job_ids.append(job_id)
+                jobs.append(job)
+                tasks.extend(job_tasks)
+
+            party_health.check(partner_params)
+
+            # inform join parties to submit the same jobs, one request per party
+            for party, party_params in partner_params.items():
+                request_manager.batch_submit(party, party_params)
+
+            # commit changes to db
+            session.add_all(jobs)
+            session.add_all(tasks)
+            session_commit_with_retry(session)
+            logging.info(f"created {len(job_ids)} new jobs in batch: {job_ids}")
+
+        for job_id in job_ids:
+            JobManager(job_id).trigger_job()
+        return job_ids
+
+    def cancel(self, job_ids: List[str]) -> Dict:
+        self._validate_size(job_ids, "job_ids")
+        job_ids = list(dict.fromkeys(job_ids))
+        with self.session_maker() as session:
+            jobs = self._get_jobs(session, job_ids)
+            found_ids = list(jobs.keys())
+
+            partner_job_ids = defaultdict(list)
+            for job in jobs.values():
+                if job.main_party != settings.PARTY:
+                    continue
+                for party in json.loads(job.join_parties):
+                    if party != settings.PARTY:
+                        partner_job_ids[party].append(job.job_id)
+            for party, party_job_ids in partner_job_ids.items():
+                request_manager.batch_cancel(party, party_job_ids)
+
+            for job in jobs.values():
+                job.status = Status.CANC
+            if found_ids:
+                running_tasks = session.query(Task).filter(Task.job_id.in_(found_ids), Task.status == Status.RUNN)
+                for task in running_tasks.all():
+                    task.cancel()
+            session_commit_with_retry(session)
+
+        for job_id in found_ids:
+            JobManager(job_id).trigger_job()
+        return {
+            "cancelled": [job_id for job_id in job_ids if job_id in jobs],
+            "not_found": [job_id for job_id in job_ids if job_id not in jobs]
+        }
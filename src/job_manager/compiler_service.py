@@ -0,0 +1,128 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import importlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from typing import Any, Callable, Dict
+
+
+def load_entry(entry: str) -> Callable:
+    """
+    The compile function of the service, "<module>:<function>", called with the query and its config.
+    """
+    module_name, _, function_name = entry.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"invalid compiler entry {entry}, expect <module>:<function>")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.dispatch(request)
+        except Exception as e:
+            logging.exception("compiler service request fail")
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class CompilerServer(socketserver.ThreadingUnixStreamServer):
+    """
+    A long-lived local service compiling SQL for the PETSQL operators over a Unix socket, so that the JVM of
+    the compiler is started and warmed up once instead of in every task. Requests and responses are one line
+    of json, {"op": "ping"} or {"op": "compile", "sql": ..., "config": {...}}.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, entry: str):
+        self.entry = entry
+        # loading the entry starts the compiler, before the socket accepts health checks
+        self.compile = load_entry(entry)
+        self.served = 0
+        # the compiler is not known to be thread safe, queries are compiled one at a time
+        self._lock = threading.Lock()
+        if os.path.exists(socket_path):
+            # left over by a service which did not exit cleanly
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def dispatch(self, request: Dict) -> Dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "entry": self.entry, "served": self.served}
+        if op == "compile":
+            with self._lock:
+                result = self.compile(request["sql"], request.get("config", {}))
+                self.served += 1
+            return {"ok": True, "result": result}
+        raise ValueError(f"unknown op {op}")
+
+
+def call(socket_path: str, request: Dict, timeout: float = None) -> Dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(request).encode() + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"no response from {socket_path}")
+    return json.loads(line)
+
+
+def ping(socket_path: str, timeout: float = 2) -> bool:
+    try:
+        return bool(call(socket_path, {"op": "ping"}, timeout=timeout).get("ok"))
+    except (OSError, ValueError):
+        return False
+
+
+def compile_sql(socket_path: str, sql: str, config: Dict = None, timeout: float = None) -> Any:
+    """
+    Compile a query with the service, for operators given configmap["common"]["petsql_compiler"]["socket"].
+    """
+    response = call(socket_path, {"op": "compile", "sql": sql, "config": config or {}}, timeout=timeout)
+    if not response.get("ok"):
+        raise RuntimeError(f"compiler service fail: {response.get('error')}")
+    return response["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the PETSQL compiler over a Unix socket")
+    parser.add_argument("--socket", required=True, help="path of the Unix socket")
+    parser.add_argument("--entry", required=True, help="compile function, <module>:<function>")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = CompilerServer(args.socket, args.entry)
+    logging.info(f"compiler service {args.entry} listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
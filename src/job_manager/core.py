@@ -14,17 +14,31 @@
 from datetime import datetime, timedelta
 import json
 import logging
-from typing import Dict, List
+import time
+from typing import Dict, List, Tuple
 
 import multiprocessing as mp
 
+from sqlalchemy.orm.exc import StaleDataError
+
 from constants import Status
+from exceptions.exceptions import TooManyRequestsError
+from job_manager.barrier import record_ready, reset_barriers
 from job_manager.dag import DAG, LogicTask
+from job_manager.executor_pool import executor_pool
+from job_manager.ports import PortAllocator
+from job_manager.scratch import JobScratch
+from job_manager.sweep import expand_dag
 from job_manager.task import TaskExecutor
+from job_manager.timing import Phase, TaskTimer, get_job_timings
 from models.job import Job
 from models.mission import Mission
 from models.task import Task
+from models.task_profile import TaskProfile
+from models.task_resource import TaskResource
+from network.health import party_health
 from network.request import request_manager
+from tracing import tracer
 import settings
 from utils.db_utils import session_commit_with_retry
 from utils.deep_merge import deep_merge
@@ -83,49 +97,88 @@ class JobManager:
                  status=Status.INIT) for operator in mission_dag["operators"]
         ]
 
+    def _build_job(self, params: Dict, mission: "Mission", user_name: str = None) -> Tuple["Job", List["Task"], List]:
+        """
+        Build the job and its tasks from the submit params. When this party is the main party, params are
+        completed in place for the partners to submit the same job, and the partners to inform are returned.
+        """
+        # decide parties
+        main_party = params.get("main_party", settings.PARTY)
+        mission_params = params.get("mission_params", {})
+        mission_dag = expand_dag(json.loads(mission.dag), mission_params)
+        join_parties = list({operator["party"] for operator in mission_dag["operators"]})
+
+        # decide job context
+        job_context = {party: {} for party in join_parties}
+        job_context["common"] = {"__user_input": mission_params, "job_id": self.job_id}
+        # partners continue the trace propagated in the request headers, so all parties share the trace id
+        job_context["common"]["trace_id"] = tracer.current_trace_id() or tracer.new_trace_id()
+        # where the tasks of the job on this party exchange intermediate artifacts, created on first use
+        if settings.PARTY in job_context:
+            job_context[settings.PARTY]["scratch_dir"] = JobScratch(self.job_id).path
+
+        partners = []
+        if main_party == settings.PARTY:
+            # set params
+            params["main_party"] = main_party
+            params["mission_name"] = mission.name
+            params["mission_version"] = str(mission.version)
+            params["job_id"] = self.job_id
+            partners = [party for party in join_parties if party != settings.PARTY]
+
+        job = self._create_job(mission, job_context, main_party, join_parties, user_name)
+        tasks = self._create_tasks(mission_dag)
+        return job, tasks, partners
+
+    @staticmethod
+    def check_admission(session, user_name: str, main_party: str, new_jobs: int = 1):
+        """
+        Reject new jobs with a 429 when the platform or the user is out of capacity. The per user quota only
+        applies to jobs initiated on this party, jobs forwarded by partner nodes are admitted by their main party.
+        """
+        JobManager.check_platform_admission(session, new_jobs)
+        JobManager.check_user_admission(session, user_name, main_party, new_jobs)
+
+    @staticmethod
+    def check_platform_admission(session, new_jobs: int = 1):
+        running_jobs = session.query(Job).filter_by(status=Status.RUNN).count()
+        if running_jobs + new_jobs > settings.MAX_JOB_LIMIT:
+            raise TooManyRequestsError("running jobs has reached the upper limit, please try again later",
+                                       settings.ADMISSION_RETRY_AFTER)
+
+    @staticmethod
+    def check_user_admission(session, user_name: str, main_party: str, new_jobs: int = 1):
+        if main_party != settings.PARTY or settings.MAX_USER_JOB_LIMIT <= 0:
+            return
+        user_jobs = session.query(Job).filter_by(status=Status.RUNN, user_name=user_name or "").count()
+        if user_jobs + new_jobs > settings.MAX_USER_JOB_LIMIT:
+            raise TooManyRequestsError(
+                f"running jobs of user {user_name} has reached the quota, please try again later",
+                settings.ADMISSION_RETRY_AFTER)
+
     def submit(self, params: Dict, user_name: str = None):
         with self.session_maker() as session:
-            # does not allow parallel jobs
-            running_jobs = session.query(Job).filter_by(status=Status.RUNN).all()
-            if len(running_jobs) >= settings.MAX_JOB_LIMIT:
-                raise Exception("running jobs has reached the upper limit, please try again later")
+            self.check_admission(session, user_name, params.get("main_party", settings.PARTY))
 
             # decide mission
             mission_name = params.get("mission_name", "ecdh_psi_optimized")
             mission_version = params.get("mission_version", "latest")
             mission = self._get_mission(mission_name, mission_version)
 
-            # decide parties
-            main_party = params.get("main_party", settings.PARTY)
-            mission_dag = json.loads(mission.dag)
-            join_parties = list({operator["party"] for operator in mission_dag["operators"]})
-
-            # decide job context
-            mission_params = params.get("mission_params", {})
-            job_context = {party: {} for party in join_parties}
-            job_context["common"] = {"__user_input": mission_params, "job_id": self.job_id}
+            # create job & task
+            job, tasks, partners = self._build_job(params, mission, user_name)
+            party_health.check(partners)
 
             # inform join parties to submit a new job with the same job id, mission name, and version
-            if main_party == settings.PARTY:
-                # set params
-                params["main_party"] = main_party
-                params["mission_name"] = mission.name
-                params["mission_version"] = str(mission.version)
-                params["job_id"] = self.job_id
-                for party in join_parties:
-                    if party == settings.PARTY:
-                        continue
-                    request_manager.submit(party, params)
-
-            # create job & task
-            job = self._create_job(mission, job_context, main_party, join_parties, user_name)
-            tasks = self._create_tasks(mission_dag)
+            for party in partners:
+                request_manager.submit(party, params)
 
             # commit changes to db
             session.add(job)
             session.add_all(tasks)
             session_commit_with_retry(session)
-            logging.info(f"created new job {self.job_id}:{mission_dag}@{mission_version}, job_context: {job_context}")
+            logging.info(
+                f"created new job {self.job_id}:{mission.name}@{mission_version}, job_context: {job.job_context}")
 
         self.trigger_job()
 
@@ -150,9 +203,11 @@ class JobManager:
             tasks = session.query(Task).filter_by(job_id=self.job_id).all()
             if not tasks:
                 raise ValueError(f"tasks for job {self.job_id} not found")
+            reset_tasks = [task.name for task in tasks if task.status in [Status.FAIL, Status.CANC]]
             for task in tasks:
                 if task.status in [Status.FAIL, Status.CANC]:
                     task.reset()
+            reset_barriers(session, self.job_id, reset_tasks)
             session_commit_with_retry(session)
 
         self.trigger_job()
@@ -189,10 +244,70 @@ class JobManager:
             tasks = session.query(Task).filter_by(job_id=self.job_id).all()
             if not tasks:
                 raise ValueError(f"tasks for job id {self.job_id} not found")
+            timings = get_job_timings(session, self.job_id)
+            resources = {r.task_name: r.summary() for r in session.query(TaskResource).filter_by(job_id=self.job_id)}
+            profiles = {p.task_name: p.to_dict() for p in session.query(TaskProfile).filter_by(job_id=self.job_id)}
+        return self.build_details(job, tasks, timings, resources, profiles)
+
+    @staticmethod
+    def build_details(job: "Job",
+                      tasks: List["Task"],
+                      timings: Dict = None,
+                      resources: Dict = None,
+                      profiles: Dict = None) -> Dict:
+        timings, resources, profiles = timings or {}, resources or {}, profiles or {}
         sorted_tasks = sorted(tasks, key=lambda task: task.start_time or datetime.utcnow())
-        task_details = [task.details() for task in sorted_tasks]
+        task_details = [
+            task.details(timings.get(task.name), resources.get(task.name), profiles.get(task.name))
+            for task in sorted_tasks
+        ]
         progress = format(len(list(filter(lambda x: x.status == Status.SUCC, tasks))) / len(tasks), ".2%")
-        return {"job_id": self.job_id, "progress": progress, "job_status": job.status, "task_details": task_details}
+        trace_id = json.loads(job.job_context).get("common", {}).get("trace_id")
+        return {
+            "job_id": job.job_id,
+            "progress": progress,
+            "job_status": job.status,
+            "trace_id": trace_id,
+            "task_details": task_details
+        }
+
+    def get_state_version(self) -> Tuple[int, str]:
+        # a cheap read of the job row only, its version moves forward on every job or task transition
+        with self.session_maker() as session:
+            record = session.query(Job.version_id, Job.status).filter_by(job_id=self.job_id).first()
+            if record is None:
+                raise ValueError(f"job {self.job_id} not found")
+            return record.version_id, record.status
+
+    def touch(self, max_retry: int = 3):
+        """
+        Move the version of the job forward after writing details not tracked by it, e.g. the timings, resources
+        and profile of a task, so that clients holding the ETag of the earlier details fetch them again.
+        Best effort, never fails the task.
+        """
+        for _ in range(max_retry):
+            try:
+                with self.session_maker() as session:
+                    job = session.query(Job).filter_by(job_id=self.job_id).first()
+                    if job is None:
+                        return
+                    job.update_time = datetime.utcnow()
+                    session_commit_with_retry(session)
+                    return
+            except StaleDataError:
+                # updated concurrently, maybe before our writes, touch it again
+                continue
+            except Exception:
+                logging.exception(f"touch job {self.job_id} fail")
+                return
+
+    def wait_for_change(self, since_version: int, timeout: float) -> Tuple[int, str]:
+        deadline = time.time() + timeout
+        while True:
+            version, status = self.get_state_version()
+            if version > since_version or status in Status.finished or time.time() >= deadline:
+                return version, status
+            time.sleep(min(settings.STREAM_POLL_INTERVAL, max(deadline - time.time(), 0)))
 
     def get_jobs(self, user_name: str, status: str = None, hours: int = None, limit: int = 10) -> List:
         with self.session_maker() as session:
@@ -205,29 +320,44 @@ class JobManager:
             jobs = query.limit(limit).all()
             return [job.simple_to_dict() for job in jobs]
 
-    def update_task(self, task_name: str, task_status: str, external_context: Dict = None, errors: str = None):
+    def update_task(self,
+                    task_name: str,
+                    task_status: str,
+                    external_context: Dict = None,
+                    errors: str = None,
+                    max_retry: int = 3):
         with self.session_maker() as session:
             task_status = Status.validate(task_status)
-            task = session.query(Task).filter_by(job_id=self.job_id, name=task_name).first()
-            if task is None:
-                raise ValueError(f"{self.job_id}.{task_name} not found")
-            job = session.query(Job).filter_by(job_id=self.job_id).first()
-            if job is None:
-                raise ValueError(f"{self.job_id} not found")
-            job_context: Dict = json.loads(job.job_context)
-
-            if task_status == Status.RUNN:
-                task.run()
-            elif task_status == Status.SUCC:
-                task.success()
-                if external_context is not None:
-                    deep_merge(job_context, external_context)
-                    job.job_context = json.dumps(job_context)
-            elif task_status == Status.FAIL:
-                task.fail(errors)
-            else:
-                raise ValueError(f"unexpected task status {task_status}")
-            session_commit_with_retry(session)
+            for i in range(max_retry):
+                task = session.query(Task).filter_by(job_id=self.job_id, name=task_name).first()
+                if task is None:
+                    raise ValueError(f"{self.job_id}.{task_name} not found")
+                job = session.query(Job).filter_by(job_id=self.job_id).first()
+                if job is None:
+                    raise ValueError(f"{self.job_id} not found")
+                job_context: Dict = json.loads(job.job_context)
+
+                if task_status == Status.RUNN:
+                    task.run()
+                elif task_status == Status.SUCC:
+                    task.success()
+                    if external_context is not None:
+                        deep_merge(job_context, external_context)
+                        job.job_context = json.dumps(job_context)
+                elif task_status == Status.FAIL:
+                    task.fail(errors)
+                else:
+                    raise ValueError(f"unexpected task status {task_status}")
+                # touch the job so that its version, the state version watched by status streams, moves forward
+                job.update_time = datetime.utcnow()
+                try:
+                    session_commit_with_retry(session)
+                    break
+                except StaleDataError:
+                    # the job was updated concurrently, e.g. along with another task, read it again
+                    session.rollback()
+                    if i == max_retry - 1:
+                        raise
 
             # broadcast task update
             params = {"task_status": task_status}
@@ -248,9 +378,13 @@ class JobManager:
         if task_status in [Status.SUCC, Status.FAIL]:
             self.trigger_job()
 
+    def task_ready(self, task_name: str, party: str, port: int = None, network: Dict = None):
+        # the task of a partner paired with one of ours is ready to start, and listens on port
+        record_ready(self.session_maker, self.job_id, task_name, party, port, network)
+
     def trigger_job(self):
         # start tasks that are ready to run on your side
-        with self.session_maker() as session:
+        with tracer.child_span("job.trigger", attributes={"job_id": self.job_id}), self.session_maker() as session:
             self._update_dag()
             status = self.dag.judge_job_status()
             if status == Status.RUNN:
@@ -263,9 +397,41 @@ class JobManager:
                 if status in [Status.FAIL, Status.CANC]:
                     for task in self.dag.get_my_running_tasks():
                         self.stop_task(task)
+                # the ports of tasks still running when the job failed or was canceled
+                PortAllocator().release(self.job_id)
+                # the scratch dir of a failed job is kept for a rerun, and swept by the scheduler after a while
+                if status in [Status.SUCC, Status.CANC]:
+                    JobScratch(self.job_id).cleanup()
+
+    def _claim_task(self, task: "LogicTask") -> bool:
+        # conditional INIT -> RUNNING transition guarded by the version we read,
+        # so only one worker or replica wins the right to launch the task
+        with self.session_maker() as session:
+            query = session.query(Task).filter_by(job_id=self.job_id,
+                                                  name=task.name,
+                                                  status=Status.INIT,
+                                                  version_id=task.version_id)
+            values = {
+                Task.status: Status.RUNN,
+                Task.start_time: datetime.utcnow(),
+                Task.version_id: task.version_id + 1
+            }
+            claimed = query.update(values, synchronize_session=False)
+            session_commit_with_retry(session)
+        return claimed == 1
 
     def start_task(self, task: "LogicTask"):
+        if not self._claim_task(task):
+            logging.info(f"{self.job_id}.{task.name} has been claimed by another worker")
+            return
+        timer = TaskTimer(self.job_id, task.name)
+        timer.mark(Phase.SCHEDULED)
+        timer.flush(reset=True)
         task_executor = TaskExecutor(self.dag.mission_name, self.job_id, task)
+        if task.executor == "pooled" and executor_pool.is_available():
+            if executor_pool.try_submit(task_executor.start) is not None:
+                return
+            logging.info(f"pooled executors busy, {self.job_id}.{task.name} runs in a process of its own")
         process = mp.Process(target=task_executor.start)
         process.start()
 
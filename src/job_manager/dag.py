@@ -11,11 +11,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import json
 from typing import List, Dict
 
 from constants import Status
+from job_manager.sweep import expand_dag
 from models.job import Job
 from models.mission import Mission
 from models.task import Task
@@ -31,6 +32,18 @@ class LogicTask:
     depends: List[str]
     class_name: str
     class_path: str
+    version_id: int = 0
+    profile: bool = False
+    # "pooled" runs the task in a long-lived executor, e.g. to reuse the models it loaded for previous tasks
+    executor: str = "process"
+    # the candidate of a sweep the task belongs to, see job_manager.sweep
+    sweep_index: int = None
+    # local services the task uses, e.g. "petsql_compiler", passed in the common configmap when they are healthy
+    services: List[str] = field(default_factory=list)
+    # the tasks of the same operator on the other parties, {task name: party}, which start along with this one
+    peers: Dict[str, str] = field(default_factory=dict)
+    # overrides merged into the configmap of the task's party, values may be ${...} bindings like args
+    configmap: Dict = field(default_factory=dict)
 
 
 class DAG:
@@ -47,22 +60,44 @@ class DAG:
         with session_maker() as session:
             job: "Job" = session.query(Job).filter_by(job_id=self.job_id).first()
             self.mission_name, self.mission_version = job.mission_name, job.mission_version
+            mission_params = json.loads(job.job_context).get("common", {}).get("__user_input", {})
             mission: "Mission" = session.query(Mission).filter_by(name=self.mission_name,
                                                                   version=self.mission_version).first()
             tasks: List[Task] = session.query(Task).filter_by(job_id=self.job_id).all()
 
-        dag: Dict = json.loads(mission.dag)
+        dag: Dict = expand_dag(json.loads(mission.dag), mission_params)
         self.tasks = {
             v["name"]:
-                LogicTask(v["name"], v["party"], v.get("args", {}), "", v.get("depends", []), v['class'],
-                          v['class_path']) for v in dag["operators"]
+                LogicTask(v["name"],
+                          v["party"],
+                          v.get("args", {}),
+                          "",
+                          v.get("depends", []),
+                          v['class'],
+                          v['class_path'],
+                          profile=v.get("profile", False),
+                          executor=v.get("executor", "process"),
+                          sweep_index=v.get("sweep_index"),
+                          services=v.get("services", []),
+                          configmap=v.get("configmap", {})) for v in dag["operators"]
         }
+        self._pair_tasks()
         diff_set = set(self.tasks.keys()).difference(set([v.name for v in tasks]))
         assert len(diff_set) == 0, ValueError(f"task missed: {diff_set}")
 
         # update task status
         for task in tasks:
             self.tasks[task.name].status = task.status
+            self.tasks[task.name].version_id = task.version_id
+
+    def _pair_tasks(self):
+        # the tasks of an operator on the different parties run together, the same way they share a network session
+        groups: Dict[tuple, List["LogicTask"]] = {}
+        for task in self.tasks.values():
+            groups.setdefault((task.class_path, task.class_name, task.sweep_index), []).append(task)
+        for group in groups.values():
+            for task in group:
+                task.peers = {other.name: other.party for other in group if other.party != task.party}
 
     def get_my_ready_tasks(self) -> List["LogicTask"]:
         ready_tasks = []
@@ -0,0 +1,108 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing as mp
+import threading
+from typing import Callable, Union
+
+import settings
+
+
+class ExecutorPool:
+    """
+    Long-lived executor processes running the tasks of operators flagged "executor: pooled" in their mission,
+    e.g. short predict tasks that would otherwise spend most of their time starting a process, importing their
+    dependencies and loading their model, which stays in the model cache of the executor for the next task.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = settings.POOLED_EXECUTORS if max_workers is None else max_workers
+        self._detached = False
+        self._pool = None
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def detach(self):
+        """
+        Called in task executors, the pool of the worker they were forked from must not be used from them,
+        and they should not start long-lived executors of their own either. The tasks they launch, e.g. the
+        next task of their job, run in a process of their own.
+        """
+        self._detached, self._pool, self._busy, self._lock = True, None, 0, threading.Lock()
+
+    def is_available(self) -> bool:
+        return self.max_workers > 0 and not self._detached
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forked like the executors of the other tasks, so they share the same setup
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("fork"))
+            return self._pool
+
+    def _reset(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"pooled executor fail: {future.exception()}")
+
+    def submit(self, fn: Callable, *args) -> Future:
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            # an executor died, e.g. killed for running out of memory, start over with new ones
+            logging.warning("pooled executors broken, restart them")
+            self._reset(pool)
+            future = self._get_pool().submit(fn, *args)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._busy -= 1
+
+    def try_submit(self, fn: Callable, *args) -> Union[Future, None]:
+        """
+        Run fn in an idle executor, or return None when they are all busy. Tasks never queue behind the busy
+        ones, paired tasks queued in different orders on two parties would wait on each other at the start
+        barrier until it times out.
+        """
+        with self._lock:
+            if self._busy >= self.max_workers:
+                return None
+            self._busy += 1
+        try:
+            future = self.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+executor_pool = ExecutorPool()
@@ -0,0 +1,83 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from models.lease import Lease
+import settings
+from utils.db_utils import session_commit_with_retry
+
+
+class LeaderLease:
+    """
+    A DB-backed lease shared by all the workers and replicas connected to the same database.
+    Only the holder of an unexpired lease is the leader, the holder has to renew it by calling
+    acquire() again before it expires.
+    """
+
+    def __init__(self, name: str, holder: str = None, ttl: int = None):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.name = name
+        self._holder = holder
+        self.ttl = ttl or settings.LEASE_TTL
+
+    @property
+    def holder(self) -> str:
+        # evaluated lazily since gunicorn workers and executors are forked after import
+        return self._holder or f"{socket.gethostname()}-{os.getpid()}"
+
+    def acquire(self) -> bool:
+        with self.session_maker() as session:
+            utcnow = datetime.utcnow()
+            new_expire_time = utcnow + timedelta(seconds=self.ttl)
+            record = session.query(Lease).filter_by(name=self.name).first()
+            if record is None:  # create
+                session.add(Lease(name=self.name, holder=self.holder, expire_time=new_expire_time))
+            elif record.holder == self.holder or record.expire_time < utcnow:  # renew or take over
+                record.holder = self.holder
+                record.expire_time = new_expire_time
+            else:
+                return False
+            try:
+                session_commit_with_retry(session)
+                return True
+            except (IntegrityError, StaleDataError):
+                # another worker created or took over the lease concurrently
+                session.rollback()
+                logging.debug(f"lost the race for lease {self.name}")
+                return False
+
+    def release(self) -> bool:
+        with self.session_maker() as session:
+            record = session.query(Lease).filter_by(name=self.name, holder=self.holder).first()
+            if record is None:
+                return False
+            record.expire_time = datetime.utcnow()
+            try:
+                session_commit_with_retry(session)
+                return True
+            except StaleDataError:
+                session.rollback()
+                return False
+
+    def is_leader(self) -> bool:
+        with self.session_maker() as session:
+            record = session.query(Lease).filter_by(name=self.name).first()
+            return record is not None and record.holder == self.holder and record.expire_time >= datetime.utcnow()
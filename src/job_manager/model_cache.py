@@ -0,0 +1,99 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from monitor.metrics import MODEL_CACHE_REQUESTS
+import settings
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _unpickle(path: str) -> Any:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class ModelCache:
+    """
+    The models loaded by the operators of a long-lived executor, keyed by the hash and mtime of the model file
+    so a model is loaded again as soon as its file is replaced. The memory used by a model is estimated with the
+    size of its file, and the least recently used models are evicted once they exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = settings.MODEL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self._models: "OrderedDict[Tuple[str, int], Tuple[Any, int]]" = OrderedDict()
+        # path -> (mtime_ns, size, digest), unchanged files are not hashed again
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path: str) -> Tuple[Tuple[str, int], int]:
+        stat = os.stat(path)
+        known = self._digests.get(path)
+        if known is None or known[:2] != (stat.st_mtime_ns, stat.st_size):
+            known = (stat.st_mtime_ns, stat.st_size, file_digest(path))
+            self._digests[path] = known
+        return (known[2], known[0]), known[1]
+
+    def load(self, path: str, loader: Callable[[str], Any] = None) -> Any:
+        """
+        The model in path, loaded with loader, unpickled by default, unless it is already cached.
+        """
+        key, size = self._key(path)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                MODEL_CACHE_REQUESTS.labels("hit").inc()
+                return self._models[key][0]
+        model = (loader or _unpickle)(path)
+        MODEL_CACHE_REQUESTS.labels("miss").inc()
+        if size > self.max_bytes:
+            return model
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = (model, size)
+                self.size += size
+            while self.size > self.max_bytes:
+                (digest, _), (_, evicted_size) = self._models.popitem(last=False)
+                self.size -= evicted_size
+                self._digests = {p: known for p, known in self._digests.items() if known[2] != digest}
+        return model
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.isfile(path) and self._key(path)[0] in self._models
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._digests.clear()
+            self.size = 0
+
+
+# one per executor process, warm across the tasks run by long-lived executors
+model_cache = ModelCache()
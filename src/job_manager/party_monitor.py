@@ -0,0 +1,74 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+from typing import List
+
+from job_manager.lease import LeaderLease
+from network.config import network_config
+from network.health import party_health
+from network.outbox import PartyOutbox
+from network.request import request_manager
+import settings
+
+
+class PartyMonitor:
+    """
+    Ping the index of every partner so each worker notices a partner going down, or coming back, without
+    waiting for a call to it. The leader also replays the calls queued for the partners that are back.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.PARTY_PING_INTERVAL
+        self.lease = LeaderLease("party_outbox")
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def partners() -> List[str]:
+        return sorted(party for party in network_config.party_config if party != settings.PARTY)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="party_monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.lease.release()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("party monitor loop fail")
+
+    def run_once(self) -> bool:
+        for party in self.partners():
+            request_manager.ping(party)
+        if not self.lease.acquire():
+            return False
+        outbox = PartyOutbox()
+        for party in outbox.parties():
+            if not party_health.breaker(party).is_open():
+                outbox.flush(party, request_manager.replay)
+        return True
+
+
+party_monitor = PartyMonitor()
@@ -0,0 +1,122 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import socket
+from typing import Union
+
+from sqlalchemy.exc import IntegrityError
+
+from constants import Status
+from models.port_lease import PortLease
+from models.task import Task
+import settings
+from utils.db_utils import session_commit_with_retry
+
+
+def is_port_free(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+class PortAllocator:
+    """
+    Leases the ports the tasks of this party listen on in the socket network scheme, instead of deriving them
+    from a hash with no reservation, which let concurrent jobs collide. A task gets a port no other task holds
+    and that can be bound, starting from its hash-derived port, and keeps it until it finishes, its job is
+    canceled or the lease expires. The ports are agreed with the partners at the start barrier.
+    """
+
+    def __init__(self, lower_bound: int = None, upper_bound: int = None, ttl: int = None):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.lower_bound = settings.PORT_LOWER_BOUND if lower_bound is None else lower_bound
+        self.upper_bound = settings.PORT_UPPER_BOUND if upper_bound is None else upper_bound
+        self.ttl = settings.PORT_LEASE_TTL if ttl is None else ttl
+
+    def _preferred(self, job_id: str, task_name: str) -> int:
+        digest = hashlib.sha256(f"{job_id}.{task_name}.{settings.PARTY}".encode("utf-8")).hexdigest()
+        return self.lower_bound + int(digest, 16) % (self.upper_bound - self.lower_bound)
+
+    def get(self, job_id: str, task_name: str) -> Union[int, None]:
+        with self.session_maker() as session:
+            lease = session.query(PortLease).filter_by(job_id=job_id, task_name=task_name).first()
+            return lease.port if lease is not None else None
+
+    def acquire(self, job_id: str, task_name: str) -> int:
+        """
+        The port leased to a task, the same one when it asks again, e.g. after its executor was restarted.
+        """
+        port = self.get(job_id, task_name)
+        if port is not None:
+            return port
+        size = self.upper_bound - self.lower_bound
+        start = self._preferred(job_id, task_name) - self.lower_bound
+        with self.session_maker() as session:
+            leased = {port for port, in session.query(PortLease.port).all()}
+        for offset in range(size):
+            port = self.lower_bound + (start + offset) % size
+            if port in leased or not is_port_free(port):
+                continue
+            expire_time = datetime.utcnow() + timedelta(seconds=self.ttl)
+            with self.session_maker() as session:
+                session.add(PortLease(port=port, job_id=job_id, task_name=task_name, expire_time=expire_time))
+                try:
+                    session_commit_with_retry(session)
+                except IntegrityError:
+                    # leased by another worker in the meantime, or to this task by a concurrent call
+                    session.rollback()
+                    port = self.get(job_id, task_name)
+                    if port is not None:
+                        return port
+                    continue
+            logging.info(f"leased port {port} to {job_id}.{task_name}")
+            return port
+        raise RuntimeError(f"no free port in {self.lower_bound}-{self.upper_bound} for {job_id}.{task_name}")
+
+    def release(self, job_id: str, task_name: str = None) -> int:
+        """
+        Release the port of a task, or of every task of a job, return the number of released leases.
+        """
+        with self.session_maker() as session:
+            query = session.query(PortLease).filter_by(job_id=job_id)
+            if task_name is not None:
+                query = query.filter_by(task_name=task_name)
+            released = query.delete(synchronize_session=False)
+            session_commit_with_retry(session)
+        return released
+
+    def sweep(self) -> int:
+        """
+        Release the leases which have expired or whose task no longer runs, e.g. its executor was killed.
+        """
+        with self.session_maker() as session:
+            leases = session.query(PortLease).all()
+            running = {(task.job_id, task.name) for task in session.query(Task.job_id, Task.name).filter(
+                Task.job_id.in_({lease.job_id for lease in leases}), Task.status == Status.RUNN)}
+            utcnow = datetime.utcnow()
+            stale = [
+                lease.id
+                for lease in leases
+                if lease.expire_time < utcnow or (lease.job_id, lease.task_name) not in running
+            ]
+            if stale:
+                session.query(PortLease).filter(PortLease.id.in_(stale)).delete(synchronize_session=False)
+                session_commit_with_retry(session)
+        return len(stale)
@@ -0,0 +1,268 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import OrderedDict
+import copy
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from constants import Status
+from exceptions.exceptions import TooManyRequestsError
+from job_manager.lease import LeaderLease
+from models.job import Job
+from models.mission import Mission
+from models.predict_request import PredictRequest
+import settings
+from utils.db_utils import session_commit_with_retry
+from utils.id_utils import generate_job_id, generate_predict_request_id
+from utils.path_utils import validated_pathlike
+
+# predict missions accepted by the front door, and the missions their batches run
+BATCH_MISSIONS = {
+    "xgboost_classifier_predict": "xgboost_classifier_predict_batch",
+    "xgboost_regressor_predict": "xgboost_regressor_predict_batch"
+}
+# the params of a party that differ between the requests of a batch, everything else must be the same
+_REQUEST_FIELDS = (("inputs", "predict_data"), ("outputs", "inference_res_path"))
+
+
+def _split_party_params(party: str, party_params: Dict) -> Tuple[Dict, Dict]:
+    shared, own = copy.deepcopy(party_params), {}
+    for section, key in _REQUEST_FIELDS:
+        value = shared.get(section, {}).pop(key, None)
+        if not isinstance(value, str):
+            raise ValueError(f"{party}.{section}.{key} is required")
+        own[key] = value
+    return shared, own
+
+
+class PredictBatcher:
+    """
+    The front door of small predict requests. Requests are queued in the db, and the leader merges the ones
+    of the same user, mission, partner and models into one batch job, once enough of them are queued or the oldest
+    has waited long enough, so the protocol setup of a job is paid once for the whole batch. The batch job
+    concatenates the predict data of the requests on every party, predicts once, and splits the results
+    back to the outputs of each request, whose status follows the one of its batch job.
+    """
+
+    def __init__(self, interval: float = None):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.interval = interval or settings.PREDICT_BATCH_INTERVAL
+        self.lease = LeaderLease("predict_batcher")
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def submit(self, params: Dict, user_name: str = None) -> str:
+        mission_name = params.get("mission_name")
+        if mission_name not in BATCH_MISSIONS:
+            raise ValueError(f"mission {mission_name} can not be batched, expect one of {list(BATCH_MISSIONS)}")
+        if params.get("main_party", settings.PARTY) != settings.PARTY:
+            raise ValueError("predict requests must be submitted to the main party")
+        with self.session_maker() as session:
+            mission = session.query(Mission).filter_by(name=mission_name).order_by(Mission.version.desc()).first()
+            if mission is None:
+                raise ValueError(f"mission {mission_name} not found")
+            parties = sorted({operator["party"] for operator in json.loads(mission.dag)["operators"]})
+
+            mission_params = params.get("mission_params", {})
+            shared = {key: value for key, value in mission_params.items() if key not in parties}
+            for party in parties:
+                shared[party], own = _split_party_params(party, mission_params.get(party, {}))
+                # fail fast on the inputs of this party, those of partners are checked when the batch runs
+                predict_data = validated_pathlike(own["predict_data"], settings.SAFE_WORK_DIR)
+                if party == settings.PARTY and not os.path.isfile(predict_data):
+                    raise ValueError(f"predict data {own['predict_data']} not found")
+            # the batch job is owned by one user, who can read the params of all its requests
+            batch = {"mission_name": mission_name, "mission_params": shared, "user_name": user_name or ""}
+            batch_key = hashlib.sha256(json.dumps(batch, sort_keys=True).encode("utf-8")).hexdigest()
+
+            request_id = generate_predict_request_id()
+            request_params = {"mission_name": mission_name, "mission_params": mission_params, "parties": parties}
+            session.add(
+                PredictRequest(request_id=request_id,
+                               batch_key=batch_key,
+                               mission_name=mission_name,
+                               params=json.dumps(request_params),
+                               user_name=user_name or "",
+                               status=Status.INIT))
+            session_commit_with_retry(session)
+        logging.info(f"queued predict request {request_id} of {mission_name} in batch {batch_key[:8]}")
+        return request_id
+
+    def get(self, request_id: str, user_name: str = None) -> Dict:
+        with self.session_maker() as session:
+            query = session.query(PredictRequest).filter_by(request_id=request_id)
+            if user_name is not None:
+                query = query.filter_by(user_name=user_name)
+            predict_request = query.first()
+            if predict_request is None:
+                raise ValueError(f"predict request {request_id} not found")
+            return predict_request.to_dict()
+
+    def get_ready_batches(self, now: datetime = None) -> List[List[Dict]]:
+        """
+        The batches to submit, every full batch and the last partial batch of a key once its oldest request
+        has waited for the batch window.
+        """
+        now = now or datetime.utcnow()
+        window_start = now - timedelta(seconds=settings.PREDICT_BATCH_WINDOW)
+        groups: "OrderedDict[Tuple[str, str], List[Dict]]" = OrderedDict()
+        with self.session_maker() as session:
+            for predict_request in session.query(PredictRequest).filter_by(status=Status.INIT).order_by(
+                    PredictRequest.id):
+                # never merge the requests of different users, whatever their batch key
+                groups.setdefault((predict_request.batch_key, predict_request.user_name), []).append({
+                    "request_id": predict_request.request_id,
+                    "params": json.loads(predict_request.params),
+                    "user_name": predict_request.user_name,
+                    "create_time": predict_request.create_time
+                })
+        batches = []
+        size = settings.PREDICT_BATCH_MAX_REQUESTS
+        for requests in groups.values():
+            for i in range(0, len(requests), size):
+                batch = requests[i:i + size]
+                if len(batch) == size or batch[0]["create_time"] <= window_start:
+                    batches.append(batch)
+        return batches
+
+    @staticmethod
+    def build_params(requests: List[Dict]) -> Dict:
+        first = requests[0]["params"]
+        parties = first["parties"]
+        mission_params = {key: value for key, value in first["mission_params"].items() if key not in parties}
+        for party in parties:
+            mission_params[party], _ = _split_party_params(party, first["mission_params"][party])
+            mission_params[party]["batch"] = [{
+                "request_id": predict_request["request_id"],
+                **_split_party_params(party, predict_request["params"]["mission_params"][party])[1]
+            } for predict_request in requests]
+        return {
+            "mission_name": BATCH_MISSIONS[first["mission_name"]],
+            "mission_version": "latest",
+            "main_party": settings.PARTY,
+            "mission_params": mission_params
+        }
+
+    def _update_requests(self, request_ids: List[str], from_status: str, values: Dict) -> bool:
+        with self.session_maker() as session:
+            requests = session.query(PredictRequest).filter(PredictRequest.request_id.in_(request_ids),
+                                                            PredictRequest.status == from_status).all()
+            if len(requests) != len(request_ids):
+                return False
+            for predict_request in requests:
+                for key, value in values.items():
+                    setattr(predict_request, key, value)
+            try:
+                session_commit_with_retry(session)
+                return True
+            except StaleDataError:
+                session.rollback()
+                return False
+
+    def submit_batch(self, requests: List[Dict]) -> str:
+        from job_manager.core import JobManager
+        job_id = generate_job_id()
+        request_ids = [predict_request["request_id"] for predict_request in requests]
+        if not self._update_requests(request_ids, Status.INIT, {"status": Status.RUNN, "job_id": job_id}):
+            logging.info(f"predict requests of batch {job_id} have changed, retry in the next round")
+            return None
+        try:
+            JobManager(job_id).submit(self.build_params(requests), requests[0]["user_name"])
+        except TooManyRequestsError:
+            # out of capacity, requests are queued again and the batch keeps growing meanwhile
+            self._update_requests(request_ids, Status.RUNN, {"status": Status.INIT, "job_id": None})
+            return None
+        except Exception as e:
+            logging.exception(f"submit predict batch {job_id} fail")
+            self._update_requests(request_ids, Status.RUNN, {"status": Status.FAIL, "errors": str(e)})
+            return None
+        logging.info(f"submitted {len(requests)} predict requests as job {job_id}")
+        return job_id
+
+    def sync(self, now: datetime = None) -> int:
+        """
+        Update the requests whose batch job has finished, return their number. Requests whose batch job never
+        showed up, e.g. the worker submitting it died, are queued again after PREDICT_BATCH_SUBMIT_TIMEOUT.
+        """
+        orphan_time = (now or datetime.utcnow()) - timedelta(seconds=settings.PREDICT_BATCH_SUBMIT_TIMEOUT)
+        with self.session_maker() as session:
+            requests = session.query(PredictRequest).filter_by(status=Status.RUNN).all()
+            job_ids = {predict_request.job_id for predict_request in requests}
+            if not job_ids:
+                return 0
+            jobs = {job.job_id: job for job in session.query(Job).filter(Job.job_id.in_(job_ids))}
+            updated = 0
+            for predict_request in requests:
+                job = jobs.get(predict_request.job_id)
+                if job is None:
+                    if predict_request.update_time < orphan_time:
+                        logging.warning(f"batch job {predict_request.job_id} of predict request "
+                                        f"{predict_request.request_id} not found, queue it again")
+                        predict_request.status = Status.INIT
+                        predict_request.job_id = None
+                        updated += 1
+                    continue
+                if job.status not in Status.finished:
+                    continue
+                failed = json.loads(job.job_context).get("common", {}).get("predict_batch", {}).get("failed", {})
+                if job.status != Status.SUCC:
+                    predict_request.status = Status.FAIL
+                    predict_request.errors = f"batch job {job.job_id} {job.status.lower()}"
+                elif predict_request.request_id in failed:
+                    predict_request.status = Status.FAIL
+                    predict_request.errors = failed[predict_request.request_id]
+                else:
+                    predict_request.status = Status.SUCC
+                updated += 1
+            session_commit_with_retry(session)
+        return updated
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="predict_batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.lease.release()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("predict batcher loop fail")
+
+    def run_once(self) -> bool:
+        if not self.lease.acquire():
+            return False
+        for requests in self.get_ready_batches():
+            self.submit_batch(requests)
+        self.sync()
+        return True
+
+
+predict_batcher = PredictBatcher()
@@ -0,0 +1,82 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import cProfile
+import json
+import logging
+import os
+import pstats
+from typing import Dict, List
+
+from models.task_profile import TaskProfile
+import settings
+from utils.db_utils import session_commit_with_retry
+
+
+class OperatorProfiler:
+    """
+    Runs a callable under cProfile, dumps the raw stats as an artifact that can be loaded with pstats
+    or snakeviz, and keeps the top functions by cumulative time as a summary of the task.
+    """
+
+    def __init__(self, job_id: str, task_name: str, top: int = None):
+        self.job_id = job_id
+        self.task_name = task_name
+        self.top = top or settings.PROFILE_TOP_FUNCTIONS
+        self.artifact_path = os.path.join(settings.PROFILE_DIR, job_id, f"{task_name}.prof")
+        self.summary: List[Dict] = []
+
+    def run(self, func, *args, **kwargs):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._dump(profile)
+
+    def _dump(self, profile: "cProfile.Profile"):
+        try:
+            os.makedirs(os.path.dirname(self.artifact_path), exist_ok=True)
+            profile.dump_stats(self.artifact_path)
+            stats = pstats.Stats(profile).stats
+            ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+            self.summary = [{
+                "function": f"{filename}:{line}({name})",
+                "ncalls": ncalls,
+                "tottime": round(tottime, 6),
+                "cumtime": round(cumtime, 6)
+            } for (filename, line, name), (_, ncalls, tottime, cumtime, _) in ranked]
+        except Exception:
+            logging.exception(f"dump profile of {self.job_id}.{self.task_name} fail")
+
+    def save(self):
+        if not self.summary:
+            return
+        from extensions import get_session_maker
+        try:
+            with get_session_maker()() as session:
+                session.query(TaskProfile).filter_by(job_id=self.job_id, task_name=self.task_name).delete()
+                session.add(
+                    TaskProfile(job_id=self.job_id,
+                                task_name=self.task_name,
+                                artifact_path=self.artifact_path,
+                                summary=json.dumps(self.summary)))
+                session_commit_with_retry(session)
+        except Exception:
+            logging.exception(f"save profile of {self.job_id}.{self.task_name} fail")
+
+
+def is_profiling_enabled(configmap: Dict, party: str) -> bool:
+    # "profile": true in mission_params, either common or for the given party only
+    return bool(configmap.get("common", {}).get("profile") or configmap.get(party, {}).get("profile"))
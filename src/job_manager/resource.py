@@ -0,0 +1,152 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List
+
+from models.job import Job
+from models.task_resource import TaskResource
+import settings
+from utils.db_utils import session_commit_with_retry
+from utils.proc_utils import get_process_tree, is_proc_available, read_net_bytes, read_process_stats
+
+
+class ResourceSampler:
+    """
+    Samples the CPU time, memory, storage and network I/O of a process and all its descendants in a
+    background thread. Counters of descendants are kept after they exit, so the totals cover the whole
+    lifetime of the process tree.
+    """
+
+    def __init__(self, pid: int = None, interval: float = None, max_samples: int = None):
+        self.pid = pid or os.getpid()
+        self.interval = interval or settings.RESOURCE_SAMPLE_INTERVAL
+        self.max_samples = max_samples or settings.RESOURCE_MAX_SAMPLES
+        self.samples: List[List] = []
+        self.summary: Dict = {}
+        self._per_pid: Dict[int, Dict] = {}
+        self._net_start = (0, 0)
+        # counters of the process before the task, a long-lived executor has already run other tasks
+        self._baseline: Dict = {}
+        self._start_time = None
+        self._stride, self._skipped = 1, 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not is_proc_available():
+            logging.warning("/proc is not available, resource sampling is disabled")
+            return
+        self._start_time = time.time()
+        self._net_start = read_net_bytes(self.pid)
+        try:
+            self._baseline = read_process_stats(self.pid)
+        except OSError:
+            self._baseline = {}
+        self._thread = threading.Thread(target=self._loop, name="resource_sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict:
+        if self._thread is None:
+            return self.summary
+        self._stop_event.set()
+        self._thread.join()
+        self._sample()
+        return self.summary
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:
+                logging.exception("sample resource usage fail")
+
+    def _sample(self):
+        rss = 0
+        for pid in get_process_tree(self.pid):
+            try:
+                stats = read_process_stats(pid)
+            except OSError:
+                continue
+            rss += stats["rss"]
+            self._per_pid[pid] = stats
+        totals = {
+            key: sum(stats[key] for stats in self._per_pid.values()) - self._baseline.get(key, 0)
+            for key in ("cpu_seconds", "read_bytes", "write_bytes")
+        }
+        rx, tx = read_net_bytes(self.pid)
+        elapsed = time.time() - self._start_time
+        self.summary = {
+            "duration": elapsed,
+            "cpu_seconds": totals["cpu_seconds"],
+            "peak_rss": max(rss, self.summary.get("peak_rss", 0), self._own_peak_rss()),
+            "read_bytes": totals["read_bytes"],
+            "write_bytes": totals["write_bytes"],
+            "net_rx_bytes": rx - self._net_start[0],
+            "net_tx_bytes": tx - self._net_start[1]
+        }
+        self._append([
+            round(elapsed, 3), totals["cpu_seconds"], rss, totals["read_bytes"], totals["write_bytes"],
+            self.summary["net_rx_bytes"], self.summary["net_tx_bytes"]
+        ])
+
+    def _own_peak_rss(self) -> int:
+        # the high water mark covers the whole life of the process, in a long-lived executor it may be the peak
+        # of an earlier task, only a mark raised since the task started is its own, else the samples tell
+        peak_rss = self._per_pid.get(self.pid, {}).get("peak_rss", 0)
+        return peak_rss if peak_rss > self._baseline.get("peak_rss", 0) else 0
+
+    def _append(self, sample: List):
+        # downsample by doubling the stride whenever the series is full, keeping it evenly spaced
+        self._skipped += 1
+        if self._skipped < self._stride:
+            return
+        self._skipped = 0
+        self.samples.append(sample)
+        if len(self.samples) >= self.max_samples:
+            self.samples = self.samples[::2]
+            self._stride *= 2
+
+    def save(self, job_id: str, task_name: str, mission_name: str, operator: str):
+        if not self.summary:
+            return
+        from extensions import get_session_maker
+        try:
+            with get_session_maker()() as session:
+                session.add(
+                    TaskResource(job_id=job_id,
+                                 task_name=task_name,
+                                 mission_name=mission_name,
+                                 operator=operator,
+                                 samples=json.dumps(self.samples),
+                                 **self.summary))
+                session_commit_with_retry(session)
+        except Exception:
+            logging.exception(f"save resource usage of {job_id}.{task_name} fail")
+
+
+def get_mission_resources(mission_name: str,
+                          user_name: str = None,
+                          limit: int = 20,
+                          with_samples: bool = False) -> List[Dict]:
+    from extensions import get_session_maker
+    with get_session_maker()() as session:
+        query = session.query(TaskResource).filter_by(mission_name=mission_name)
+        if user_name is not None:
+            query = query.join(Job, Job.job_id == TaskResource.job_id).filter(Job.user_name == user_name)
+        records = query.order_by(TaskResource.id.desc()).limit(limit).all()
+        return [record.to_dict(with_samples) for record in records]
@@ -0,0 +1,87 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import threading
+
+from constants import Status
+from job_manager.lease import LeaderLease
+from job_manager.ports import PortAllocator
+from job_manager.scratch import sweep_scratch
+from models.job import Job
+from models.task import Task
+from monitor.metrics import SCHEDULER_QUEUE_DEPTH
+import settings
+
+
+class Scheduler:
+    """
+    Periodically re-triggers running jobs so that ready tasks are launched even if the event
+    that should have started them was lost. Every worker runs a scheduler, but only the one
+    holding the scheduler lease does the work, task claiming keeps the launches idempotent.
+    """
+
+    def __init__(self, interval: float = None):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.interval = interval or settings.SCHEDULER_INTERVAL
+        self.lease = LeaderLease("scheduler")
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.lease.release()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("scheduler loop fail")
+
+    def run_once(self) -> bool:
+        if not self.lease.acquire():
+            return False
+        from job_manager.core import JobManager
+        with self.session_maker() as session:
+            job_ids = [job.job_id for job in session.query(Job.job_id).filter_by(status=Status.RUNN).all()]
+            pending = session.query(Task).filter_by(party=settings.PARTY, status=Status.INIT)
+            queue_depth = pending.filter(Task.job_id.in_(job_ids)).count() if job_ids else 0
+        SCHEDULER_QUEUE_DEPTH.set(queue_depth)
+        for job_id in job_ids:
+            try:
+                JobManager(job_id).trigger_job()
+            except Exception:
+                logging.exception(f"schedule job {job_id} fail")
+        try:
+            sweep_scratch(self.session_maker)
+        except Exception:
+            logging.exception("sweep scratch dirs fail")
+        try:
+            PortAllocator().sweep()
+        except Exception:
+            logging.exception("sweep port leases fail")
+        return True
+
+
+scheduler = Scheduler()
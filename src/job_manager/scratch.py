@@ -0,0 +1,111 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import logging
+import os
+import shutil
+from typing import Dict, List, Set
+
+from constants import Status
+from models.job import Job
+import settings
+
+
+class JobScratch:
+    """
+    The scratch dir of a job, where the tasks of a multi-stage mission exchange their intermediate artifacts.
+    It is always reached as SCRATCH_DIR/<job_id>, which is a link to a dir in tmpfs when the job inputs fit
+    in it, so the artifacts a task writes are read back by the next one from memory rather than disk.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.path = os.path.join(settings.SCRATCH_DIR, job_id)
+
+    def _tmpfs_path(self) -> str:
+        return os.path.join(settings.SCRATCH_TMPFS_DIR, "petplatform_scratch", f"{settings.PARTY}_{self.job_id}")
+
+    def _fits_tmpfs(self, estimated_size: int) -> bool:
+        if not settings.SCRATCH_TMPFS_DIR or not os.path.isdir(settings.SCRATCH_TMPFS_DIR):
+            return False
+        return shutil.disk_usage(settings.SCRATCH_TMPFS_DIR).free >= estimated_size * settings.SCRATCH_TMPFS_HEADROOM
+
+    def create(self, estimated_size: int = 0) -> str:
+        if os.path.lexists(self.path):
+            return self.path
+        os.makedirs(settings.SCRATCH_DIR, exist_ok=True)
+        if not self._fits_tmpfs(estimated_size):
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            return self.path
+        target = self._tmpfs_path()
+        os.makedirs(target, mode=0o700, exist_ok=True)
+        try:
+            os.symlink(target, self.path, target_is_directory=True)
+            logging.info(f"scratch dir of {self.job_id} in tmpfs: {target}")
+        except FileExistsError:
+            # created concurrently by another task of the job, which may have decided otherwise
+            if os.path.realpath(self.path) != os.path.realpath(target):
+                shutil.rmtree(target, ignore_errors=True)
+        return self.path
+
+    def cleanup(self):
+        if os.path.islink(self.path):
+            target = os.path.realpath(self.path)
+            os.unlink(self.path)
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            return
+        logging.info(f"removed scratch dir of {self.job_id}")
+
+
+def estimate_input_size(party_config: Dict) -> int:
+    inputs = party_config.get("inputs", {})
+    paths = [path for path in inputs.values() if isinstance(path, str)] if isinstance(inputs, dict) else []
+    return sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+
+
+def leftover_job_ids(session_maker, job_ids: List[str], retention: int = None) -> Set[str]:
+    """
+    The jobs among job_ids whose intermediate files can go, finished ones and those failed more than retention
+    seconds ago, which are kept until then for a rerun to resume from the artifacts of the succeeded tasks.
+    """
+    if not job_ids:
+        return set()
+    retention = settings.SCRATCH_RETENTION if retention is None else retention
+    expire_time = datetime.utcnow() - timedelta(seconds=retention)
+    with session_maker() as session:
+        jobs = {job.job_id: job for job in session.query(Job).filter(Job.job_id.in_(job_ids)).all()}
+    leftovers = set()
+    for job_id in job_ids:
+        job = jobs.get(job_id)
+        if job is not None and job.status == Status.RUNN:
+            continue
+        if job is not None and job.status == Status.FAIL and job.update_time > expire_time:
+            continue
+        leftovers.add(job_id)
+    return leftovers
+
+
+def sweep_scratch(session_maker, retention: int = None) -> int:
+    """
+    Remove the scratch dirs left behind by finished jobs, see leftover_job_ids.
+    """
+    if not os.path.isdir(settings.SCRATCH_DIR):
+        return 0
+    leftovers = leftover_job_ids(session_maker, os.listdir(settings.SCRATCH_DIR), retention)
+    for job_id in leftovers:
+        JobScratch(job_id).cleanup()
+    return len(leftovers)
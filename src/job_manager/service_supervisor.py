@@ -0,0 +1,222 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import fcntl
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List
+
+from job_manager import compiler_service
+from monitor.metrics import SERVICE_RESTARTS, SERVICE_UP
+import settings
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ServiceSupervisor:
+    """
+    Run a long-lived local service and keep it healthy. One worker of the host, the one holding the lock file
+    next to the socket, supervises the service. It starts the service, checks its health every interval, and
+    restarts it when it exits or, once started, fails max_failures health checks in a row. Restarts back off
+    exponentially up to SERVICE_RESTART_BACKOFF_MAX seconds, the backoff is reset once the service is healthy.
+
+    The service runs in its own process group, killed with it when the worker stops or exits. Its pid is kept
+    next to the lock, so that a worker taking the lock over kills the service left by one which died.
+    """
+
+    def __init__(self,
+                 name: str,
+                 command: List[str],
+                 socket_path: str,
+                 health_check: Callable[[str], bool],
+                 interval: float = None,
+                 max_failures: int = None):
+        self.name = name
+        self.command = command
+        self.socket_path = socket_path
+        self.health_check = health_check
+        self.interval = settings.SERVICE_HEALTH_INTERVAL if interval is None else interval
+        self.max_failures = settings.SERVICE_MAX_FAILURES if max_failures is None else max_failures
+        self.process = None
+        self.healthy = False
+        self.failures = 0
+        self.restarts = 0
+        self._backoff = 0
+        self._next_start = 0
+        self._started_at = 0
+        self._ready = False
+        self._lock_file = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._exit_hook = False
+
+    @property
+    def _pid_path(self) -> str:
+        return f"{self.socket_path}.pid"
+
+    def _acquire_lock(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        lock_file = open(f"{self.socket_path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._reap_orphan()
+        return True
+
+    def _is_service(self, pid: int) -> bool:
+        try:
+            # the service leads its own process group, the pid may since have been reused by another process
+            if os.getpgid(pid) != pid:
+                return False
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                return f.read().split(b"\0")[:-1] == [os.fsencode(arg) for arg in self.command]
+        except OSError:
+            return False
+
+    def _reap_orphan(self):
+        try:
+            with open(self._pid_path) as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            return
+        if self._is_service(pid):
+            logging.warning(f"kill service {self.name} with pid {pid} left by a previous worker")
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        os.remove(self._pid_path)
+
+    def _set_healthy(self, healthy: bool):
+        self.healthy = healthy
+        SERVICE_UP.labels(self.name).set(1 if healthy else 0)
+
+    def _start_process(self):
+        logging.info(f"start service {self.name}: {' '.join(self.command)}")
+        self.process = subprocess.Popen(self.command, cwd=SRC_DIR, start_new_session=True)
+        with open(self._pid_path, "w") as f:
+            f.write(str(self.process.pid))
+        self.failures, self._started_at, self._ready = 0, time.time(), False
+
+    def _stop_process(self):
+        if self.process is None:
+            return
+        self._kill_group(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=settings.SERVICE_HEALTH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._kill_group(signal.SIGKILL)
+            self.process.wait()
+        self.process = None
+        if os.path.exists(self._pid_path):
+            os.remove(self._pid_path)
+
+    def _kill_group(self, sig: int):
+        try:
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _schedule_restart(self, reason: str):
+        self._set_healthy(False)
+        self.restarts += 1
+        SERVICE_RESTARTS.labels(self.name).inc()
+        self._backoff = min(max(self._backoff * 2, self.interval), settings.SERVICE_RESTART_BACKOFF_MAX)
+        self._next_start = time.time() + self._backoff
+        logging.warning(f"service {self.name} {reason}, restart in {self._backoff} seconds")
+
+    def run_once(self) -> bool:
+        """
+        One round of supervision, return whether the service is healthy.
+        """
+        if not self._acquire_lock():
+            # supervised by another worker, only report its health
+            self.healthy = self.health_check(self.socket_path)
+            return self.healthy
+        if self.process is not None and self.process.poll() is not None:
+            code = self.process.returncode
+            self.process = None
+            self._schedule_restart(f"exited with code {code}")
+        if self.process is None:
+            if time.time() >= self._next_start:
+                self._start_process()
+            return False
+
+        if self.health_check(self.socket_path):
+            self.failures, self._backoff, self._ready = 0, 0, True
+            self._set_healthy(True)
+            return True
+        if not self._ready and time.time() - self._started_at < settings.SERVICE_START_TIMEOUT:
+            # still starting, e.g. the JVM of the compiler warming up
+            return False
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self._stop_process()
+            self._schedule_restart(f"failed {self.failures} health checks")
+        elif self.healthy:
+            logging.warning(f"service {self.name} failed a health check")
+        return False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        if not self._exit_hook:
+            atexit.register(self.stop)
+            self._exit_hook = True
+        self._thread = threading.Thread(target=self._loop, name=f"supervisor_{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._stop_process()
+        self._set_healthy(False)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception(f"supervisor of service {self.name} fail")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+def _ping_compiler(socket_path: str) -> bool:
+    return compiler_service.ping(socket_path, timeout=settings.SERVICE_HEALTH_TIMEOUT)
+
+
+compiler_supervisor = ServiceSupervisor(
+    "petsql_compiler",
+    [
+        sys.executable, "-m", "job_manager.compiler_service", "--socket", settings.PETSQL_COMPILER_SOCKET, "--entry",
+        settings.PETSQL_COMPILER_ENTRY
+    ],
+    settings.PETSQL_COMPILER_SOCKET,
+    _ping_compiler,
+)
@@ -0,0 +1,128 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import itertools
+import json
+import math
+import random
+from typing import Dict, List
+
+import settings
+from utils.deep_merge import deep_merge
+
+
+def _sample(space, rng: random.Random):
+    if isinstance(space, list):
+        return rng.choice(space)
+    if isinstance(space, dict) and "min" in space and "max" in space:
+        low, high = space["min"], space["max"]
+        if space.get("log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        return int(round(value)) if space.get("int") else value
+    raise ValueError(f"invalid search space {space}, expect a list of values or a dict with min and max")
+
+
+def expand_candidates(spec: Dict) -> List[Dict]:
+    """
+    The hyperparameters of the candidates of a sweep, either every combination of a grid,
+    {"grid": {"max_depth": [2, 3]}}, or random picks, {"random": {"max_depth": [2, 3],
+    "learning_rate": {"min": 0.01, "max": 0.3, "log": true}}, "n_candidates": 8, "seed": 0}.
+    The expansion is deterministic, so that every party expands a sweep into the same candidates.
+    """
+    if "grid" in spec:
+        grid = spec["grid"]
+        keys = sorted(grid)
+        candidates = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    elif "random" in spec:
+        rng = random.Random(spec.get("seed", 0))
+        space = spec["random"]
+        candidates = [{key: _sample(space[key], rng) for key in sorted(space)} for _ in range(spec["n_candidates"])]
+    else:
+        raise ValueError("sweep expects a grid or a random search space")
+    if not candidates:
+        raise ValueError("sweep has no candidate")
+    if len(candidates) > settings.SWEEP_MAX_CANDIDATES:
+        raise ValueError(f"sweep has {len(candidates)} candidates, more than {settings.SWEEP_MAX_CANDIDATES}")
+    return candidates
+
+
+def _substitute(value, index: int):
+    return json.loads(json.dumps(value).replace("${sweep.index}", str(index)))
+
+
+def _expand_items(dag: Dict, mission_params: Dict):
+    swept = {operator["name"] for operator in dag["operators"] if operator.get("sweep")}
+    if swept:
+        spec = mission_params.get("sweep")
+        if not isinstance(spec, dict):
+            raise ValueError("mission params sweep is required by the sweep operators of the mission")
+        return swept, expand_candidates(spec), spec.get("parallelism", settings.SWEEP_MAX_PARALLEL)
+
+    keys = {operator["foreach"] for operator in dag["operators"] if operator.get("foreach")}
+    if not keys:
+        return swept, [], 1
+    if len(keys) > 1:
+        raise ValueError(f"the operators of a mission can only loop over one list, got {sorted(keys)}")
+    key = keys.pop()
+    items = mission_params.get(key)
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ValueError(f"mission params {key} must be a non empty list of dicts")
+    if len(items) > settings.SWEEP_MAX_CANDIDATES:
+        raise ValueError(f"{key} has {len(items)} items, more than {settings.SWEEP_MAX_CANDIDATES}")
+    looped = {operator["name"] for operator in dag["operators"] if operator.get("foreach")}
+    return looped, items, mission_params.get("parallelism", settings.SWEEP_MAX_PARALLEL)
+
+
+def expand_dag(dag: Dict, mission_params: Dict) -> Dict:
+    """
+    Expand the operators flagged "sweep: true" into one operator per candidate of mission_params["sweep"],
+    named "<name>.<index>". The hyperparameters of a candidate are merged into the common configmap of its
+    operators, and "${sweep.index}" in their args and configmap is replaced by its index. Dependencies between
+    swept operators stay within a candidate, other operators depend on every candidate. At most
+    "parallelism" candidates run at the same time, the first operators of a candidate wait for the whole
+    candidate that many places before it.
+
+    Operators flagged "foreach: <key>" are expanded the same way over the dicts of the list mission_params[key],
+    e.g. the queries of a batch SQL job. Their dicts are deep-merged into the common configmap, so the config of a
+    query only overrides the fields it sets.
+    """
+    swept, candidates, parallelism = _expand_items(dag, mission_params)
+    if not swept:
+        return dag
+    parallelism = max(1, min(parallelism, settings.SWEEP_MAX_PARALLEL))
+
+    operators = []
+    for operator in dag["operators"]:
+        if operator["name"] not in swept:
+            depends = []
+            for dep in operator.get("depends", []):
+                depends += [f"{dep}.{i}" for i in range(len(candidates))] if dep in swept else [dep]
+            operators.append({**operator, "depends": depends})
+            continue
+        for index, candidate in enumerate(candidates):
+            expanded = _substitute({k: v for k, v in operator.items() if k not in ("sweep", "foreach")}, index)
+            depends = [f"{dep}.{index}" if dep in swept else dep for dep in operator.get("depends", [])]
+            if index >= parallelism and not any(dep in swept for dep in operator.get("depends", [])):
+                depends += [f"{name}.{index - parallelism}" for name in sorted(swept)]
+            configmap = copy.deepcopy(expanded.get("configmap", {}))
+            deep_merge(configmap.setdefault("common", {}), copy.deepcopy(candidate))
+            operators.append({
+                **expanded, "name": f"{operator['name']}.{index}",
+                "depends": depends,
+                "configmap": configmap,
+                "sweep_index": index
+            })
+    return {**dag, "operators": operators}
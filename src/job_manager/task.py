@@ -15,14 +15,27 @@ import importlib
 import logging
 import re
 import time
-from typing import Dict
+from typing import Dict, Tuple
 
+from config.mission_cache import MissionCache, get_psi_cache_options
 from constants import Status
+from job_manager import compiler_service
+from job_manager.artifact import ArtifactNegotiator
+from job_manager.barrier import StartBarrier
 from job_manager.dag import LogicTask
+from job_manager.executor_pool import executor_pool
+from job_manager.ports import PortAllocator
+from job_manager.profiler import OperatorProfiler, is_profiling_enabled
+from job_manager.resource import ResourceSampler
+from job_manager.scratch import JobScratch, estimate_input_size
+from job_manager.timing import Phase, TaskTimer
+from monitor.metrics import LIVE_EXECUTORS, NETWORK_SCHEME_CHOICES, TASK_QUEUE_WAIT, TASK_RUN_TIME
 from network.config import network_config
+from network.probe import probe_and_choose
+from tracing import tracer
 import settings
 from utils.deep_merge import deep_merge
-from utils.path_utils import traverse_and_validate
+from utils.path_utils import is_inside_dir, traverse_and_validate, validated_pathlike
 
 
 class TaskExecutor:
@@ -35,41 +48,112 @@ class TaskExecutor:
         self.class_path = task.class_path
         self.class_name = task.class_name
         self.args = task.args
+        self.profile = task.profile
+        self.configmap_overrides = task.configmap
+        self.sweep_index = task.sweep_index
+        self.services = task.services
+        self.peers = task.peers
+        self.join_parties = None
         self.start_time = time.time()
+        self.timer = None
 
     def start(self):
-        from job_manager.core import JobManager
         from config.config_manager import ConfigManager
         config_manager = ConfigManager(mission_name=self.mission_name, job_id=self.job_id)
+        # the executor is forked from a worker, drop the spans and the executor pool inherited from it
+        tracer.reset()
+        executor_pool.detach()
+        try:
+            trace_id = config_manager.job_context.get("trace_id", party="common")
+        except Exception:
+            trace_id = None
+        attributes = {"job_id": self.job_id, "task": self.task_name, "party": self.party}
+        with tracer.span(f"task {self.task_name}", trace_id=trace_id, attributes=attributes):
+            self._execute(config_manager)
+
+    def _execute(self, config_manager):
+        from job_manager.core import JobManager
         job_manager = JobManager(job_id=self.job_id)
         success, errors = False, None
+        negotiator = None
+        sampler = ResourceSampler() if settings.RESOURCE_SAMPLE_INTERVAL > 0 else None
+        # created in the executor, the engine of the worker it was forked from must not be shared
+        port_allocator = PortAllocator()
+        self.timer = TaskTimer(self.job_id, self.task_name)
+        self.timer.mark(Phase.PROCESS_STARTED)
+        process_start_time = time.time()
+        TASK_QUEUE_WAIT.labels(self.mission_name, self.class_name).observe(process_start_time - self.start_time)
+        LIVE_EXECUTORS.inc()
         try:
             job_manager.update_task(self.task_name, Status.RUNN)
             operator_class = self._load_class()
             assert operator_class, RuntimeError(f"fail to load operator {self.class_name} from {self.class_path}")
-            configmap = self._parse_configmap(config_manager)
+            self.timer.mark(Phase.CLASS_LOADED)
+            configmap = self._parse_configmap(config_manager, operator_class)
+            negotiator = ArtifactNegotiator(self.job_id, self.task_name,
+                                            getattr(operator_class, "artifact_formats", None))
+            negotiator.prepare(configmap, self.party)
+            self.timer.mark(Phase.CONFIGMAP_RESOLVED)
             args_value_map: Dict = self._parse_args(config_manager=config_manager)
+            self.timer.mark(Phase.ARGS_RESOLVED)
+            ports, network = None, None
+            if self.peers and settings.START_BARRIER_TIMEOUT > 0 and getattr(operator_class, "start_barrier", True):
+                ports, network = self._start_together(port_allocator)
+            self._attach_network(configmap, ports, network)
             logging.info(f"ready to execute {self.job_id}.{self.task_name}, args: {args_value_map}")
             operator = operator_class(party=self.party, config_manager=config_manager, **args_value_map)
-            success = operator.run(configmap=configmap)
+            self.timer.mark(Phase.RUN_STARTED)
+            self.timer.flush()
+            job_manager.touch()
+            if sampler is not None:
+                sampler.start()
+            with tracer.span("operator.run", attributes={"operator": self.class_name}):
+                if self.profile or is_profiling_enabled(configmap, self.party):
+                    profiler = OperatorProfiler(self.job_id, self.task_name)
+                    try:
+                        success = profiler.run(operator.run, configmap=configmap)
+                    finally:
+                        profiler.save()
+                else:
+                    success = operator.run(configmap=configmap)
+            negotiator.finish(success)
+            self.timer.mark(Phase.RUN_FINISHED)
         except Exception as e:
             logging.exception(f"execute task {self.job_id}.{self.task_name} fail")
-            errors = str(e)
+            success, errors = False, str(e)
         finally:
+            if negotiator is not None:
+                # drop the scratch artifacts of a failed run, a no-op once finished
+                negotiator.finish(False)
+            if self._uses_ports():
+                try:
+                    port_allocator.release(self.job_id, self.task_name)
+                except Exception:
+                    logging.exception(f"release port of {self.job_id}.{self.task_name} fail")
             exec_time = time.time() - self.start_time
             logging.info(
                 f"{self.job_id}.{self.task_name} finish, success: {success}, exec time: {exec_time}, errors: {errors}")
+            TASK_RUN_TIME.labels(self.mission_name, self.class_name,
+                                 Status.SUCC if success else Status.FAIL).observe(time.time() - process_start_time)
+            LIVE_EXECUTORS.dec()
+            if sampler is not None:
+                sampler.stop()
+                sampler.save(self.job_id, self.task_name, self.mission_name, self.class_name)
             try:
                 job_manager.update_task(self.task_name, Status.SUCC if success else Status.FAIL, errors=errors)
+                self.timer.mark(Phase.STATUS_BROADCAST)
             except Exception:
                 logging.exception(f"update task status fail")
+            self.timer.flush()
+            # the last timings, resources and profile of the task were written after its status
+            job_manager.touch()
 
     def _load_class(self):
         module = importlib.import_module(self.class_path)
         my_class = getattr(module, self.class_name)
         return my_class
 
-    def _parse_configmap(self, config_manager) -> Dict:
+    def _parse_configmap(self, config_manager, operator_class=None) -> Dict:
         job_context: Dict = config_manager.job_context.get_all()
         join_parties = set(job_context.keys())
         join_parties.remove("common")
@@ -82,28 +166,142 @@ class TaskExecutor:
             deep_merge(configmap[party], party_config)
         configmap["common"] = job_context["common"]
         deep_merge(configmap["common"], user_input)
-        # add network config
-        net_config = network_config.generate(join_parties, f"{self.job_id}.{self.class_path}.{self.class_name}")
+        self.join_parties = join_parties
+        configmap = self._validated_params(configmap)
+        # platform managed paths are added after validation, they live outside the user's work dir
+        self._attach_overrides(configmap, config_manager)
+        self._attach_psi_cache(configmap, join_parties, operator_class)
+        self._attach_services(configmap)
+        return configmap
+
+    def _start_together(self, port_allocator: PortAllocator) -> Tuple[Dict[str, int], Dict]:
+        """
+        Start along with the tasks of the operator on the other parties, rather than wait on them inside it, and
+        agree on the way on the ports leased by each party, and the network chosen by the first one in "auto".
+        """
+        port = port_allocator.acquire(self.job_id, self.task_name) if self._uses_ports() else None
+        network = None
+        if settings.NETWORK_SCHEME == "auto" and self.party == min([self.party, *self.peers.values()]):
+            network = probe_and_choose(sorted(set(self.peers.values())))
+        barrier = StartBarrier(self.job_id, self.task_name, self.peers)
+        barrier.ready(port, network)
+        self.timer.mark(Phase.BARRIER_READY)
+        barrier.wait(self.mission_name, self.class_name)
+        self.timer.mark(Phase.BARRIER_RELEASED)
+        if settings.NETWORK_SCHEME == "auto" and network is None:
+            network = barrier.network()
+        scheme = network["scheme"] if network else settings.NETWORK_SCHEME
+        if port is None:
+            return None, network
+        if scheme != "socket":
+            port_allocator.release(self.job_id, self.task_name)
+            return None, network
+        return {**barrier.ports(), self.party: port}, network
+
+    @staticmethod
+    def _uses_ports() -> bool:
+        # with "auto", the socket scheme may be chosen, the port is leased in case it is
+        return settings.NETWORK_SCHEME in ("socket", "auto")
+
+    def _attach_network(self, configmap: Dict, ports: Dict[str, int] = None, network: Dict = None):
+        # the candidates of a sweep run the same operators at the same time
+        passphrase = f"{self.job_id}.{self.class_path}.{self.class_name}"
+        if self.sweep_index is not None:
+            passphrase = f"{passphrase}.{self.sweep_index}"
+        scheme = network["scheme"] if network else None
+        net_config = network_config.generate(self.join_parties, passphrase, ports, scheme)
+        if network:
+            net_config["parallel_channels"] = network["channels"]
         configmap["common"].update(net_config)
-        return self._validated_params(configmap)
+        NETWORK_SCHEME_CHOICES.labels(self.mission_name, self.class_name, net_config["network_scheme"]).inc()
+        self.timer.mark(Phase.NETWORK_CONFIG_GENERATED)
+
+    def _attach_services(self, configmap: Dict):
+        for service in self.services:
+            if service != "petsql_compiler":
+                logging.warning(f"unknown service {service} of {self.task_name}")
+            elif not settings.PETSQL_COMPILER_ENTRY:
+                continue
+            elif compiler_service.ping(settings.PETSQL_COMPILER_SOCKET, timeout=settings.SERVICE_HEALTH_TIMEOUT):
+                configmap["common"]["petsql_compiler"] = {
+                    "socket": settings.PETSQL_COMPILER_SOCKET,
+                    "entry": settings.PETSQL_COMPILER_ENTRY
+                }
+            else:
+                # the operator compiles in its own process as if there was no service
+                logging.warning(f"service {service} is unavailable, {self.task_name} runs without it")
+
+    def _attach_overrides(self, configmap: Dict, config_manager):
+        # overrides of the operator in the mission, e.g. to read the output of a previous task
+        if not self.configmap_overrides:
+            return
+        # tasks wired together exchange their artifacts in the scratch dir of the job
+        scratch = JobScratch(self.job_id)
+        scratch.create(estimate_input_size(configmap.get(self.party, {})))
+        overrides = self._validated_overrides(self._resolve(self.configmap_overrides, config_manager), scratch.path)
+        # "common" overrides the configmap shared by the parties, e.g. the hyperparameters of a sweep candidate
+        deep_merge(configmap["common"], overrides.pop("common", {}))
+        deep_merge(configmap.setdefault(self.party, {}), overrides)
+
+    def _validated_overrides(self, value, scratch_dir: str):
+        # paths in the scratch dir of the job are kept, anything else bound from the job context is validated
+        # like the params of the user
+        if isinstance(value, dict):
+            return {k: self._validated_overrides(v, scratch_dir) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._validated_overrides(v, scratch_dir) for v in value]
+        if isinstance(value, str) and is_inside_dir(value, scratch_dir):
+            return value
+        return validated_pathlike(value, settings.SAFE_WORK_DIR)
+
+    def _attach_psi_cache(self, configmap: Dict, join_parties, operator_class=None):
+        options = get_psi_cache_options(configmap, self.party)
+        # no key material for operators that would never read it
+        if options is None or not getattr(operator_class, "supports_psi_cache", False):
+            return
+        # one cache per set of partners, whatever is derived from a partner's keys is only valid with that partner
+        peers = sorted(party for party in join_parties if party != self.party)
+        cache = MissionCache(self.mission_name, f"psi.{'_'.join(peers)}", ttl=options.get("ttl"))
+        index = cache.acquire(rotate=bool(options.get("rotate")), job_id=self.job_id)
+        # other options are passed on, e.g. the added and removed ids of a delta PSI run
+        configmap.setdefault(self.party, {})["psi_cache"] = {
+            **options, "dir": index["dir"],
+            "key_file": index["key_file"],
+            "generation": index["generation"],
+            "expire_time": index["expire_time"],
+            "peers": peers
+        }
 
     def _validated_params(self, params: Dict):
         return traverse_and_validate(params, safe_workdir=settings.SAFE_WORK_DIR)
 
     def _parse_args(self, config_manager) -> Dict:
-        parsed_args = {}
-        for args_key, args_value in self.args.items():
-            if isinstance(args_value, str):
-                if args_value.startswith("$"):
-                    # args_value in the form "${job_context.a.b.c}"
-                    real_key: str = re.findall(r'\${(.*?)}', args_value)[0]
-                    if real_key.startswith("job_context."):
-                        args_value = config_manager.job_context.get(real_key[len("job_context."):])
-                    elif real_key.startswith("mission_context."):
-                        args_value = config_manager.mission_context.get(real_key[len("mission_context."):])
-                    elif real_key.startswith("global_config."):
-                        args_value = config_manager.global_config.get(real_key[len("global_config."):])
-                    else:
-                        raise Exception("no real args key context find")
-            parsed_args[args_key] = args_value
-        return parsed_args
+        return {args_key: self._resolve(args_value, config_manager) for args_key, args_value in self.args.items()}
+
+    def _resolve(self, value, config_manager):
+        """
+        Resolve the bindings in value, a string in the form "${job_context.a.b.c}" is replaced by the value it
+        refers to, bindings in longer strings by its string form, dicts and lists are resolved recursively.
+        """
+        if isinstance(value, dict):
+            return {k: self._resolve(v, config_manager) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(v, config_manager) for v in value]
+        if not isinstance(value, str) or "${" not in value:
+            return value
+        match = re.fullmatch(r'\${(.*?)}', value)
+        if match is not None:
+            return self._lookup(match.group(1), config_manager)
+        # bindings inside a longer string are interpolated, e.g. "${job_context.scratch_dir}/psi_result.csv"
+        return re.sub(r'\${(.*?)}', lambda m: str(self._lookup(m.group(1), config_manager)), value)
+
+    @staticmethod
+    def _lookup(real_key: str, config_manager):
+        if real_key.startswith("job_context."):
+            return config_manager.job_context.get(real_key[len("job_context."):])
+        elif real_key.startswith("mission_context."):
+            return config_manager.mission_context.get(real_key[len("mission_context."):])
+        elif real_key.startswith("global_config."):
+            return config_manager.global_config.get(real_key[len("global_config."):])
+        else:
+            raise Exception("no real args key context find")
@@ -0,0 +1,82 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+import logging
+from typing import Dict, List
+
+from models.task_timing import TaskTiming
+from utils.db_utils import session_commit_with_retry
+
+
+class Phase:
+    SCHEDULED = "scheduled"
+    PROCESS_STARTED = "process_started"
+    CLASS_LOADED = "class_loaded"
+    NETWORK_CONFIG_GENERATED = "network_config_generated"
+    CONFIGMAP_RESOLVED = "configmap_resolved"
+    ARGS_RESOLVED = "args_resolved"
+    BARRIER_READY = "barrier_ready"
+    BARRIER_RELEASED = "barrier_released"
+    RUN_STARTED = "operator_run_started"
+    RUN_FINISHED = "operator_run_finished"
+    STATUS_BROADCAST = "status_broadcast_acked"
+
+
+class TaskTimer:
+    """
+    Collects the timestamps of the phases a task goes through and persists them in the task timing table.
+    Marks are buffered in memory and written on flush() to keep DB round trips off the critical path.
+    """
+
+    def __init__(self, job_id: str, task_name: str):
+        from extensions import get_session_maker
+        self.session_maker = get_session_maker()
+        self.job_id = job_id
+        self.task_name = task_name
+        self._pending: Dict[str, datetime] = {}
+
+    def mark(self, phase: str):
+        self._pending[phase] = datetime.utcnow()
+
+    def flush(self, reset: bool = False):
+        """
+        Write the buffered marks, with reset=True the previous marks of the task are dropped first, e.g. on rerun.
+        Timing is best effort and never fails the task.
+        """
+        try:
+            with self.session_maker() as session:
+                query = session.query(TaskTiming).filter_by(job_id=self.job_id, task_name=self.task_name)
+                if not reset:
+                    query = query.filter(TaskTiming.phase.in_(list(self._pending.keys())))
+                query.delete(synchronize_session=False)
+                session.add_all([
+                    TaskTiming(job_id=self.job_id, task_name=self.task_name, phase=phase, phase_time=phase_time)
+                    for phase, phase_time in self._pending.items()
+                ])
+                session_commit_with_retry(session)
+            self._pending.clear()
+        except Exception:
+            logging.exception(f"flush timings of {self.job_id}.{self.task_name} fail")
+
+
+def get_job_timings(session, job_id: str) -> Dict[str, Dict[str, str]]:
+    return get_jobs_timings(session, [job_id]).get(job_id, {})
+
+
+def get_jobs_timings(session, job_ids: List[str]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    timings: Dict[str, Dict[str, Dict[str, str]]] = {}
+    query = session.query(TaskTiming).filter(TaskTiming.job_id.in_(job_ids))
+    for record in query.order_by(TaskTiming.phase_time).all():
+        timings.setdefault(record.job_id, {}).setdefault(record.task_name, {}).update(record.to_dict())
+    return timings
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from datetime import datetime
+import json
 
 from sqlalchemy import Column, Integer, String, Text, DateTime
 
@@ -40,3 +41,16 @@ class Job(Base):
 
     def simple_to_dict(self):
         return {"job_id": self.job_id, "status": self.status}
+
+    def export_to_dict(self):
+        return {
+            "cursor": self.id,
+            "job_id": self.job_id,
+            "mission_name": self.mission_name,
+            "mission_version": self.mission_version,
+            "main_party": self.main_party,
+            "join_parties": json.loads(self.join_parties),
+            "status": self.status,
+            "create_time": self.create_time.isoformat() if self.create_time else None,
+            "update_time": self.update_time.isoformat() if self.update_time else None
+        }
@@ -0,0 +1,35 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, DateTime
+
+from .base import Base, BigIntOrInteger
+
+
+class PartyCall(Base):
+    __tablename__ = "privacy_platform_party_call"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    # a call to a partner that could not be delivered, replayed in id order once the partner is back
+    party = Column(String(80), nullable=False, index=True)
+    action = Column(String(80), nullable=False)
+    method = Column(String(10), nullable=False)
+    endpoint = Column(String(255), nullable=False)
+    payload = Column(Text)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # update_time field
@@ -0,0 +1,32 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+
+from .base import Base, BigIntOrInteger
+
+
+class PortLease(Base):
+    __tablename__ = "privacy_platform_port_lease"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    # one lease per port, the port is free again once its lease is deleted
+    port = Column(Integer, unique=True, nullable=False)
+    job_id = Column(String(80), nullable=False, index=True)
+    task_name = Column(String(80), nullable=False)
+    expire_time = Column(DateTime, nullable=False)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+    __table_args__ = (UniqueConstraint('job_id', 'task_name', name='uix_port_lease'),)
@@ -0,0 +1,58 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+import json
+
+from sqlalchemy import Column, Integer, String, Text, DateTime
+
+from .base import Base, BigIntOrInteger
+
+
+class PredictRequest(Base):
+    __tablename__ = "privacy_platform_predict_request"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    request_id = Column(String(80), unique=True, nullable=False)
+    # requests with the same key share the mission, parties and models, and are merged into one job
+    batch_key = Column(String(80), nullable=False, index=True)
+    mission_name = Column(String(80), nullable=False)
+    params = Column(Text, nullable=False)
+    user_name = Column(String(80), nullable=False, default="")
+    status = Column(String(80), nullable=False)
+    job_id = Column(String(80))
+    errors = Column(Text)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    version_id = Column(Integer, nullable=False, default=0)
+    __mapper_args__ = {'version_id_col': version_id}
+
+    def to_dict(self):
+        params = json.loads(self.params)
+        outputs = {
+            party: party_params.get("outputs", {}).get("inference_res_path")
+            for party, party_params in params.get("mission_params", {}).items()
+            if isinstance(party_params, dict) and "outputs" in party_params
+        }
+        return {
+            "request_id": self.request_id,
+            "mission_name": self.mission_name,
+            "status": self.status,
+            "job_id": self.job_id,
+            "outputs": outputs,
+            "errors": self.errors,
+            "create_time": self.create_time.isoformat() if self.create_time else None,
+            "update_time": self.update_time.isoformat() if self.update_time else None
+        }
@@ -0,0 +1,34 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+from sqlalchemy import Column, Float, Integer, String, DateTime
+
+from .base import Base, BigIntOrInteger
+
+
+class RateBucket(Base):
+    __tablename__ = "privacy_platform_rate_bucket"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    key = Column(String(160), unique=True, nullable=False)
+    tokens = Column(Float, nullable=False)
+    # epoch seconds of the last refill, a float keeps sub-second precision on every backend
+    refill_time = Column(Float, nullable=False)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+    update_time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    version_id = Column(Integer, nullable=False, default=0)
+    __mapper_args__ = {'version_id_col': version_id}
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from datetime import datetime
+from typing import Dict
 
 from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
 
@@ -39,7 +40,7 @@ class Task(Base):
     __mapper_args__ = {'version_id_col': version_id}
     __table_args__ = (UniqueConstraint('name', 'job_id', name='uix_1'),)
 
-    def details(self):
+    def details(self, timings: Dict = None, resources: Dict = None, profile: Dict = None):
         details = {
             "name": self.name,
             "status": self.status,
@@ -48,6 +49,12 @@ class Task(Base):
         }
         if self.status == Status.FAIL and self.errors:
             details["errors"] = self.errors
+        if timings:
+            details["timings"] = timings
+        if resources:
+            details["resources"] = resources
+        if profile:
+            details["profile"] = profile
         return details
 
     def reset(self):
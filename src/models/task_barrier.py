@@ -0,0 +1,40 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from sqlalchemy.dialects import mysql
+
+from .base import Base, BigIntOrInteger
+
+
+class TaskBarrier(Base):
+    """
+    The readiness of the tasks of paired operators, reported by their own party or by a partner, see
+    job_manager.barrier.
+    """
+    __tablename__ = "privacy_platform_task_barrier"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    job_id = Column(String(80), nullable=False, index=True)
+    task_name = Column(String(80), nullable=False)
+    party = Column(String(80), nullable=False)
+    # the port leased to the task in the socket network scheme, see job_manager.ports
+    port = Column(Integer, nullable=True)
+    # the network scheme and channels chosen for the tasks, json, reported by the party deciding it
+    network = Column(Text, nullable=True)
+    ready_time = Column(DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+    __table_args__ = (UniqueConstraint('job_id', 'task_name', name='uix_task_barrier'),)
@@ -0,0 +1,35 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+import json
+
+from sqlalchemy import Column, String, Text, DateTime
+
+from .base import Base, BigIntOrInteger
+
+
+class TaskProfile(Base):
+    __tablename__ = "privacy_platform_task_profile"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    job_id = Column(String(80), nullable=False, index=True)
+    task_name = Column(String(80), nullable=False)
+    artifact_path = Column(Text, nullable=False)
+    # json list of the top functions by cumulative time
+    summary = Column(Text, nullable=False)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+
+    def to_dict(self):
+        return {"artifact": self.artifact_path, "top_functions": json.loads(self.summary)}
@@ -0,0 +1,64 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+import json
+
+from sqlalchemy import Column, Float, String, Text, DateTime
+
+from .base import Base, BigIntOrInteger
+
+
+class TaskResource(Base):
+    __tablename__ = "privacy_platform_task_resource"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    job_id = Column(String(80), nullable=False, index=True)
+    task_name = Column(String(80), nullable=False)
+    mission_name = Column(String(80), nullable=False, index=True)
+    operator = Column(String(80), nullable=False)
+    duration = Column(Float, nullable=False, default=0)
+    cpu_seconds = Column(Float, nullable=False, default=0)
+    peak_rss = Column(BigIntOrInteger, nullable=False, default=0)
+    read_bytes = Column(BigIntOrInteger, nullable=False, default=0)
+    write_bytes = Column(BigIntOrInteger, nullable=False, default=0)
+    net_rx_bytes = Column(BigIntOrInteger, nullable=False, default=0)
+    net_tx_bytes = Column(BigIntOrInteger, nullable=False, default=0)
+    # downsampled time series, a json list of [elapsed, cpu_seconds, rss, read_bytes, write_bytes, rx, tx]
+    samples = Column(Text, nullable=True)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+
+    def summary(self):
+        return {
+            "duration": self.duration,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_rss": self.peak_rss,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes,
+            "net_rx_bytes": self.net_rx_bytes,
+            "net_tx_bytes": self.net_tx_bytes
+        }
+
+    def to_dict(self, with_samples: bool = False):
+        details = {
+            "job_id": self.job_id,
+            "task_name": self.task_name,
+            "mission_name": self.mission_name,
+            "operator": self.operator,
+            "create_time": self.create_time
+        }
+        details.update(self.summary())
+        if with_samples:
+            details["samples"] = json.loads(self.samples or "[]")
+        return details
@@ -0,0 +1,35 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects import mysql
+
+from .base import Base, BigIntOrInteger
+
+
+class TaskTiming(Base):
+    __tablename__ = "privacy_platform_task_timing"
+
+    id = Column(BigIntOrInteger, primary_key=True)
+    job_id = Column(String(80), nullable=False, index=True)
+    task_name = Column(String(80), nullable=False)
+    phase = Column(String(80), nullable=False)
+    # phases are often milliseconds apart, keep the fractional seconds on mysql
+    phase_time = Column(DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False)
+
+    create_time = Column(DateTime, default=datetime.utcnow)  # create_time field
+
+    def to_dict(self):
+        return {self.phase: self.phase_time.isoformat()}
@@ -0,0 +1,124 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+
+from flask import g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+
+# Metrics are written by gunicorn workers and forked task executors alike. When PROMETHEUS_MULTIPROC_DIR
+# is set, every process writes its own files in that directory and generate_metrics() aggregates them.
+
+REQUEST_LATENCY = Histogram("petplatform_request_latency_seconds", "API request latency", ["method", "route", "status"])
+
+DB_QUERY_LATENCY = Histogram("petplatform_db_query_latency_seconds",
+                             "DB statement execution latency", ["operation"],
+                             buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_COMMIT_LATENCY = Histogram("petplatform_db_commit_latency_seconds",
+                              "DB commit latency including retries", ["result"],
+                              buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_COMMIT_RETRIES = Counter("petplatform_db_commit_retries_total", "DB commits retried after an operational error")
+
+PARTY_REQUEST_LATENCY = Histogram("petplatform_party_request_latency_seconds", "Latency of calls to partner parties",
+                                  ["party", "action"])
+PARTY_REQUEST_FAILURES = Counter("petplatform_party_request_failures_total", "Failed calls to partner parties",
+                                 ["party", "action"])
+PARTY_CIRCUIT_OPEN = Gauge("petplatform_party_circuit_open",
+                           "Whether calls to a partner fail fast since it was found unhealthy", ["party"],
+                           multiprocess_mode="max")
+PARTY_CALLS_QUEUED = Counter("petplatform_party_calls_queued_total",
+                             "Calls to partner parties queued to be replayed once they are back", ["party", "action"])
+
+SCHEDULER_QUEUE_DEPTH = Gauge("petplatform_scheduler_queue_depth",
+                              "Tasks of running jobs waiting to be launched on this party",
+                              multiprocess_mode="mostrecent")
+TASK_QUEUE_WAIT = Histogram("petplatform_task_queue_wait_seconds",
+                            "Time between claiming a task and its executor process starting", ["mission", "operator"],
+                            buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+TASK_RUN_TIME = Histogram("petplatform_task_run_seconds",
+                          "Task execution time", ["mission", "operator", "status"],
+                          buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600))
+START_BARRIER_WAIT = Histogram("petplatform_start_barrier_wait_seconds",
+                               "Time a task waits at the start barrier for the tasks paired with it on other parties",
+                               ["mission", "operator", "result"],
+                               buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300))
+NETWORK_SCHEME_CHOICES = Counter("petplatform_network_scheme_choices_total", "Network schemes used by tasks",
+                                 ["mission", "operator", "scheme"])
+LINK_RTT = Gauge("petplatform_link_rtt_seconds",
+                 "Probed round trip time of the link to a partner", ["party"],
+                 multiprocess_mode="mostrecent")
+LINK_THROUGHPUT = Gauge("petplatform_link_throughput_bytes",
+                        "Probed throughput of the link to a partner in bytes per second", ["party"],
+                        multiprocess_mode="mostrecent")
+LIVE_EXECUTORS = Gauge("petplatform_live_executors",
+                       "Number of live task executor processes",
+                       multiprocess_mode="livesum")
+
+MODEL_CACHE_REQUESTS = Counter("petplatform_model_cache_requests_total", "Model loads of long-lived executors",
+                               ["result"])
+SERVICE_UP = Gauge("petplatform_service_up",
+                   "Whether a supervised local service is healthy", ["service"],
+                   multiprocess_mode="max")
+SERVICE_RESTARTS = Counter("petplatform_service_restarts_total", "Restarts of supervised local services", ["service"])
+
+
+def generate_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _before_request():
+    g.request_start_time = time.perf_counter()
+
+
+def _after_request(response):
+    start_time = g.pop("request_start_time", None)
+    if start_time is not None:
+        # use the url rule instead of the path to keep the label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(time.perf_counter() - start_time)
+    return response
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def observe_db_engine(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_time")
+        if not start_times:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - start_times.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        if exception_context.connection is not None:
+            start_times = exception_context.connection.info.get("query_start_time")
+            if start_times:
+                start_times.pop()
@@ -13,7 +13,7 @@
 # limitations under the License.
 import hashlib
 import json
-from typing import Iterable
+from typing import Dict, Iterable
 from pathlib import Path
 import logging
 
@@ -31,19 +31,21 @@ class NetworkConfig:
         else:
             logging.warning(f"fail to load party config from {configfile}")
 
-    def generate(self, join_parties: Iterable, passphrase):
-        if settings.NETWORK_SCHEME == "agent":
+    def generate(self, join_parties: Iterable, passphrase, ports: Dict[str, int] = None, scheme: str = None):
+        # "auto" without a choice agreed by the parties falls back to the agent
+        if (scheme or settings.NETWORK_SCHEME) in ("agent", "auto"):
             config = self._agent_config(join_parties, passphrase)
         else:
-            config = self._socket_config(join_parties, passphrase)
+            config = self._socket_config(join_parties, passphrase, ports)
         return config
 
-    def _socket_config(self, join_parties: Iterable, passphrase):
+    def _socket_config(self, join_parties: Iterable, passphrase, ports: Dict[str, int] = None):
+        # the ports leased by the parties and agreed at the start barrier, hash-derived ones for the others
+        ports = ports or {}
         parties = {}
         for party in join_parties:
-            port = self._get_random_port(seed=f"{passphrase}.{party}",
-                                         lb=settings.PORT_LOWER_BOUND,
-                                         ub=settings.PORT_UPPER_BOUND)
+            port = ports.get(party) or self._get_random_port(
+                seed=f"{passphrase}.{party}", lb=settings.PORT_LOWER_BOUND, ub=settings.PORT_UPPER_BOUND)
             address = get_url_netloc(self.party_config[party]["petplatform"]["url"])
             address_no_port = address.split(":")[0]
             parties[party] = {"address": [address_no_port + f":{port}"]}
@@ -0,0 +1,175 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import deque
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+from exceptions.exceptions import PartyUnavailableError
+from monitor.metrics import PARTY_CIRCUIT_OPEN
+import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    The health of a partner built from the outcomes of the recent calls to it. The circuit opens after
+    too many failures, calls then fail fast instead of waiting for their timeout. After the cooldown one
+    trial call is let through, its success or a successful ping closes the circuit again.
+    """
+
+    def __init__(self,
+                 party: str,
+                 failures: int = None,
+                 failure_rate: float = None,
+                 window: int = None,
+                 cooldown: float = None):
+        self.party = party
+        self.failures = failures or settings.PARTY_BREAKER_FAILURES
+        self.failure_rate = failure_rate or settings.PARTY_BREAKER_FAILURE_RATE
+        self.cooldown = settings.PARTY_BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.outcomes = deque(maxlen=window or settings.PARTY_BREAKER_WINDOW)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _cooled_down(self) -> bool:
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def is_open(self) -> bool:
+        """
+        Whether calls are rejected now, unlike allow() it never takes the trial call.
+        """
+        with self._lock:
+            return (self.state == OPEN and not self._cooled_down()) or (self.state == HALF_OPEN and self._trial)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and self._cooled_down():
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state == OPEN:
+                return max(1.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return 1.0
+
+    def record(self, success: bool, error: str = None):
+        with self._lock:
+            self.outcomes.append(success)
+            if success:
+                self.consecutive_failures = 0
+                self.last_success = datetime.utcnow()
+                if self.state != CLOSED:
+                    logging.info(f"party {self.party} is back, circuit closed")
+                    self._set_state(CLOSED)
+                return
+            self.consecutive_failures += 1
+            self.last_failure = datetime.utcnow()
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                # the trial failed, wait for another cooldown
+                self._open()
+            elif self.state == CLOSED and self._unhealthy():
+                logging.warning(f"party {self.party} is unhealthy, circuit opened: {error}")
+                self._open()
+
+    def _unhealthy(self) -> bool:
+        if self.consecutive_failures >= self.failures:
+            return True
+        if len(self.outcomes) < self.outcomes.maxlen:
+            return False
+        return self.outcomes.count(False) >= self.failure_rate * len(self.outcomes)
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._trial = False
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        PARTY_CIRCUIT_OPEN.labels(self.party).set(0 if state == CLOSED else 1)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "recent_failures": self.outcomes.count(False),
+                "recent_calls": len(self.outcomes),
+                "last_success": self.last_success.isoformat() if self.last_success else None,
+                "last_failure": self.last_failure.isoformat() if self.last_failure else None,
+                "last_error": self.last_error
+            }
+
+
+class PartyHealth:
+    """
+    The circuit breakers of the partners, kept in memory by every worker and shared with the executors it forks.
+    """
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, party: str) -> CircuitBreaker:
+        with self._lock:
+            if party not in self._breakers:
+                self._breakers[party] = CircuitBreaker(party)
+            return self._breakers[party]
+
+    def check(self, parties: Iterable[str]):
+        """
+        Reject a job whose partners are known to be down, before anything of it is created.
+        """
+        for party in parties:
+            breaker = self.breaker(party)
+            if breaker.is_open():
+                raise PartyUnavailableError(f"party {party} is unavailable, please try again later",
+                                            breaker.retry_after())
+
+    def reset(self):
+        with self._lock:
+            self._breakers = {}
+
+    def _reset_locks(self):
+        # a thread of the parent may hold a lock at fork time, the child would never see it released
+        self._lock = threading.Lock()
+        for breaker in self._breakers.values():
+            breaker._reset_lock()
+
+
+party_health = PartyHealth()
+os.register_at_fork(after_in_child=party_health._reset_locks)
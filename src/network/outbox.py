@@ -0,0 +1,86 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+from typing import Callable, Dict, List
+
+from models.party_call import PartyCall
+from monitor.metrics import PARTY_CALLS_QUEUED
+from utils.db_utils import session_commit_with_retry
+
+
+class PartyOutbox:
+    """
+    Calls to partners that only notify them, e.g. of task updates and cancels, are queued in the db when the
+    partner is down instead of failing the caller, and replayed in order once the partner is back.
+    """
+
+    def __init__(self, session_maker=None):
+        if session_maker is None:
+            from extensions import get_session_maker
+            session_maker = get_session_maker()
+        self.session_maker = session_maker
+
+    def enqueue(self, party: str, action: str, method: str, endpoint: str, payload: Dict = None, error: str = None):
+        with self.session_maker() as session:
+            session.add(
+                PartyCall(party=party,
+                          action=action,
+                          method=method,
+                          endpoint=endpoint,
+                          payload=json.dumps(payload) if payload is not None else None,
+                          last_error=error))
+            session_commit_with_retry(session)
+        PARTY_CALLS_QUEUED.labels(party, action).inc()
+        logging.warning(f"{action} call to party {party} queued: {error}")
+
+    def has_pending(self, party: str) -> bool:
+        with self.session_maker() as session:
+            return session.query(PartyCall.id).filter_by(party=party).first() is not None
+
+    def parties(self) -> List[str]:
+        with self.session_maker() as session:
+            return [party for party, in session.query(PartyCall.party).distinct()]
+
+    def pending(self) -> Dict[str, int]:
+        with self.session_maker() as session:
+            counts = {}
+            for party, in session.query(PartyCall.party):
+                counts[party] = counts.get(party, 0) + 1
+            return counts
+
+    def flush(self, party: str, send: Callable) -> int:
+        """
+        Replay the queued calls of a party with send(party, action, method, endpoint, payload), in the order
+        they were queued, stop at the first failure to keep that order. Return the number of calls delivered.
+        """
+        delivered = 0
+        with self.session_maker() as session:
+            calls = session.query(PartyCall).filter_by(party=party).order_by(PartyCall.id).all()
+            for call in calls:
+                payload = json.loads(call.payload) if call.payload is not None else None
+                try:
+                    send(party, call.action, call.method, call.endpoint, payload)
+                except Exception as e:
+                    call.attempts += 1
+                    call.last_error = str(e)
+                    session_commit_with_retry(session)
+                    logging.warning(f"replay {call.action} call to party {party} fail: {e}")
+                    break
+                session.delete(call)
+                session_commit_with_retry(session)
+                delivered += 1
+        if delivered:
+            logging.info(f"replayed {delivered} queued calls to party {party}")
+        return delivered
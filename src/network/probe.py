@@ -0,0 +1,111 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import logging
+import math
+import time
+from typing import Dict
+
+from config.mission_context import MissionContext
+from monitor.metrics import LINK_RTT, LINK_THROUGHPUT
+import settings
+
+
+class HttpLinkProber:
+    """
+    Probe the link to a partner through its platform, the round trip time of its index and the throughput of
+    downloading NETWORK_PROBE_SIZE bytes.
+    """
+
+    def probe(self, party: str) -> Dict:
+        from network.request import request_manager
+        rtt, throughput = request_manager.probe_link(party, settings.NETWORK_PROBE_SIZE)
+        return {"rtt": rtt, "throughput": throughput}
+
+
+class SimulatedLinkProber:
+    """
+    A stand-in for local runs and tests, links are given as {party: {"rtt": seconds, "throughput": bytes per
+    second}}, e.g. from NETWORK_PROBE_SIMULATE, parties without one get the "default" link.
+    """
+
+    def __init__(self, links: Dict[str, Dict]):
+        self.links = links
+
+    def probe(self, party: str) -> Dict:
+        link = self.links.get(party, self.links.get("default"))
+        if link is None:
+            raise ValueError(f"no simulated link to {party}")
+        return {"rtt": float(link["rtt"]), "throughput": float(link["throughput"])}
+
+
+def get_prober():
+    if settings.NETWORK_PROBE_SIMULATE:
+        return SimulatedLinkProber(json.loads(settings.NETWORK_PROBE_SIMULATE))
+    return HttpLinkProber()
+
+
+class LinkProbeCache:
+    """
+    The probes of the links to the partners, kept in the context of the "__network" mission for
+    NETWORK_PROBE_TTL seconds, so that every worker and executor of the party shares them.
+    """
+
+    def __init__(self, prober=None, ttl: int = None):
+        self.prober = prober or get_prober()
+        self.ttl = settings.NETWORK_PROBE_TTL if ttl is None else ttl
+        self.context = MissionContext("__network")
+
+    def get(self, party: str, refresh: bool = False) -> Dict:
+        if not refresh:
+            value = self.context.get(f"link.{party}")
+            if value is not None:
+                return json.loads(value)
+        link = {**self.prober.probe(party), "probe_time": time.time()}
+        LINK_RTT.labels(party).set(link["rtt"])
+        LINK_THROUGHPUT.labels(party).set(link["throughput"])
+        logging.info(f"probed link to {party}: rtt {link['rtt']:.4f}s, throughput {link['throughput']:.0f}B/s")
+        self.context.set(f"link.{party}", json.dumps(link), expire_time=self.ttl)
+        return link
+
+
+def choose_network(links: Dict[str, Dict]) -> Dict:
+    """
+    The network scheme and number of parallel channels of a task, from the links to its partners. Direct
+    sockets are used when every link is fast enough, NETWORK_SOCKET_MAX_RTT, the petnet agent otherwise.
+    Channels are added until their windows, NETWORK_CHANNEL_WINDOW bytes each, cover the bandwidth-delay
+    product of the slowest link, up to NETWORK_MAX_CHANNELS.
+    """
+    if not links:
+        return {"scheme": "agent", "channels": 1}
+    rtt = max(link["rtt"] for link in links.values())
+    throughput = min(link["throughput"] for link in links.values())
+    scheme = "socket" if rtt <= settings.NETWORK_SOCKET_MAX_RTT else "agent"
+    channels = math.ceil(rtt * throughput / settings.NETWORK_CHANNEL_WINDOW)
+    return {"scheme": scheme, "channels": max(1, min(channels, settings.NETWORK_MAX_CHANNELS))}
+
+
+def probe_and_choose(parties) -> Dict:
+    """
+    choose_network() for the links to the given parties, the agent when a link can not be probed.
+    """
+    cache = LinkProbeCache()
+    links = {}
+    for party in parties:
+        try:
+            links[party] = cache.get(party)
+        except Exception:
+            logging.exception(f"probe link to {party} fail")
+            return {"scheme": "agent", "channels": 1}
+    return choose_network(links)
@@ -11,11 +11,28 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Dict
+import logging
+import time
+from typing import Dict, List, Tuple
 
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+from exceptions.exceptions import PartyUnavailableError, TooManyRequestsError
+from monitor.metrics import PARTY_REQUEST_FAILURES, PARTY_REQUEST_LATENCY
 import settings
 from network.config import network_config
-from utils.request_utils import post, patch
+from network.health import party_health
+from tracing import tracer
+from utils.request_utils import get, post, patch
+
+_METHODS = {"POST": post, "PATCH": patch}
+
+
+def _is_down(error: Exception) -> bool:
+    # the partner could not be reached or failed on its side, unlike the rejections it answers itself
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    return isinstance(error, HTTPError) and (error.response is None or error.response.status_code >= 500)
 
 
 class RequestManager:
@@ -35,37 +52,121 @@ class RequestManager:
         headers.update(self.party_address[party].get("headers", {}))
         return headers
 
-    def submit(self, party: str, params: Dict):
+    def _send(self, party: str, action: str, method, endpoint: str, **kwargs):
         address = self._get_address(party)
         headers = self._get_headers(party)
-        response = post(address, "api/v1/jobs", json=params, headers=headers)
+        breaker = party_health.breaker(party)
+        if not breaker.allow():
+            # fail fast instead of tying up the caller for the whole timeout of a partner known to be down
+            PARTY_REQUEST_FAILURES.labels(party, action).inc()
+            raise PartyUnavailableError(f"party {party} is unavailable, please try again later", breaker.retry_after())
+        start_time = time.perf_counter()
+        try:
+            with tracer.child_span(f"party.{action}", attributes={"party": party}):
+                response = method(address, endpoint, headers=tracer.inject(headers), **kwargs)
+        except HTTPError as e:
+            PARTY_REQUEST_FAILURES.labels(party, action).inc()
+            breaker.record(not _is_down(e), str(e))
+            if e.response is not None and e.response.status_code == 429:
+                # pass the backpressure of the partner on to our own caller
+                retry_after = float(e.response.headers.get("Retry-After", settings.ADMISSION_RETRY_AFTER))
+                raise TooManyRequestsError(f"party {party} is overloaded, please try again later", retry_after)
+            raise
+        except Exception as e:
+            PARTY_REQUEST_FAILURES.labels(party, action).inc()
+            breaker.record(not _is_down(e), str(e))
+            raise
+        finally:
+            PARTY_REQUEST_LATENCY.labels(party, action).observe(time.perf_counter() - start_time)
+        breaker.record(True)
         if not response.get("success", False):
+            PARTY_REQUEST_FAILURES.labels(party, action).inc()
             errors = response.get("error_message", "unknown errors")
             raise Exception(f"bad request: {errors}")
+        return response
+
+    def _send_or_queue(self, party: str, action: str, method: str, endpoint: str, payload: Dict = None):
+        """
+        Send a call the caller does not wait on, queue it to be replayed if the partner is down.
+        """
+        from network.outbox import PartyOutbox
+        outbox = PartyOutbox()
+        if outbox.has_pending(party):
+            # keep the order of the calls, the queued ones go first
+            outbox.enqueue(party, action, method, endpoint, payload, "earlier calls are queued")
+            return
+        try:
+            kwargs = {"json": payload} if payload is not None else {}
+            self._send(party, action, _METHODS[method], endpoint, **kwargs)
+        except Exception as e:
+            if not isinstance(e, PartyUnavailableError) and not _is_down(e):
+                raise
+            outbox.enqueue(party, action, method, endpoint, payload, str(e))
+
+    def replay(self, party: str, action: str, method: str, endpoint: str, payload: Dict = None):
+        """
+        Send a queued call again, errors are only raised while the partner is still down, a call it rejects is
+        dropped since replaying it would fail the same way.
+        """
+        try:
+            kwargs = {"json": payload} if payload is not None else {}
+            self._send(party, action, _METHODS[method], endpoint, **kwargs)
+        except Exception as e:
+            if isinstance(e, PartyUnavailableError) or _is_down(e):
+                raise
+            logging.warning(f"drop queued {action} call to party {party}: {e}")
+
+    def ping(self, party: str) -> bool:
+        """
+        Ping the index of a partner, the outcome is recorded by its circuit breaker even while it is open.
+        """
+        breaker = party_health.breaker(party)
+        try:
+            get(self._get_address(party), "/", headers=self._get_headers(party), timeout=settings.PARTY_PING_TIMEOUT)
+        except Exception as e:
+            breaker.record(False, f"ping fail: {e}")
+            return False
+        breaker.record(True)
+        return True
+
+    def submit(self, party: str, params: Dict):
+        self._send(party, "submit", post, "api/v1/jobs", json=params)
+
+    def batch_submit(self, party: str, params_list: List[Dict]):
+        self._send(party, "batch_submit", post, "api/v1/jobs:batchSubmit", json={"jobs": params_list})
 
     def rerun(self, party: str, job_id: str):
-        address = self._get_address(party)
-        headers = self._get_headers(party)
-        response = post(address, f"api/v1/jobs/{job_id}/rerun", headers=headers)
-        if not response.get("success", False):
-            errors = response.get("error_message", "unknown errors")
-            raise Exception(f"bad request: {errors}")
+        self._send(party, "rerun", post, f"api/v1/jobs/{job_id}/rerun")
 
     def cancel(self, party: str, job_id: str):
-        address = self._get_address(party)
-        headers = self._get_headers(party)
-        response = post(address, f"api/v1/jobs/{job_id}/cancel", headers=headers)
-        if not response.get("success", False):
-            errors = response.get("error_message", "unknown errors")
-            raise Exception(f"bad request: {errors}")
+        self._send_or_queue(party, "cancel", "POST", f"api/v1/jobs/{job_id}/cancel")
+
+    def batch_cancel(self, party: str, job_ids: List[str]):
+        self._send_or_queue(party, "batch_cancel", "POST", "api/v1/jobs:batchCancel", {"job_ids": job_ids})
 
     def update_task(self, party, job_id: str, task_name: str, params: Dict):
+        self._send_or_queue(party, "update_task", "PATCH", f"api/v1/tasks/{job_id}/{task_name}", params)
+
+    def probe_link(self, party: str, size: int) -> Tuple[float, float]:
+        """
+        The round trip time in seconds of the link to a partner, and its throughput in bytes per second measured
+        by downloading size bytes.
+        """
         address = self._get_address(party)
         headers = self._get_headers(party)
-        response = patch(address, f"api/v1/tasks/{job_id}/{task_name}", json=params, headers=headers)
-        if not response.get("success", False):
-            errors = response.get("error_message", "unknown errors")
-            raise Exception(f"bad request: {errors}")
+        rtts = []
+        for _ in range(3):
+            start_time = time.perf_counter()
+            get(address, "/", headers=headers)
+            rtts.append(time.perf_counter() - start_time)
+        rtt = sorted(rtts)[1]
+        start_time = time.perf_counter()
+        response = get(address, "api/v1/network/probe", params={"size": size}, headers=headers, timeout=60)
+        elapsed = time.perf_counter() - start_time
+        return rtt, len(response.content) / max(elapsed - rtt, 1e-6)
+
+    def task_ready(self, party, job_id: str, task_name: str, params: Dict):
+        self._send(party, "task_ready", post, f"api/v1/tasks/{job_id}/{task_name}/ready", json=params)
 
 
 request_manager = RequestManager()
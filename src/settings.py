@@ -52,9 +52,57 @@ if PARTY is None:
 
 CONFIG_FILE = os.environ.get("CONFIG_FILE", "/app/parties/party.json")
 SAFE_WORK_DIR = os.environ.get("SAFE_WORK_DIR", "/app/data/")
+# "agent", "socket", or "auto" to pick one per task from probes of the links to the partners
 NETWORK_SCHEME = os.environ.get("NETWORK_SCHEME", "agent")
+# caches kept across jobs of a mission, e.g. the precomputed ids and keys of "psi_cache" jobs
+# platform managed, outside SAFE_WORK_DIR so that the paths in job params can never reach them
+MISSION_CACHE_DIR = os.environ.get("MISSION_CACHE_DIR", "/app/cache/mission")
+PSI_CACHE_TTL = int(os.environ.get("PSI_CACHE_TTL", str(7 * 24 * 3600)))
+# intermediate artifacts of a job, outside SAFE_WORK_DIR as well, kept in tmpfs when it has room for this many
+# times the size of the job inputs, the scratch dir of a failed job is kept for its rerun for SCRATCH_RETENTION seconds
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR", "/app/cache/scratch")
+SCRATCH_TMPFS_DIR = os.environ.get("SCRATCH_TMPFS_DIR", "/dev/shm")
+SCRATCH_TMPFS_HEADROOM = float(os.environ.get("SCRATCH_TMPFS_HEADROOM", "3"))
+SCRATCH_RETENTION = int(os.environ.get("SCRATCH_RETENTION", str(24 * 3600)))
 PORT_LOWER_BOUND = int(os.environ.get("PORT_LOWER_BOUND", "49152"))
 PORT_UPPER_BOUND = int(os.environ.get("PORT_UPPER_BOUND", "65535"))
+# probes of the links to the partners are kept for NETWORK_PROBE_TTL seconds, NETWORK_PROBE_SIMULATE replaces
+# them with fixed links, {"<party>": {"rtt": seconds, "throughput": bytes per second}}, e.g. for tests
+NETWORK_PROBE_TTL = int(os.environ.get("NETWORK_PROBE_TTL", "600"))
+NETWORK_PROBE_SIZE = int(os.environ.get("NETWORK_PROBE_SIZE", str(1024**2)))
+NETWORK_PROBE_SIMULATE = os.environ.get("NETWORK_PROBE_SIMULATE", "")
+NETWORK_SOCKET_MAX_RTT = float(os.environ.get("NETWORK_SOCKET_MAX_RTT", "0.01"))
+NETWORK_CHANNEL_WINDOW = int(os.environ.get("NETWORK_CHANNEL_WINDOW", str(4 * 1024**2)))
+NETWORK_MAX_CHANNELS = int(os.environ.get("NETWORK_MAX_CHANNELS", "4"))
+# max seconds a task holds its port in the socket network scheme, leases of finished tasks are released earlier
+PORT_LEASE_TTL = int(os.environ.get("PORT_LEASE_TTL", str(24 * 3600)))
+# the index of each partner is pinged every PARTY_PING_INTERVAL seconds, 0 disables the pings. Calls to a partner
+# fail fast once PARTY_BREAKER_FAILURES calls in a row, or PARTY_BREAKER_FAILURE_RATE of the last
+# PARTY_BREAKER_WINDOW calls, have failed, until a ping or a trial call succeeds after PARTY_BREAKER_COOLDOWN seconds
+PARTY_PING_INTERVAL = float(os.environ.get("PARTY_PING_INTERVAL", "10"))
+PARTY_PING_TIMEOUT = float(os.environ.get("PARTY_PING_TIMEOUT", "2"))
+PARTY_BREAKER_FAILURES = int(os.environ.get("PARTY_BREAKER_FAILURES", "3"))
+PARTY_BREAKER_FAILURE_RATE = float(os.environ.get("PARTY_BREAKER_FAILURE_RATE", "0.5"))
+PARTY_BREAKER_WINDOW = int(os.environ.get("PARTY_BREAKER_WINDOW", "20"))
+PARTY_BREAKER_COOLDOWN = float(os.environ.get("PARTY_BREAKER_COOLDOWN", "30"))
+
+
+def _is_inside_work_dir(path: str) -> bool:
+    work_dir = os.path.abspath(SAFE_WORK_DIR)
+    return os.path.commonpath([os.path.abspath(path), work_dir]) == work_dir
+
+
+for _name, _path in [("MISSION_CACHE_DIR", MISSION_CACHE_DIR), ("SCRATCH_DIR", SCRATCH_DIR)]:
+    if _is_inside_work_dir(_path):
+        raise EnvironmentError(f"{_name} {_path} must be outside SAFE_WORK_DIR {SAFE_WORK_DIR}")
+
+# ========================= tracing =================================
+# one of "none", "file" or "otlp"
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none")
+TRACE_FILE = os.environ.get("TRACE_FILE", "/app/logs/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318")
+TRACE_BATCH_SIZE = int(os.environ.get("TRACE_BATCH_SIZE", "512"))
+TRACE_EXPORT_TIMEOUT = float(os.environ.get("TRACE_EXPORT_TIMEOUT", "2"))
 
 # ========================= validation ==============================
 SECRET = os.environ.get("SECRET")
@@ -62,3 +110,70 @@ JWT_TOKEN = os.environ.get("JWT_TOKEN")
 
 # ========================= application =============================
 MAX_JOB_LIMIT = int(os.environ.get("MAX_JOB_LIMIT", "2"))
+# max number of jobs in one batch get, submit or cancel request
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "500"))
+# max running jobs initiated by one user, 0 disables the quota
+MAX_USER_JOB_LIMIT = int(os.environ.get("MAX_USER_JOB_LIMIT", "0"))
+# seconds a client is asked to wait when a job is rejected for capacity
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "30"))
+
+# token bucket limits of api requests as "<requests per second>/<burst>", empty means unlimited.
+# RATE_LIMIT_USER applies to each user except partner nodes, RATE_LIMIT_<ROLE> is shared by all users of a role
+RATE_LIMIT_USER = os.environ.get("RATE_LIMIT_USER", "")
+RATE_LIMIT_OPERATOR = os.environ.get("RATE_LIMIT_OPERATOR", "")
+RATE_LIMIT_ADMIN = os.environ.get("RATE_LIMIT_ADMIN", "")
+RATE_LIMIT_NODE = os.environ.get("RATE_LIMIT_NODE", "")
+
+# seconds between two resource usage samples of a task, 0 disables sampling
+RESOURCE_SAMPLE_INTERVAL = float(os.environ.get("RESOURCE_SAMPLE_INTERVAL", "5"))
+RESOURCE_MAX_SAMPLES = int(os.environ.get("RESOURCE_MAX_SAMPLES", "240"))
+
+# where the profiles of tasks running with "profile": true are written
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/app/logs/profiles")
+PROFILE_TOP_FUNCTIONS = int(os.environ.get("PROFILE_TOP_FUNCTIONS", "30"))
+
+# operators flagged "executor: pooled" in their mission run in this many long-lived executor processes per worker,
+# 0 runs them in a process of their own like the other operators
+POOLED_EXECUTORS = int(os.environ.get("POOLED_EXECUTORS", "2"))
+# memory budget of the models cached by a long-lived executor, estimated with the size of the model files
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(1024**3)))
+
+# small predict requests of the same model and partner are merged into one job, once PREDICT_BATCH_MAX_REQUESTS
+# of them are queued or the oldest has waited PREDICT_BATCH_WINDOW seconds, 0 interval disables the batcher
+PREDICT_BATCH_INTERVAL = float(os.environ.get("PREDICT_BATCH_INTERVAL", "1"))
+PREDICT_BATCH_WINDOW = float(os.environ.get("PREDICT_BATCH_WINDOW", "5"))
+PREDICT_BATCH_MAX_REQUESTS = int(os.environ.get("PREDICT_BATCH_MAX_REQUESTS", "100"))
+# requests of a batch whose job does not exist this many seconds after they were taken are queued again
+PREDICT_BATCH_SUBMIT_TIMEOUT = float(os.environ.get("PREDICT_BATCH_SUBMIT_TIMEOUT", "300"))
+
+# max number of candidates of a hyperparameter sweep job, and of candidates running at the same time
+SWEEP_MAX_CANDIDATES = int(os.environ.get("SWEEP_MAX_CANDIDATES", "32"))
+SWEEP_MAX_PARALLEL = int(os.environ.get("SWEEP_MAX_PARALLEL", "2"))
+# max seconds a task waits for the tasks paired with it on other parties to be ready, 0 disables the barrier
+START_BARRIER_TIMEOUT = float(os.environ.get("START_BARRIER_TIMEOUT", "300"))
+START_BARRIER_POLL_INTERVAL = float(os.environ.get("START_BARRIER_POLL_INTERVAL", "0.1"))
+# seconds the query results of batch SQL jobs are cached for, keyed by the query and the hashes of the inputs
+SQL_CACHE_TTL = int(os.environ.get("SQL_CACHE_TTL", str(24 * 3600)))
+# a warm PETSQL compiler served on a Unix socket to the tasks of the host, "<module>:<function>" called with the
+# query and its config, empty disables the service. Local services are checked every SERVICE_HEALTH_INTERVAL
+# seconds, and restarted after SERVICE_MAX_FAILURES failed checks or SERVICE_START_TIMEOUT seconds to start
+PETSQL_COMPILER_ENTRY = os.environ.get("PETSQL_COMPILER_ENTRY", "")
+PETSQL_COMPILER_SOCKET = os.environ.get("PETSQL_COMPILER_SOCKET", f"/tmp/petplatform_{PARTY}_petsql_compiler.sock")
+SERVICE_HEALTH_INTERVAL = float(os.environ.get("SERVICE_HEALTH_INTERVAL", "5"))
+SERVICE_HEALTH_TIMEOUT = float(os.environ.get("SERVICE_HEALTH_TIMEOUT", "2"))
+SERVICE_MAX_FAILURES = int(os.environ.get("SERVICE_MAX_FAILURES", "3"))
+SERVICE_START_TIMEOUT = float(os.environ.get("SERVICE_START_TIMEOUT", "60"))
+SERVICE_RESTART_BACKOFF_MAX = float(os.environ.get("SERVICE_RESTART_BACKOFF_MAX", "60"))
+
+# job status streams check the job version at this interval, and give up after the max duration
+STREAM_POLL_INTERVAL = float(os.environ.get("STREAM_POLL_INTERVAL", "0.5"))
+STREAM_MAX_DURATION = float(os.environ.get("STREAM_MAX_DURATION", "300"))
+
+# responses of at least this many bytes are gzip compressed when the client accepts it, 0 disables compression
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+
+# ========================= scheduler ===============================
+# seconds between two rounds of the leader scheduler, 0 disables the scheduler
+SCHEDULER_INTERVAL = float(os.environ.get("SCHEDULER_INTERVAL", "10"))
+LEASE_TTL = int(os.environ.get("LEASE_TTL", "30"))
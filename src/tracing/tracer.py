@@ -0,0 +1,263 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from contextlib import contextmanager
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, request
+
+import settings
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: Dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.error = None
+        self.is_root = False
+        self.token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "party": settings.PARTY,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": (self.end_time - self.start_time) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [{
+                "key": key,
+                "value": {
+                    "stringValue": str(value)
+                }
+            } for key, value in self.attributes.items()],
+            "status": {
+                "code": 2,
+                "message": self.error
+            } if self.error else {
+                "code": 1
+            }
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class FileExporter:
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # one line per span, small appends are atomic so workers and executors can share the file
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans))
+
+
+class OTLPExporter:
+
+    def __init__(self, endpoint: str):
+        self.address = endpoint.rstrip("/")
+
+    def export(self, spans: List[Span]):
+        from utils.request_utils import post
+        payload = {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{
+                        "key": "service.name",
+                        "value": {
+                            "stringValue": "petplatform"
+                        }
+                    }, {
+                        "key": "party",
+                        "value": {
+                            "stringValue": settings.PARTY
+                        }
+                    }]
+                },
+                "scopeSpans": [{
+                    "scope": {
+                        "name": "petplatform"
+                    },
+                    "spans": [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+        post(self.address, "v1/traces", json=payload, timeout=settings.TRACE_EXPORT_TIMEOUT, return_json=False)
+
+
+class Tracer:
+    """
+    A minimal tracer propagating W3C trace context. Spans are buffered and exported in one batch when
+    the root span of the current process ends, e.g. at the end of an API request or of a task.
+    """
+
+    def __init__(self):
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._exporter = None
+        if settings.TRACE_EXPORTER == "file":
+            self._exporter = FileExporter(settings.TRACE_FILE)
+        elif settings.TRACE_EXPORTER == "otlp":
+            self._exporter = OTLPExporter(settings.TRACE_OTLP_ENDPOINT)
+
+    def reset(self):
+        # the lock may have been held by another thread at fork time, never acquire it here
+        self._current.set(None)
+        self._lock = threading.Lock()
+        self._buffer = []
+
+    @staticmethod
+    def new_trace_id() -> str:
+        return secrets.token_hex(16)
+
+    @property
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = self.current_span
+        return span.trace_id if span is not None else None
+
+    def inject(self, headers: Dict) -> Dict:
+        span = self.current_span
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent()
+        return headers
+
+    @staticmethod
+    def extract(headers) -> Tuple[Optional[str], Optional[str]]:
+        match = _TRACEPARENT_PATTERN.match(headers.get(TRACEPARENT_HEADER, "") or "")
+        return (match.group(1), match.group(2)) if match else (None, None)
+
+    def start_span(self, name: str, trace_id: str = None, parent_id: str = None, attributes: Dict = None) -> Span:
+        parent = self.current_span
+        if trace_id is None and parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        span = Span(name, trace_id or self.new_trace_id(), parent_id, attributes)
+        span.token = self._current.set(span)
+        span.is_root = parent is None
+        return span
+
+    def end_span(self, span: Span, error: Exception = None):
+        span.end_time = time.time_ns()
+        if error is not None:
+            span.error = str(error)
+        try:
+            self._current.reset(span.token)
+        except ValueError:
+            # ended in another context than the one it was started in
+            self._current.set(None)
+        if self._exporter is None:
+            return
+        with self._lock:
+            self._buffer.append(span)
+            if not span.is_root and len(self._buffer) < settings.TRACE_BATCH_SIZE:
+                return
+            spans, self._buffer = self._buffer, []
+        try:
+            self._exporter.export(spans)
+        except Exception:
+            logging.exception("export spans fail")
+
+    @contextmanager
+    def span(self, name: str, trace_id: str = None, attributes: Dict = None):
+        span = self.start_span(name, trace_id=trace_id, attributes=attributes)
+        try:
+            yield span
+        except Exception as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+
+    @contextmanager
+    def child_span(self, name: str, attributes: Dict = None):
+        # a no-op outside of a trace, so that background work does not start orphan traces
+        if self.current_span is None:
+            yield None
+            return
+        with self.span(name, attributes=attributes) as span:
+            yield span
+
+
+tracer = Tracer()
+
+
+def _before_request():
+    trace_id, parent_id = tracer.extract(request.headers)
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.trace_span = tracer.start_span(f"{request.method} {route}",
+                                     trace_id=trace_id,
+                                     parent_id=parent_id,
+                                     attributes={"http.method": request.method})
+
+
+def _teardown_request(error=None):
+    span = g.pop("trace_span", None)
+    if span is not None:
+        tracer.end_span(span, error)
+
+
+def _after_request(response):
+    span = g.get("trace_span")
+    if span is not None:
+        span.set_attribute("http.status_code", response.status_code)
+        response.headers[TRACEPARENT_HEADER] = span.traceparent()
+    return response
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
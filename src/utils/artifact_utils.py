@@ -0,0 +1,106 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # optional, only required to read or convert columnar artifacts
+    pa = None
+
+CSV = "csv"
+ARROW = "arrow"
+PARQUET = "parquet"
+
+FORMATS = [CSV, ARROW, PARQUET]
+_EXTENSIONS = {".csv": CSV, ".arrow": ARROW, ".feather": ARROW, ".ipc": ARROW, ".parquet": PARQUET}
+
+
+def is_arrow_available() -> bool:
+    return pa is not None
+
+
+def _require_arrow():
+    if pa is None:
+        raise RuntimeError("pyarrow is required for arrow and parquet artifacts, please install it")
+
+
+def detect_format(path: str) -> str:
+    """
+    The format of an artifact from its extension, files without a known extension are csv.
+    """
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), CSV)
+
+
+def with_format(path: str, artifact_format: str) -> str:
+    extension = {CSV: ".csv", ARROW: ".arrow", PARQUET: ".parquet"}[artifact_format]
+    return os.path.splitext(path)[0] + extension
+
+
+def open_table(path: str) -> "pa.Table":
+    """
+    Load an artifact as an arrow table, arrow files are memory-mapped so their columns are not copied
+    nor parsed, and only the pages actually read are loaded.
+    """
+    _require_arrow()
+    artifact_format = detect_format(path)
+    if artifact_format == ARROW:
+        return pa_ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if artifact_format == PARQUET:
+        return pa_parquet.read_table(path, memory_map=True)
+    return pa_csv.read_csv(path)
+
+
+def iter_batches(path: str):
+    """
+    Stream an artifact of any format as arrow record batches, with memory bounded by the batch size.
+    """
+    _require_arrow()
+    artifact_format = detect_format(path)
+    if artifact_format == ARROW:
+        reader = pa_ipc.open_file(pa.memory_map(path, "r"))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    elif artifact_format == PARQUET:
+        yield from pa_parquet.ParquetFile(path, memory_map=True).iter_batches()
+    else:
+        yield from pa_csv.open_csv(path)
+
+
+def convert(src: str, dst: str, dst_format: str = None) -> str:
+    """
+    Convert an artifact batch by batch, formats default to the ones of the file extensions.
+    """
+    _require_arrow()
+    dst_format = dst_format or detect_format(dst)
+    batches = iter_batches(src)
+    first = next(batches, None)
+    schema = first.schema if first is not None else open_table(src).schema
+    tmp_path = f"{dst}.tmp"
+    if dst_format == ARROW:
+        writer = pa_ipc.new_file(tmp_path, schema)
+    elif dst_format == PARQUET:
+        writer = pa_parquet.ParquetWriter(tmp_path, schema)
+    else:
+        writer = pa_csv.CSVWriter(tmp_path, schema)
+    with writer:
+        if first is not None:
+            writer.write_batch(first)
+        for batch in batches:
+            writer.write_batch(batch)
+    # readers never see a partially written artifact
+    os.replace(tmp_path, dst)
+    return dst
@@ -15,17 +15,27 @@ import time
 
 from sqlalchemy.exc import OperationalError
 
+from monitor.metrics import DB_COMMIT_LATENCY, DB_COMMIT_RETRIES
+from tracing import tracer
+
 
 def session_commit_with_retry(session, max_retry=3):
-    for i in range(max_retry):
+    with tracer.child_span("db.commit"):
+        start_time, result = time.perf_counter(), "fail"
         try:
-            session.commit()
-            # If commit() succeed, break the loop and return.
-            return
-        except OperationalError:
-            session.rollback()
-            if i < max_retry - 1:  # No need to sleep after the last attempt
-                sleep_time = 0.001 * (2**i)  # exponential backoff, 1, 2, 4, ...
-                time.sleep(sleep_time)
-    # If all retries failed, or encounter unexpected exception, raise.
-    raise
+            for i in range(max_retry):
+                try:
+                    session.commit()
+                    # If commit() succeed, break the loop and return.
+                    result = "success"
+                    return
+                except OperationalError:
+                    session.rollback()
+                    if i < max_retry - 1:  # No need to sleep after the last attempt
+                        DB_COMMIT_RETRIES.inc()
+                        sleep_time = 0.001 * (2**i)  # exponential backoff, 1, 2, 4, ...
+                        time.sleep(sleep_time)
+            # If all retries failed, or encounter unexpected exception, raise.
+            raise
+        finally:
+            DB_COMMIT_LATENCY.labels(result).observe(time.perf_counter() - start_time)
@@ -0,0 +1,54 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+
+from flask import request, Response
+
+import settings
+
+
+def make_job_etag(job_id: str, version: int) -> str:
+    # weak, the job version moves on every job or task transition, and after the timings, resources and profile
+    # of a task are written
+    return f"{job_id}-{version}"
+
+
+def is_not_modified(etag: str) -> bool:
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Gzip large responses for clients that accept it, used as an after_request hook.
+    Streamed responses, e.g. server-sent events, are left untouched.
+    """
+    if settings.GZIP_MIN_SIZE <= 0 or response.status_code != 200 or response.is_streamed:
+        return response
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    if "gzip" not in request.accept_encodings:
+        return response
+    data = response.get_data()
+    if len(data) < settings.GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=settings.GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
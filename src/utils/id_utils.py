@@ -20,3 +20,10 @@ def generate_job_id():
     timestamp = now.strftime('%Y%m%d%H%M%S')
     rand_number = random.randint(1000, 9999)
     return "j_" + timestamp + "_" + str(rand_number)
+
+
+def generate_predict_request_id():
+    now = datetime.datetime.now()
+    timestamp = now.strftime('%Y%m%d%H%M%S')
+    rand_number = random.randint(100000, 999999)
+    return "p_" + timestamp + "_" + str(rand_number)
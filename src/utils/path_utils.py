@@ -27,6 +27,11 @@ def is_existing_dir_or_file(pathlike: str):
     return os.path.exists(pathlike)
 
 
+def is_inside_dir(pathlike: str, directory: str) -> bool:
+    directory_abs = os.path.abspath(directory)
+    return os.path.commonpath([os.path.abspath(pathlike), directory_abs]) == directory_abs
+
+
 def validated_pathlike(pathlike: Any, safe_workdir: str) -> Union[str, Any]:
     if not isinstance(pathlike, str) or not is_existing_dir_or_file(pathlike):
         return pathlike
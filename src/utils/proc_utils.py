@@ -0,0 +1,140 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+from typing import Dict, List, Tuple
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def is_proc_available() -> bool:
+    return os.path.isfile(f"/proc/{os.getpid()}/stat")
+
+
+def _read_stat(pid: int) -> List[str]:
+    with open(f"/proc/{pid}/stat", "r") as f:
+        content = f.read()
+    # the command name may contain spaces, the fields after it are space separated
+    return content[content.rindex(")") + 2:].split()
+
+
+def _has_children_files() -> bool:
+    # /proc/<pid>/task/<tid>/children needs a kernel built with CONFIG_PROC_CHILDREN
+    return os.path.isfile(f"/proc/{os.getpid()}/task/{os.getpid()}/children")
+
+
+HAS_CHILDREN_FILES = _has_children_files()
+
+
+def _read_children_files(pid: int) -> List[int]:
+    children = []
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            # the thread exited while reading
+            continue
+    return children
+
+
+def get_children_map() -> Dict[int, List[int]]:
+    """
+    The children of every process, read in a single pass over /proc.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid = int(_read_stat(int(entry))[1])
+        except (OSError, ValueError, IndexError):
+            # the process exited while scanning
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def get_children(pid: int) -> List[int]:
+    if HAS_CHILDREN_FILES:
+        return _read_children_files(pid)
+    return get_children_map().get(pid, [])
+
+
+def get_process_tree(pid: int) -> List[int]:
+    """
+    The process and all its descendants. Reads the children files of the tree where the kernel has them,
+    otherwise the stat of every process once, instead of once per process of the tree.
+    """
+    if HAS_CHILDREN_FILES:
+        children_of = _read_children_files
+    else:
+        children_of = get_children_map().get
+    tree, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        tree.append(current)
+        queue.extend(children_of(current) or [])
+    return tree
+
+
+def read_process_stats(pid: int) -> Dict[str, int]:
+    """
+    CPU time in seconds, resident and peak resident memory and storage I/O in bytes of a single process.
+    Raise OSError if the process has exited, I/O counters are zero if /proc/<pid>/io is not readable.
+    """
+    fields = _read_stat(pid)
+    # utime and stime are the 14th and 15th fields of /proc/<pid>/stat, i.e. the 12th and 13th after the name
+    stats = {
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        "rss": int(fields[21]) * PAGE_SIZE,
+        "peak_rss": 0,
+        "read_bytes": 0,
+        "write_bytes": 0
+    }
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                stats["peak_rss"] = int(line.split()[1]) * 1024
+                break
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, value = line.split(":")
+                if key in ("read_bytes", "write_bytes"):
+                    stats[key] = int(value)
+    except OSError:
+        pass
+    return stats
+
+
+def read_net_bytes(pid: int) -> Tuple[int, int]:
+    """
+    Received and transmitted bytes of all the non-loopback interfaces seen by the process.
+    Note the counters belong to the network namespace, not to the process alone.
+    """
+    rx, tx = 0, 0
+    with open(f"/proc/{pid}/net/dev", "r") as f:
+        for line in f.readlines()[2:]:
+            interface, counters = line.split(":", 1)
+            if interface.strip() == "lo":
+                continue
+            values = counters.split()
+            rx += int(values[0])
+            tx += int(values[8])
+    return rx, tx
@@ -55,8 +55,12 @@ def send_request(method: str,
                       f"data={data}")
         response.raise_for_status()
 
+    if not return_json:
+        # e.g. a binary payload, not json
+        logging.debug(f"response: {len(response.content)} bytes of {response.headers.get('Content-Type')}")
+        return response
     logging.debug(f"response: {response.json()}")
-    return response.json() if return_json else response
+    return response.json()
 
 
 def delete(address: str,
@@ -0,0 +1,116 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import csv
+import heapq
+import os
+import tempfile
+from typing import Iterable, Iterator, Tuple, Union
+
+from utils.artifact_utils import CSV, detect_format, iter_batches
+
+# ids sorted in memory at once, bounds the memory used to sort inputs of any size
+SORT_CHUNK_SIZE = 5_000_000
+
+
+def read_ids(path: str, column_name: str = None) -> Iterator[str]:
+    """
+    The ids of a csv file, taken from column_name, or from a headerless single column file.
+    Arrow and parquet files are streamed batch by batch, column_name defaults to their first column.
+    """
+    if detect_format(path) != CSV:
+        for batch in iter_batches(path):
+            index = batch.schema.get_field_index(column_name) if column_name is not None else 0
+            if index < 0:
+                raise ValueError(f"column {column_name} not found in {path}")
+            yield from (str(value) for value in batch.column(index).to_pylist() if value is not None)
+        return
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        index = 0
+        if column_name is not None:
+            header = next(reader, [])
+            if column_name not in header:
+                raise ValueError(f"column {column_name} not found in {path}")
+            index = header.index(column_name)
+        for row in reader:
+            if row:
+                yield row[index]
+
+
+def iter_lines(path: Union[str, None]) -> Iterator[str]:
+    if path is None or not os.path.isfile(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def _write_lines(lines: Iterable[str], path: str) -> int:
+    count = 0
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+            count += 1
+    return count
+
+
+def _unique(lines: Iterable[str]) -> Iterator[str]:
+    last = None
+    for line in lines:
+        if line != last:
+            yield line
+            last = line
+
+
+def sort_unique(ids: Iterable[str], output_path: str, chunk_size: int = SORT_CHUNK_SIZE) -> int:
+    """
+    Write the sorted, deduplicated ids one per line with an external merge sort, return their number.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as tmpdir:
+        chunk_paths, chunk = [], []
+        for value in ids:
+            chunk.append(value)
+            if len(chunk) >= chunk_size:
+                chunk_paths.append(os.path.join(tmpdir, str(len(chunk_paths))))
+                _write_lines(_unique(sorted(chunk)), chunk_paths[-1])
+                chunk = []
+        if not chunk_paths:
+            return _write_lines(_unique(sorted(chunk)), output_path)
+        chunk_paths.append(os.path.join(tmpdir, str(len(chunk_paths))))
+        _write_lines(_unique(sorted(chunk)), chunk_paths[-1])
+        return _write_lines(_unique(heapq.merge(*(iter_lines(path) for path in chunk_paths))), output_path)
+
+
+def diff_sorted(left_path: Union[str, None], right_path: Union[str, None], left_only_path: str,
+                right_only_path: str) -> Tuple[int, int]:
+    """
+    Walk two sorted id files side by side and write the ids only found on either side,
+    a missing file is an empty set. Return the number of ids only in left and only in right.
+    """
+    left, right = iter_lines(left_path), iter_lines(right_path)
+    with open(left_only_path, "w") as left_only, open(right_only_path, "w") as right_only:
+        num_left, num_right = 0, 0
+        left_value, right_value = next(left, None), next(right, None)
+        while left_value is not None or right_value is not None:
+            if right_value is None or (left_value is not None and left_value < right_value):
+                left_only.write(left_value + "\n")
+                num_left += 1
+                left_value = next(left, None)
+            elif left_value is None or right_value < left_value:
+                right_only.write(right_value + "\n")
+                num_right += 1
+                right_value = next(right, None)
+            else:
+                left_value, right_value = next(left, None), next(right, None)
+    return num_left, num_right
@@ -13,9 +13,10 @@
 # limitations under the License.
 import logging
 
-from flask import request, jsonify, Blueprint
+from flask import request, jsonify, Blueprint, Response
 
 from job_manager.core import JobManager
+from monitor import generate_metrics
 import settings
 from utils.id_utils import generate_job_id
 
@@ -29,6 +30,12 @@ def index_view():
     }), 200
 
 
+@default_views.route("/metrics")
+def metrics_view():
+    content, content_type = generate_metrics()
+    return Response(content, content_type=content_type)
+
+
 @default_views.route("/job/submit", methods=["POST"])
 def submit_job():
     try:
@@ -11,19 +11,36 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from flask import g, request, jsonify, Blueprint
+import json
+import os
+import time
+
+from flask import g, request, jsonify, Blueprint, Response, stream_with_context
 
 from constants import Status
-from decorators.decorators import jwt_required, is_node, check_job_permission, log_and_handle_exceptions
+from decorators.decorators import jwt_required, is_admin, is_node, check_job_permission, log_and_handle_exceptions
+from decorators.decorators import rate_limited
+from job_manager.batch import BatchJobManager
 from job_manager.core import JobManager
+from job_manager.party_monitor import party_monitor
+from job_manager.predict_batch import predict_batcher
+from job_manager.resource import get_mission_resources
+from models.user import Role
+from network.health import party_health
+from network.outbox import PartyOutbox
+from network.request import request_manager
+import settings
+from utils.http_utils import compress_response, is_not_modified, make_job_etag, not_modified
 from utils.id_utils import generate_job_id
 
 v1 = Blueprint('v1_views', __name__)
+v1.after_request(compress_response)
 
 
 @v1.route("/api/v1/jobs", methods=["POST"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 def submit():
     user_name = g.validated_user["name"]
     params = request.json
@@ -34,9 +51,63 @@ def submit():
     return jsonify({"success": True, "job_id": job_id}), 200
 
 
+@v1.route("/api/v1/jobs:batchGet", methods=["POST"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def batch_get():
+    user_name = g.validated_user["name"]
+    job_ids = request.json.get("job_ids")
+    result = BatchJobManager(user_name).get_jobs_details(job_ids)
+    return jsonify({"success": True, **result}), 200
+
+
+@v1.route("/api/v1/jobs:batchSubmit", methods=["POST"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def batch_submit():
+    user_name = g.validated_user["name"]
+    params_list = request.json.get("jobs")
+    job_ids = BatchJobManager(user_name).submit(params_list)
+    return jsonify({"success": True, "job_ids": job_ids}), 200
+
+
+@v1.route("/api/v1/jobs:batchCancel", methods=["POST"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def batch_cancel():
+    user_name = g.validated_user["name"]
+    job_ids = request.json.get("job_ids")
+    result = BatchJobManager(user_name).cancel(job_ids)
+    return jsonify({"success": True, **result}), 200
+
+
+@v1.route("/api/v1/predictions", methods=["POST"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def submit_prediction():
+    user_name = g.validated_user["name"]
+    request_id = predict_batcher.submit(request.json, user_name)
+    return jsonify({"success": True, "request_id": request_id}), 200
+
+
+@v1.route("/api/v1/predictions/<request_id>", methods=["GET"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def get_prediction(request_id):
+    user_name = g.validated_user["name"]
+    prediction = predict_batcher.get(request_id, user_name)
+    return jsonify({"success": True, "prediction": prediction}), 200
+
+
 @v1.route("/api/v1/jobs/<job_id>/rerun", methods=["POST"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 @check_job_permission
 def rerun(job_id):
     job_manager = JobManager(job_id)
@@ -47,6 +118,7 @@ def rerun(job_id):
 @v1.route("/api/v1/jobs/<job_id>/cancel", methods=["POST"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 @check_job_permission
 def cancel(job_id):
     job_manager = JobManager(job_id)
@@ -57,16 +129,62 @@ def cancel(job_id):
 @v1.route("/api/v1/jobs/<job_id>", methods=["GET"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 @check_job_permission
 def get(job_id):
     job_manager = JobManager(job_id)
+    # the job version is a cheap read of the job row, unchanged jobs never touch the task tables
+    version, _ = job_manager.get_state_version()
+    etag = make_job_etag(job_id, version)
+    if is_not_modified(etag):
+        return not_modified(etag), 304
     job_details = job_manager.get_job_details()
-    return jsonify({"success": True, "job": job_details}), 200
+    response = jsonify({"success": True, "job": job_details})
+    response.set_etag(etag, weak=True)
+    return response, 200
+
+
+@v1.route("/api/v1/jobs/<job_id>/events", methods=["GET"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+@check_job_permission
+def get_events(job_id):
+    args = request.args
+    # browsers reconnecting to an event stream resume from the last event id
+    since_version = int(args.get("since_version", request.headers.get("Last-Event-ID", "0")))
+    timeout = min(float(args.get("timeout", "30")), settings.STREAM_MAX_DURATION)
+    job_manager = JobManager(job_id)
+    if request.accept_mimetypes.best == "text/event-stream":
+        return Response(stream_with_context(_stream_events(job_manager, since_version, timeout)),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache"}), 200
+    # long-poll, return as soon as the job version moves past since_version or on timeout
+    version, _ = job_manager.wait_for_change(since_version, timeout)
+    changed = version > since_version
+    job_details = job_manager.get_job_details() if changed else None
+    return jsonify({"success": True, "changed": changed, "version": version, "job": job_details}), 200
+
+
+def _stream_events(job_manager: "JobManager", since_version: int, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        version, status = job_manager.wait_for_change(since_version, min(15, deadline - time.time()))
+        if version > since_version:
+            since_version = version
+            job_details = job_manager.get_job_details()
+            yield f"id: {version}\nevent: job\ndata: {json.dumps(job_details, default=str)}\n\n"
+        else:
+            # keep idle connections alive through proxies
+            yield ": keepalive\n\n"
+        if status in Status.finished:
+            return
 
 
 @v1.route("/api/v1/jobs", methods=["GET"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 def get_all():
     user_name = g.validated_user["name"]
     args = request.args
@@ -83,6 +201,14 @@ def get_all():
         limit = int(limit)
         if limit < 1:
             raise ValueError("limit must be a positive integer")
+    if "cursor" in args:
+        # cursor pagination in creation order, for exports
+        cursor = int(args["cursor"])
+        details = args.get("details", "false").lower() == "true"
+        finished = args.get("finished", "false").lower() == "true"
+        jobs, next_cursor, has_more = BatchJobManager(user_name).export_jobs(cursor, limit, status, hours, details,
+                                                                             finished)
+        return jsonify({"success": True, "jobs": jobs, "next_cursor": next_cursor, "has_more": has_more}), 200
     job_manager = JobManager("")
     jobs = job_manager.get_jobs(user_name=user_name, status=status, hours=hours, limit=limit)
     return jsonify({"success": True, "jobs": jobs}), 200
@@ -91,6 +217,7 @@ def get_all():
 @v1.route("/api/v1/tasks/<job_id>/<task_name>", methods=["PATCH"])
 @log_and_handle_exceptions
 @jwt_required
+@rate_limited
 @is_node
 def update_task(job_id, task_name):
     params = request.json
@@ -100,3 +227,68 @@ def update_task(job_id, task_name):
     job_manager = JobManager(job_id)
     job_manager.update_task(task_name=task_name, task_status=task_status, external_context=job_context, errors=errors)
     return jsonify({"success": True}), 200
+
+
+@v1.route("/api/v1/tasks/<job_id>/<task_name>/ready", methods=["POST"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+@is_node
+def task_ready(job_id, task_name):
+    params = request.json
+    job_manager = JobManager(job_id)
+    job_manager.task_ready(task_name=task_name,
+                           party=params["party"],
+                           port=params.get("port"),
+                           network=params.get("network"))
+    return jsonify({"success": True}), 200
+
+
+@v1.route("/api/v1/network/probe", methods=["GET"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+@is_node
+def probe_network():
+    # a payload for partners to measure the throughput of their link to this party
+    size = int(request.args.get("size", "0"))
+    if not 0 <= size <= 16 * 1024**2:
+        raise ValueError("size must be between 0 and 16MB")
+    # random bytes sent as they are, a compressed payload would overstate the throughput
+    response = Response(os.urandom(size), content_type="application/octet-stream")
+    response.headers["Content-Encoding"] = "identity"
+    return response, 200
+
+
+@v1.route("/api/v1/parties/health", methods=["GET"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+@is_admin
+def get_parties_health():
+    if request.args.get("refresh", "false").lower() == "true":
+        for party in party_monitor.partners():
+            request_manager.ping(party)
+    # the health seen by the worker answering, every worker pings the partners on its own
+    pending = PartyOutbox().pending()
+    parties = {}
+    for party in party_monitor.partners():
+        parties[party] = party_health.breaker(party).snapshot()
+        parties[party]["queued_calls"] = pending.get(party, 0)
+    return jsonify({"success": True, "parties": parties}), 200
+
+
+@v1.route("/api/v1/missions/<mission_name>/resources", methods=["GET"])
+@log_and_handle_exceptions
+@jwt_required
+@rate_limited
+def get_resources(mission_name):
+    args = request.args
+    limit = int(args.get("limit", "20"))
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    with_samples = args.get("samples", "false").lower() == "true"
+    # admins see the whole history of the mission, other users only their own jobs
+    user_name = None if g.validated_user["role"] == Role.admin else g.validated_user["name"]
+    resources = get_mission_resources(mission_name, user_name=user_name, limit=limit, with_samples=with_samples)
+    return jsonify({"success": True, "resources": resources}), 200
@@ -0,0 +1,90 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Latency per SQL job of compiling in a fresh process, as a sql task does without the compiler service, against
+compiling through the warm service on its Unix socket. Run from the src dir with the compile function of the
+service, e.g.
+
+    cd src && python ../test/benchmark_compiler_service.py --entry <module>:<function> --sql "SELECT 1" -n 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from job_manager.compiler_service import compile_sql, ping  # noqa: E402
+
+COLD_SCRIPT = """
+import json, sys
+from job_manager.compiler_service import load_entry
+load_entry(sys.argv[1])(sys.argv[2], json.loads(sys.argv[3]))
+"""
+
+
+def _summary(name: str, latencies):
+    print(f"{name}: mean {statistics.mean(latencies):.3f}s, median {statistics.median(latencies):.3f}s, "
+          f"max {max(latencies):.3f}s over {len(latencies)} jobs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entry", required=True, help="compile function, <module>:<function>")
+    parser.add_argument("--sql", required=True)
+    parser.add_argument("--config", default="{}", help="PETSQL config as json")
+    parser.add_argument("-n", type=int, default=10, help="number of jobs of each kind")
+    args = parser.parse_args()
+    src_dir = os.path.dirname(os.path.abspath(sys.modules["job_manager.compiler_service"].__file__))
+    src_dir = os.path.dirname(src_dir)
+    config = json.loads(args.config)
+
+    cold = []
+    for _ in range(args.n):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", COLD_SCRIPT, args.entry, args.sql, args.config], cwd=src_dir, check=True)
+        cold.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "compiler.sock")
+        service = subprocess.Popen(
+            [sys.executable, "-m", "job_manager.compiler_service", "--socket", socket_path, "--entry", args.entry],
+            cwd=src_dir)
+        try:
+            start = time.perf_counter()
+            while not ping(socket_path, timeout=1):
+                if service.poll() is not None:
+                    raise RuntimeError("the compiler service exited")
+                time.sleep(0.05)
+            print(f"service started in {time.perf_counter() - start:.3f}s, paid once")
+            warm = []
+            for _ in range(args.n):
+                start = time.perf_counter()
+                compile_sql(socket_path, args.sql, config)
+                warm.append(time.perf_counter() - start)
+        finally:
+            service.terminate()
+            service.wait()
+
+    _summary("fresh process", cold)
+    _summary("warm service", warm)
+    print(f"speedup {statistics.mean(cold) / statistics.mean(warm):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
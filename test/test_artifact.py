@@ -0,0 +1,80 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+import unittest
+
+from utils.artifact_utils import ARROW, CSV, PARQUET, convert, is_arrow_available, open_table
+
+os.environ["PARTY"] = "party_a"
+
+
+@unittest.skipUnless(is_arrow_available(), "pyarrow is not installed")
+class TestArtifact(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.SAFE_WORK_DIR = self.tmpdir.name
+        self.scratch_dir = tempfile.TemporaryDirectory()
+        settings.SCRATCH_DIR = self.scratch_dir.name
+        settings.SCRATCH_TMPFS_DIR = ""
+        self.csv_path = os.path.join(self.tmpdir.name, "data.csv")
+        with open(self.csv_path, "w") as f:
+            f.write("id,x\n" + "".join(f"{i},{i * 2}\n" for i in range(100)))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        self.scratch_dir.cleanup()
+
+    def test_convert(self):
+        arrow_path = convert(self.csv_path, os.path.join(self.tmpdir.name, "data.arrow"))
+        parquet_path = convert(arrow_path, os.path.join(self.tmpdir.name, "data.parquet"))
+        csv_path = convert(parquet_path, os.path.join(self.tmpdir.name, "back.csv"))
+        self.assertEqual(open_table(arrow_path).column("id").to_pylist(), list(range(100)))
+        self.assertEqual(open_table(csv_path).to_pydict(), open_table(self.csv_path).to_pydict())
+
+    def test_negotiator(self):
+        import settings
+        from job_manager.artifact import ArtifactNegotiator
+        from utils.sorted_file_utils import read_ids
+        arrow_path = convert(self.csv_path, os.path.join(self.tmpdir.name, "data.arrow"))
+        output_path = os.path.join(self.tmpdir.name, "result.parquet")
+        configmap = {"party_a": {"inputs": {"data": arrow_path}, "outputs": {"data": output_path}}}
+
+        negotiator = ArtifactNegotiator("j_1", "t")
+        negotiator.prepare(configmap, "party_a")
+        party_config = configmap["party_a"]
+        self.assertEqual(party_config["artifact_format"], CSV)
+        self.assertTrue(party_config["inputs"]["data"].endswith(".csv"))
+        # converted copies are kept in the scratch dir of the job, not in the work dir of the users
+        self.assertEqual(os.path.dirname(party_config["inputs"]["data"]), os.path.join(settings.SCRATCH_DIR, "j_1"))
+        self.assertEqual(os.path.dirname(party_config["outputs"]["data"]), os.path.join(settings.SCRATCH_DIR, "j_1"))
+        self.assertEqual(list(read_ids(party_config["inputs"]["data"], "id")), [str(i) for i in range(100)])
+        with open(party_config["outputs"]["data"], "w") as f:
+            f.write("id\n1\n2\n")
+        scratch = [party_config["inputs"]["data"], party_config["outputs"]["data"]]
+        negotiator.finish(True)
+        self.assertEqual(open_table(output_path).column("id").to_pylist(), [1, 2])
+        self.assertFalse(any(os.path.exists(path) for path in scratch))
+
+        configmap = {"party_a": {"inputs": {"data": arrow_path}, "artifact_format": PARQUET}}
+        ArtifactNegotiator("j_1", "t", [CSV, ARROW, PARQUET]).prepare(configmap, "party_a")
+        self.assertEqual(configmap["party_a"]["inputs"]["data"], arrow_path)
+        self.assertEqual(configmap["party_a"]["artifact_format"], PARQUET)
+        self.assertEqual(list(read_ids(arrow_path, "x"))[:3], ["0", "2", "4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
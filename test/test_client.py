@@ -0,0 +1,208 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:
+    web = None
+
+
+class FakePlatform:
+    """
+    The job endpoints of a platform, jobs finish after finish_after polls. failures[name] lists the
+    (status, headers) to answer the next calls of an endpoint with, a submit still creates its job.
+    """
+
+    def __init__(self, finish_after: int = 3):
+        self.finish_after = finish_after
+        self.jobs = {}
+        self.calls = Counter()
+        self.failures = {"submit": [], "get_all": []}
+
+    def app(self) -> "web.Application":
+        app = web.Application()
+        app.router.add_post("/api/v1/jobs", self.submit)
+        app.router.add_get("/api/v1/jobs", self.get_all)
+        app.router.add_get("/api/v1/jobs/{job_id}", self.get)
+        return app
+
+    def _failure(self, name: str):
+        if self.failures[name]:
+            status, headers = self.failures[name].pop(0)
+            return web.json_response({"success": False, "error_message": "unavailable"}, status=status, headers=headers)
+        return None
+
+    async def submit(self, request):
+        self.calls["submit"] += 1
+        params = await request.json()
+        job_id = params.get("job_id", f"j_{len(self.jobs)}")
+        if job_id in self.jobs:
+            return web.json_response({"success": False, "error_message": f"job {job_id} exists"}, status=400)
+        self.jobs[job_id] = {"status": "RUNNING", "polls": 0}
+        return self._failure("submit") or web.json_response({"success": True, "job_id": job_id})
+
+    async def get_all(self, request):
+        self.calls["get_all"] += 1
+        return self._failure("get_all") or web.json_response({"success": True, "jobs": []})
+
+    async def get(self, request):
+        self.calls["get"] += 1
+        job_id = request.match_info["job_id"]
+        job = self.jobs.get(job_id)
+        if job is None:
+            return web.json_response({"success": False, "error_message": f"job {job_id} not found"}, status=400)
+        job["polls"] += 1
+        if job["polls"] >= self.finish_after:
+            job["status"] = "SUCCESS"
+        etag = f'W/"{job_id}-{job["status"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        details = {"success": True, "job": {"job_id": job_id, "job_status": job["status"]}}
+        return web.json_response(details, headers={"ETag": etag})
+
+
+@unittest.skipUnless(web is not None, "aiohttp is not installed")
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        from client.async_client import AsyncPlatformClient
+        self.platform = FakePlatform()
+        self.server = TestServer(self.platform.app())
+        await self.server.start_server()
+        self.client = AsyncPlatformClient(str(self.server.make_url("")), "token", max_retries=2, max_retry_after=1)
+        self.client._backoff = lambda attempt: 0.01
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        await self.server.close()
+
+    async def test_retry(self):
+        self.platform.failures["get_all"] = [(429, {"Retry-After": "0.2"}), (503, {})]
+        start_time = time.time()
+        self.assertEqual(await self.client.get_all(), [])
+        self.assertEqual(self.platform.calls["get_all"], 3)
+        self.assertGreaterEqual(time.time() - start_time, 0.2)
+        # a Retry-After beyond max_retry_after is not waited for
+        self.platform.failures["get_all"] = [(429, {"Retry-After": "60"})]
+        with self.assertRaises(Exception):
+            await self.client.get_all()
+        self.assertEqual(self.platform.calls["get_all"], 4)
+        # so many failures are given up on
+        self.platform.failures["get_all"] = [(503, {})] * 3
+        with self.assertRaises(Exception):
+            await self.client.get_all()
+        self.assertEqual(self.platform.calls["get_all"], 7)
+
+    async def test_submit_retry(self):
+        # without a job id a failed submit is not retried, it may have created the job
+        self.platform.failures["submit"] = [(503, {})]
+        with self.assertRaises(Exception):
+            await self.client.submit({"mission_name": "psi"})
+        self.assertEqual(self.platform.calls["submit"], 1)
+        # with one, the retry is rejected as a duplicate of the job created by the first attempt
+        self.platform.failures["submit"] = [(503, {})]
+        self.assertEqual(await self.client.submit({"mission_name": "psi", "job_id": "j_retried"}), "j_retried")
+        self.assertEqual(self.platform.calls["submit"], 3)
+        self.assertEqual(len(self.platform.jobs), 2)
+        with self.assertRaises(Exception):
+            await self.client.get("j_unknown")
+
+    async def test_get_etag(self):
+        job_id = await self.client.submit({"mission_name": "psi"})
+        job = await self.client.get(job_id)
+        # unchanged details are answered with 304 and served from the cache
+        self.assertIs(await self.client.get(job_id), job)
+        self.assertEqual(job["job_status"], "RUNNING")
+        self.assertEqual((await self.client.get(job_id))["job_status"], "SUCCESS")
+        self.assertEqual(self.platform.calls["get"], 3)
+
+    async def test_submit_and_wait(self):
+        job = await self.client.submit_and_wait({"mission_name": "psi"}, min_interval=0.01, max_interval=0.05)
+        self.assertEqual(job["job_status"], "SUCCESS")
+        self.assertEqual(self.platform.calls["get"], 3)
+        self.platform.finish_after = 1000
+        with self.assertRaises(TimeoutError):
+            await self.client.submit_and_wait({"mission_name": "psi"}, timeout=0.2, min_interval=0.01)
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    # keeps the connections alive, for the pooled session of the client to reuse them
+    protocol_version = "HTTP/1.1"
+    ports = []
+    posts = 0
+
+    def _reply(self, status: int, body: dict = None, headers: dict = None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        SyncHandler.ports.append(self.client_address[1])
+        etag = 'W/"j_1-1"'
+        if self.headers.get("If-None-Match") == etag:
+            self._reply(304, headers={"ETag": etag})
+        else:
+            self._reply(200, {"success": True, "job": {"job_id": "j_1", "job_status": "RUNNING"}}, {"ETag": etag})
+
+    def do_POST(self):
+        SyncHandler.posts += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(503, {"success": False})
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSyncClient(unittest.TestCase):
+
+    def setUp(self) -> None:
+        from client.client import PlatformClient
+        SyncHandler.ports, SyncHandler.posts = [], 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SyncHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = PlatformClient(f"http://127.0.0.1:{self.server.server_address[1]}", "token")
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session(self):
+        job = self.client.get("j_1")
+        self.assertIs(self.client.get("j_1"), job)
+        # both requests went through the same pooled connection
+        self.assertEqual(len(SyncHandler.ports), 2)
+        self.assertEqual(len(set(SyncHandler.ports)), 1)
+        # a submit failing on the server is not retried, it may have created the job
+        with self.assertRaises(Exception):
+            self.client.submit({"mission_name": "psi"})
+        self.assertEqual(SyncHandler.posts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
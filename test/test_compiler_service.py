@@ -0,0 +1,120 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+def compile_upper(sql, config):
+    return {"sql": sql.upper(), "config": config}
+
+
+class TestCompilerService(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, "compiler.sock")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_server(self):
+        from job_manager.compiler_service import CompilerServer, call, compile_sql, ping
+        self.assertFalse(ping(self.socket_path))
+        server = CompilerServer(self.socket_path, f"{__name__}:compile_upper")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            self.assertTrue(ping(self.socket_path))
+            self.assertEqual(compile_sql(self.socket_path, "select 1", {"mode": "memory"}), {
+                "sql": "SELECT 1",
+                "config": {
+                    "mode": "memory"
+                }
+            })
+            self.assertEqual(call(self.socket_path, {"op": "ping"})["served"], 1)
+            with self.assertRaises(RuntimeError):
+                compile_sql(self.socket_path, None)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_supervisor_restart(self):
+        import sys
+        from job_manager.compiler_service import ping
+        from job_manager.service_supervisor import ServiceSupervisor
+        command = [
+            sys.executable, "-m", "job_manager.compiler_service", "--socket", self.socket_path, "--entry", "json:dumps"
+        ]
+        supervisor = ServiceSupervisor("test", command, self.socket_path, ping, interval=0.1, max_failures=2)
+
+        def wait_healthy():
+            deadline = time.time() + 20
+            while time.time() < deadline:
+                if supervisor.run_once():
+                    return True
+                time.sleep(0.1)
+            return False
+
+        try:
+            self.assertTrue(wait_healthy())
+            pid = supervisor.process.pid
+            # a crashed service is restarted
+            supervisor.process.kill()
+            supervisor.process.wait()
+            self.assertTrue(wait_healthy())
+            self.assertEqual(supervisor.restarts, 1)
+            self.assertNotEqual(supervisor.process.pid, pid)
+            # another worker of the host only reports the health of the service
+            other = ServiceSupervisor("test", command, self.socket_path, ping)
+            self.assertTrue(other.run_once())
+            self.assertIsNone(other.process)
+        finally:
+            supervisor.stop()
+        self.assertIsNone(supervisor.process)
+
+    def test_supervisor_reap_orphan(self):
+        import sys
+        from job_manager.compiler_service import ping
+        from job_manager.service_supervisor import ServiceSupervisor
+        command = [
+            sys.executable, "-m", "job_manager.compiler_service", "--socket", self.socket_path, "--entry", "json:dumps"
+        ]
+        supervisor = ServiceSupervisor("test", command, self.socket_path, ping, interval=0.1)
+        other = ServiceSupervisor("test", command, self.socket_path, ping, interval=0.1)
+        try:
+            deadline = time.time() + 20
+            while not supervisor.run_once() and time.time() < deadline:
+                time.sleep(0.1)
+            orphan = supervisor.process
+            # the service leads its own process group
+            self.assertEqual(os.getpgid(orphan.pid), orphan.pid)
+
+            # the worker dies without stopping the service, the next one to take the lock kills it
+            supervisor._lock_file.close()
+            supervisor._lock_file, supervisor.process = None, None
+            self.assertFalse(other.run_once())
+            self.assertEqual(orphan.wait(timeout=10), -9)
+            self.assertNotEqual(other.process.pid, orphan.pid)
+        finally:
+            other.stop()
+        self.assertFalse(os.path.exists(f"{self.socket_path}.pid"))
+
+
+if __name__ == '__main__':
+    unittest.main()
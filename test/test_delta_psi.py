@@ -0,0 +1,138 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class CachedPSI:
+    supports_psi_cache = True
+
+
+class TestDeltaPSI(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        settings.MISSION_CACHE_DIR = os.path.join(self.tmpdir.name, "cache")
+        settings.SCRATCH_DIR = os.path.join(self.tmpdir.name, "scratch")
+        settings.SCRATCH_TMPFS_DIR = ""
+        settings.SAFE_WORK_DIR = os.path.join(self.tmpdir.name, "work")
+        os.makedirs(settings.SAFE_WORK_DIR)
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _write_csv(self, name, ids):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write("id,x\n" + "".join(f"{i},0\n" for i in ids))
+        return path
+
+    def _run_job(self, job_id, ids, intersection, merge=True, psi_operator=f"{__name__}:CachedPSI"):
+        from config.config_manager import ConfigManager
+        from models.job import Job
+        from builtin_operators.delta_psi import DeltaPSIMerge, DeltaPSIPrepare
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id=job_id,
+                    mission_name="psi_delta",
+                    mission_version=1,
+                    job_context=json.dumps({
+                        "party_a": {},
+                        "party_b": {},
+                        "common": {}
+                    }),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        configmap = {
+            "common": {},
+            "party_a": {
+                "column_name": "id",
+                "psi_operator": psi_operator,
+                "inputs": {
+                    "data": self._write_csv(f"{job_id}_input.csv", ids)
+                },
+                # the output of the PSI operator
+                "outputs": {
+                    "data": self._write_csv(f"{job_id}_output.csv", intersection)
+                }
+            }
+        }
+        config_manager = ConfigManager("psi_delta", job_id)
+        self.assertTrue(DeltaPSIPrepare("party_a", config_manager).run(configmap=configmap))
+        if merge:
+            self.assertTrue(DeltaPSIMerge("party_a", config_manager).run(configmap=configmap))
+        return config_manager.job_context.get("delta_psi", party="party_a")
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read().split()
+
+    def test_delta_psi(self):
+        import settings
+        from models.job import Job
+        first = self._run_job("j_1", ["3", "1", "2", "2", "4"], ["1", "2"])
+        self.assertTrue(first["full"])
+        self.assertEqual(self._read(first["added"]), ["1", "2", "3", "4"])
+        second = self._run_job("j_2", ["1", "3", "4", "5"], ["1", "5"])
+        self.assertFalse(second["full"])
+        self.assertEqual(self._read(second["added"]), ["5"])
+        self.assertEqual(self._read(second["removed"]), ["2"])
+        self.assertEqual(self._read(second["intersection"]["added"]), ["5"])
+        self.assertEqual(self._read(second["intersection"]["removed"]), ["2"])
+        # only the state of the last run is kept, the delta ids live in the scratch dir of the job
+        self.assertFalse(os.path.exists(first["snapshot"]))
+        self.assertEqual(os.path.dirname(second["added"]), os.path.join(settings.SCRATCH_DIR, "j_2"))
+
+        # the snapshot of a canceled run is removed by the next merge, the one of a running job is kept
+        canceled = self._run_job("j_3", ["1", "2"], [], merge=False)
+        running = self._run_job("j_4", ["1", "2"], [], merge=False)
+        with self.session_maker() as session:
+            session.query(Job).filter_by(job_id="j_3").update({Job.status: "CANCELED"})
+            session.commit()
+        third = self._run_job("j_5", ["1", "3", "4", "5", "6"], ["1", "5", "6"])
+        self.assertEqual(self._read(third["added"]), ["6"])
+        self.assertFalse(os.path.exists(canceled["snapshot"]))
+        self.assertTrue(os.path.exists(running["snapshot"]))
+        self.assertFalse(os.path.exists(second["snapshot"]))
+
+    def test_full_psi(self):
+        # a PSI operator not reading psi_cache runs over all the ids, they are not diffed for nothing
+        first = self._run_job("j_1", ["1", "2", "3"], ["1", "2"], psi_operator=f"{__name__}:TestDeltaPSI")
+        self.assertTrue(first["full"])
+        self.assertIsNone(first["added"])
+        self.assertEqual(self._read(first["intersection"]["added"]), ["1", "2"])
+        second = self._run_job("j_2", ["1", "3"], ["1"])
+        self.assertTrue(second["full"])
+        self.assertEqual(self._read(second["added"]), ["1", "3"])
+        self.assertEqual(self._read(second["intersection"]["removed"]), ["2"])
+
+    def test_sort_unique(self):
+        from utils.sorted_file_utils import iter_lines, sort_unique
+        path = os.path.join(self.tmpdir.name, "sorted")
+        self.assertEqual(sort_unique(["b", "a", "c", "a", "d", "b"], path, chunk_size=2), 4)
+        self.assertEqual(list(iter_lines(path)), ["a", "b", "c", "d"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ["PARTY"] = "party_a"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+SECRET = "events-test-secret-of-at-least-32-bytes"
+
+
+class TestEvents(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import jwt
+        from flask import Flask
+        import settings
+        from extensions import get_session_maker
+        from models.job import Job
+        from models.task import Task
+        from models.user import User, Role
+        from views.v1 import v1
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+        self.settings = settings.SECRET, settings.STREAM_POLL_INTERVAL
+        settings.SECRET, settings.STREAM_POLL_INTERVAL = SECRET, 0.05
+        # the decorators bind their session maker at import
+        self.patcher = mock.patch("decorators.decorators.session_maker", self.session_maker)
+        self.patcher.start()
+        with self.session_maker() as session:
+            session.add(User(name="alice", role=Role.operator))
+            session.add(
+                Job(job_id="j_1",
+                    mission_name="psi",
+                    mission_version=1,
+                    job_context=json.dumps({
+                        "party_a": {},
+                        "party_b": {},
+                        "common": {}
+                    }),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING",
+                    user_name="alice"))
+            session.add(Task(name="psi_a", job_id="j_1", party="party_a", status="RUNNING"))
+            session.commit()
+            self.version = session.query(Job).filter_by(job_id="j_1").first().version_id
+        self.token = jwt.encode({"name": "alice"}, SECRET, algorithm="HS256")
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+        self.app = Flask(__name__)
+        self.app.register_blueprint(v1)
+        self.client = self.app.test_client()
+
+    def tearDown(self) -> None:
+        import settings
+        self.patcher.stop()
+        settings.SECRET, settings.STREAM_POLL_INTERVAL = self.settings
+        self.tmpdir.cleanup()
+
+    def _set_status(self, status, delay=0):
+        from models.job import Job
+
+        def update():
+            time.sleep(delay)
+            with self.session_maker() as session:
+                session.query(Job).filter_by(job_id="j_1").first().status = status
+                session.commit()
+
+        if not delay:
+            return update()
+        thread = threading.Thread(target=update)
+        thread.start()
+        return thread
+
+    def _poll(self, since_version, timeout, headers=None):
+        return self.client.get("/api/v1/jobs/j_1/events",
+                               query_string={
+                                   "since_version": since_version,
+                                   "timeout": timeout
+                               },
+                               headers={
+                                   **self.headers,
+                                   **(headers or {})
+                               })
+
+    def test_long_poll(self):
+        response = self._poll(0, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json["changed"])
+        self.assertEqual(response.json["version"], self.version)
+        self.assertEqual(response.json["job"]["job_status"], "RUNNING")
+
+        # no change before the timeout
+        start = time.time()
+        response = self._poll(self.version, 0.3)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(response.json, {"success": True, "changed": False, "version": self.version, "job": None})
+
+        # returns as soon as the job changes
+        thread = self._set_status("SUCCESS", delay=0.2)
+        start = time.time()
+        response = self._poll(self.version, 5)
+        thread.join()
+        self.assertLess(time.time() - start, 4)
+        self.assertTrue(response.json["changed"])
+        self.assertGreater(response.json["version"], self.version)
+        self.assertEqual(response.json["job"]["job_status"], "SUCCESS")
+
+        # a finished job never changes again, do not hold the request
+        start = time.time()
+        response = self._poll(response.json["version"], 5)
+        self.assertLess(time.time() - start, 4)
+        self.assertFalse(response.json["changed"])
+
+        # only the owner of the job
+        response = self.client.get("/api/v1/jobs/j_1/events", query_string={"timeout": 0})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream(self):
+        sse = {"Accept": "text/event-stream"}
+        # the job does not change, keepalives until the timeout
+        start = time.time()
+        response = self._poll(self.version, 0.3, sse)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(set(response.get_data(as_text=True).split("\n\n")), {": keepalive", ""})
+
+        # one event per change, the stream ends once the job finishes
+        self._set_status("FAILED")
+        response = self.client.get("/api/v1/jobs/j_1/events",
+                                   query_string={"timeout": 5},
+                                   headers={
+                                       **self.headers,
+                                       **sse, "Last-Event-ID": str(self.version)
+                                   })
+        events = [e for e in response.get_data(as_text=True).split("\n\n") if e]
+        self.assertEqual(len(events), 1)
+        event_id, event, data = events[0].split("\n")
+        self.assertEqual(event_id, f"id: {self.version + 1}")
+        self.assertEqual(event, "event: job")
+        self.assertEqual(json.loads(data[len("data: "):])["job_status"], "FAILED")
+
+    def test_client_wait(self):
+        from werkzeug.serving import make_server
+        from client.client import PlatformClient
+        server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = PlatformClient(f"http://127.0.0.1:{server.server_port}", self.token)
+            with self.assertRaises(TimeoutError):
+                client.wait("j_1", timeout=0.5, poll_timeout=0.2)
+            # several polls until the job finishes
+            updater = self._set_status("SUCCESS", delay=0.5)
+            job = client.wait("j_1", timeout=10, poll_timeout=0.2)
+            updater.join()
+            self.assertEqual(job["job_status"], "SUCCESS")
+            # returns right away on a finished job
+            start = time.time()
+            self.assertEqual(client.wait("j_1", timeout=10)["job_status"], "SUCCESS")
+            self.assertLess(time.time() - start, 5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
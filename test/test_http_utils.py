@@ -0,0 +1,60 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import os
+import unittest
+
+from flask import Flask, jsonify
+
+os.environ["PARTY"] = "party_a"
+
+
+class TestHttpUtils(unittest.TestCase):
+
+    def setUp(self) -> None:
+        from utils.http_utils import compress_response, is_not_modified, make_job_etag, not_modified
+        app = Flask(__name__)
+        app.after_request(compress_response)
+
+        @app.route("/jobs/<job_id>")
+        def get(job_id):
+            etag = make_job_etag(job_id, 3)
+            if is_not_modified(etag):
+                return not_modified(etag)
+            response = jsonify({"job_id": job_id, "tasks": ["task"] * 1000})
+            response.set_etag(etag, weak=True)
+            return response
+
+        self.client = app.test_client()
+
+    def test_not_modified(self):
+        response = self.client.get("/jobs/j_test")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        response = self.client.get("/jobs/j_test", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        response = self.client.get("/jobs/j_test", headers={"If-None-Match": 'W/"j_test-2"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_compress_response(self):
+        response = self.client.get("/jobs/j_test", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn(b'"job_id":"j_test"', gzip.decompress(response.data).replace(b" ", b""))
+        response = self.client.get("/jobs/j_test")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,395 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import tempfile
+import time
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class FakeModel:
+    loads = []
+
+    def load_model(self, model_path):
+        FakeModel.loads.append(model_path)
+        with open(model_path) as f:
+            self.weights = json.load(f)
+
+
+class FakePredict:
+
+    def __init__(self, party, config_manager, **kwargs):
+        self.party = party
+
+    def run(self, configmap):
+        model = FakeModel()
+        model.load_model(configmap[self.party]["inputs"]["model_path"])
+        configmap[self.party]["outputs"] = model.weights
+        return True
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        from models.job import Job
+        from models.task import Task
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_test",
+                    mission_name="psi",
+                    mission_version=1,
+                    job_context=json.dumps({"common": {}}),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.add(Task(name="psi_a", job_id="j_test", party="party_a", status="INIT"))
+            session.commit()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_leader_lease(self):
+        from job_manager.lease import LeaderLease
+        lease_a = LeaderLease("scheduler", holder="replica_a", ttl=60)
+        lease_b = LeaderLease("scheduler", holder="replica_b", ttl=60)
+        self.assertTrue(lease_a.acquire())
+        self.assertTrue(lease_a.acquire())
+        self.assertFalse(lease_b.acquire())
+        self.assertTrue(lease_a.is_leader())
+        self.assertFalse(lease_b.is_leader())
+        self.assertTrue(lease_a.release())
+        self.assertTrue(lease_b.acquire())
+        self.assertFalse(lease_a.acquire())
+
+    def test_claim_task(self):
+        from constants import Status
+        from job_manager.core import JobManager
+        from job_manager.dag import LogicTask
+        from models.task import Task
+        with self.session_maker() as session:
+            version_id = session.query(Task).filter_by(job_id="j_test", name="psi_a").first().version_id
+        task = LogicTask(name="psi_a",
+                         party="party_a",
+                         args={},
+                         status=Status.INIT,
+                         depends=[],
+                         class_name="PSITransform",
+                         class_path="petml.operators.preprocessing",
+                         version_id=version_id)
+        self.assertTrue(JobManager("j_test")._claim_task(task))
+        # a second claim with the same stale view must lose
+        self.assertFalse(JobManager("j_test")._claim_task(task))
+
+    def test_start_barrier(self):
+        from job_manager.barrier import StartBarrier, record_ready, reset_barriers
+        from models.job import Job
+        barrier = StartBarrier("j_test", "psi_a", {"psi_b": "party_b"}, timeout=0.2, poll_interval=0.05)
+        with self.assertRaises(TimeoutError):
+            barrier.wait()
+        # reported by party_b
+        record_ready(self.session_maker, "j_test", "psi_b", "party_b")
+        self.assertLess(barrier.wait(), 0.2)
+        with self.session_maker() as session:
+            reset_barriers(session, "j_test", ["psi_b"])
+            session.query(Job).filter_by(job_id="j_test").update({Job.status: "CANCELED"})
+            session.commit()
+        with self.assertRaises(RuntimeError):
+            barrier.wait()
+        with self.assertRaises(ValueError):
+            record_ready(self.session_maker, "j_missing", "psi_b", "party_b")
+
+    def test_port_allocator(self):
+        import socket
+        from job_manager.ports import PortAllocator
+        from models.task import Task
+        allocator = PortAllocator(lower_bound=50000, upper_bound=50100, ttl=60)
+        port = allocator.acquire("j_test", "psi_a")
+        self.assertTrue(50000 <= port < 50100)
+        # asked again, e.g. by a restarted executor
+        self.assertEqual(allocator.acquire("j_test", "psi_a"), port)
+        # a port in use is skipped even without a lease
+        busy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            busy.bind(("", allocator._preferred("j_test", "fit_a")))
+            other = allocator.acquire("j_test", "fit_a")
+        finally:
+            busy.close()
+        self.assertNotIn(other, [port, allocator._preferred("j_test", "fit_a")])
+        self.assertEqual(allocator.release("j_test", "fit_a"), 1)
+        self.assertIsNone(allocator.get("j_test", "fit_a"))
+        # psi_a is not running, its lease is stale
+        self.assertEqual(allocator.sweep(), 1)
+        with self.session_maker() as session:
+            session.query(Task).filter_by(job_id="j_test", name="psi_a").update({Task.status: "RUNNING"})
+            session.commit()
+        allocator.acquire("j_test", "psi_a")
+        self.assertEqual(allocator.sweep(), 0)
+        self.assertEqual(allocator.release("j_test"), 1)
+
+    def test_pair_tasks(self):
+        from job_manager.dag import DAG, LogicTask
+        dag = DAG.__new__(DAG)
+        dag.tasks = {
+            name: LogicTask(name, party, {}, "INIT", [], class_name, "petml.operators.preprocessing")
+            for name, party, class_name in [("psi_a", "party_a", "PSITransform"), (
+                "psi_b", "party_b", "PSITransform"), ("fit_a", "party_a", "XGBoostClassifierFit")]
+        }
+        dag._pair_tasks()
+        self.assertEqual(dag.tasks["psi_a"].peers, {"psi_b": "party_b"})
+        self.assertEqual(dag.tasks["fit_a"].peers, {})
+
+    def test_batch_get_jobs(self):
+        from job_manager.batch import BatchJobManager
+        result = BatchJobManager("").get_jobs_details(["j_test", "j_missing", "j_test"])
+        self.assertEqual([job["job_id"] for job in result["jobs"]], ["j_test"])
+        self.assertEqual(result["not_found"], ["j_missing"])
+        # jobs of other users are not visible
+        result = BatchJobManager("someone_else").get_jobs_details(["j_test"])
+        self.assertEqual(result, {"jobs": [], "not_found": ["j_test"]})
+        with self.assertRaises(ValueError):
+            BatchJobManager("").get_jobs_details([])
+
+    def test_touch_job(self):
+        from job_manager.core import JobManager
+        from job_manager.timing import Phase, TaskTimer
+        from utils.http_utils import make_job_etag
+        job_manager = JobManager("j_test")
+        version, _ = job_manager.get_state_version()
+        timer = TaskTimer("j_test", "psi_a")
+        timer.mark(Phase.STATUS_BROADCAST)
+        timer.flush()
+        # the timings written after the last transition move the ETag of the job once it is touched
+        job_manager.touch()
+        touched, _ = job_manager.get_state_version()
+        self.assertEqual(touched, version + 1)
+        self.assertNotEqual(make_job_etag("j_test", touched), make_job_etag("j_test", version))
+        JobManager("j_missing").touch()
+
+    def test_export_jobs(self):
+        from job_manager.batch import BatchJobManager
+        jobs, next_cursor, has_more = BatchJobManager("").export_jobs(cursor=0, details=True)
+        self.assertEqual([job["job_id"] for job in jobs], ["j_test"])
+        self.assertEqual(jobs[0]["task_details"][0]["name"], "psi_a")
+        self.assertFalse(has_more)
+        self.assertEqual(BatchJobManager("").export_jobs(cursor=next_cursor), ([], next_cursor, False))
+        # running jobs hold the cursor back until they finish
+        self.assertEqual(BatchJobManager("").export_jobs(cursor=0, finished=True), ([], 0, False))
+        # a limit above the max page size is capped, the flag tells there is more to fetch
+        import settings
+        max_batch_size, settings.MAX_BATCH_SIZE = settings.MAX_BATCH_SIZE, 0
+        try:
+            self.assertEqual(BatchJobManager("").export_jobs(cursor=0, limit=1000), ([], 0, True))
+        finally:
+            settings.MAX_BATCH_SIZE = max_batch_size
+
+    def test_token_bucket(self):
+        from decorators.rate_limit import TokenBucket, parse_rate_limit
+        self.assertIsNone(parse_rate_limit(""))
+        self.assertEqual(parse_rate_limit("0.5/2"), (0.5, 2))
+        bucket = TokenBucket("user:test", 0.01, 2)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+        # buckets are shared through the db
+        self.assertGreater(TokenBucket("user:test", 0.01, 2).take(), 0)
+        self.assertEqual(TokenBucket("user:other", 0.01, 2).take(), 0)
+
+    def test_admission(self):
+        import settings
+        from exceptions.exceptions import TooManyRequestsError
+        from job_manager.core import JobManager
+        with self.session_maker() as session:
+            with self.assertRaises(TooManyRequestsError) as context:
+                JobManager.check_admission(session, "", "party_a", new_jobs=settings.MAX_JOB_LIMIT)
+            self.assertEqual(context.exception.code, 429)
+            JobManager.check_admission(session, "", "party_a", new_jobs=settings.MAX_JOB_LIMIT - 1)
+
+    def test_batch_admission(self):
+        import settings
+        from exceptions.exceptions import TooManyRequestsError
+        from job_manager.batch import BatchJobManager
+        limits = settings.MAX_JOB_LIMIT, settings.MAX_USER_JOB_LIMIT
+        settings.MAX_JOB_LIMIT, settings.MAX_USER_JOB_LIMIT = 10, 2
+        try:
+            # the jobs initiated here count against the quota of the user, wherever they are in the batch
+            forwarded = {"main_party": "party_b", "mission_name": "psi"}
+            local = {"main_party": "party_a", "mission_name": "psi"}
+            with self.assertRaises(TooManyRequestsError):
+                BatchJobManager("").submit([forwarded, local, local])
+            # forwarded jobs are admitted by their main party, the mission is missing here
+            with self.assertRaises(ValueError):
+                BatchJobManager("").submit([forwarded, forwarded, local])
+        finally:
+            settings.MAX_JOB_LIMIT, settings.MAX_USER_JOB_LIMIT = limits
+
+    def test_scratch(self):
+        import settings
+        from job_manager.dag import LogicTask
+        from job_manager.scratch import JobScratch, sweep_scratch
+        from job_manager.task import TaskExecutor
+        from models.job import Job
+        from utils.path_utils import validated_pathlike
+        settings.SAFE_WORK_DIR = os.path.join(self.tmpdir.name, "work")
+        settings.SCRATCH_DIR = os.path.join(self.tmpdir.name, "scratch")
+        settings.SCRATCH_TMPFS_DIR = os.path.join(self.tmpdir.name, "shm")
+        os.makedirs(settings.SCRATCH_TMPFS_DIR)
+        scratch = JobScratch("j_test")
+        path = scratch.create(estimated_size=1024)
+        self.assertTrue(os.path.islink(path))
+        with open(os.path.join(path, "psi_result.csv"), "w") as f:
+            f.write("id\n1\n")
+        # user params never reach the scratch dir, only the overrides of the mission do
+        artifact = os.path.join(path, "psi_result.csv")
+        self.assertEqual(validated_pathlike(artifact, settings.SAFE_WORK_DIR),
+                         os.path.join(settings.SAFE_WORK_DIR, "psi_result.csv"))
+        task = LogicTask("psi_a", "party_a", {}, "INIT", [], "PSITransform", "petml.operators.preprocessing")
+        executor = TaskExecutor("psi", "j_test", task)
+        outside = os.path.join(self.tmpdir.name, "petplatform.db")
+        self.assertEqual(executor._validated_overrides({"data": [artifact, outside]}, path),
+                         {"data": [artifact, os.path.join(settings.SAFE_WORK_DIR, "petplatform.db")]})
+        # too large for tmpfs
+        self.assertFalse(os.path.islink(JobScratch("j_large").create(estimated_size=2**62)))
+
+        self.assertEqual(sweep_scratch(self.session_maker), 1)
+        with self.session_maker() as session:
+            session.query(Job).filter_by(job_id="j_test").update({Job.status: "SUCCESS"})
+            session.commit()
+        self.assertEqual(sweep_scratch(self.session_maker), 1)
+        self.assertFalse(os.path.lexists(path))
+        self.assertEqual(os.listdir(os.path.join(settings.SCRATCH_TMPFS_DIR, "petplatform_scratch")), [])
+
+    def test_resolve_bindings(self):
+        from config.config_manager import ConfigManager
+        from constants import Status
+        from job_manager.dag import LogicTask
+        from job_manager.task import TaskExecutor
+        from models.job import Job
+        with self.session_maker() as session:
+            job_context = json.dumps({"party_a": {"scratch_dir": "/scratch/j_test"}, "common": {}})
+            session.query(Job).filter_by(job_id="j_test").update({Job.job_context: job_context})
+            session.commit()
+        task = LogicTask(name="psi_a",
+                         party="party_a",
+                         args={},
+                         status=Status.INIT,
+                         depends=[],
+                         class_name="PSITransform",
+                         class_path="petml.operators.preprocessing")
+        executor = TaskExecutor("psi", "j_test", task)
+        resolved = executor._resolve(
+            {
+                "outputs": {
+                    "data": "${job_context.scratch_dir}/psi_result.csv"
+                },
+                "dir": "${job_context.scratch_dir}",
+                "keep": "$HOME"
+            }, ConfigManager("psi", "j_test"))
+        self.assertEqual(resolved, {
+            "outputs": {
+                "data": "/scratch/j_test/psi_result.csv"
+            },
+            "dir": "/scratch/j_test",
+            "keep": "$HOME"
+        })
+
+    def test_model_cache(self):
+        import pickle
+        from job_manager.model_cache import ModelCache
+        paths = []
+        for i in range(3):
+            paths.append(os.path.join(self.tmpdir.name, f"model_{i}.pkl"))
+            with open(paths[-1], "wb") as f:
+                pickle.dump({"model": i, "weights": [0] * 100}, f)
+        size = os.path.getsize(paths[0])
+        loads = []
+
+        def loader(path):
+            loads.append(path)
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        cache = ModelCache(max_bytes=size * 2)
+        self.assertEqual(cache.load(paths[0], loader)["model"], 0)
+        self.assertEqual(cache.load(paths[0], loader)["model"], 0)
+        cache.load(paths[1], loader)
+        cache.load(paths[0], loader)
+        # the least recently used model is evicted
+        cache.load(paths[2], loader)
+        self.assertEqual(loads, paths)
+        self.assertIn(paths[0], cache)
+        self.assertNotIn(paths[1], cache)
+        # a replaced model file is loaded again
+        with open(paths[0], "wb") as f:
+            pickle.dump({"model": 3, "weights": [1] * 100}, f)
+        os.utime(paths[0], ns=(0, 0))
+        self.assertEqual(cache.load(paths[0])["model"], 3)
+
+    def test_cached_model_predict(self):
+        from builtin_operators.cached_predict import CachedModelPredict
+        from job_manager.model_cache import model_cache
+
+        class Predict(CachedModelPredict):
+            operator = (__name__, "FakePredict")
+            model = (__name__, "FakeModel")
+
+        model_path = os.path.join(self.tmpdir.name, "model.json")
+        with open(model_path, "w") as f:
+            json.dump([1, 2], f)
+        model_cache.clear()
+        FakeModel.loads = []
+        for _ in range(2):
+            configmap = {"party_a": {"inputs": {"model_path": model_path}}}
+            self.assertTrue(Predict("party_a", None).run(configmap))
+            self.assertEqual(configmap["party_a"]["outputs"], [1, 2])
+        # the second predict reuses the model loaded by the first one
+        self.assertEqual(FakeModel.loads, [model_path])
+        # the model class is left as it was
+        self.assertEqual(FakeModel.load_model.__qualname__, "FakeModel.load_model")
+        model_cache.clear()
+
+    def test_executor_pool(self):
+        from job_manager.executor_pool import ExecutorPool
+        pool = ExecutorPool(max_workers=1)
+        try:
+            pids = [pool.submit(os.getpid).result(timeout=30) for _ in range(2)]
+            # the executor is long-lived
+            self.assertEqual(pids[0], pids[1])
+            self.assertNotEqual(pids[0], os.getpid())
+            # no queueing behind a busy executor, the caller falls back to a process of its own
+            busy = pool.try_submit(time.sleep, 1)
+            self.assertIsNone(pool.try_submit(os.getpid))
+            busy.result(timeout=30)
+            # the slot is given back by a done callback, which may run just after the result is set
+            deadline = time.time() + 5
+            future = pool.try_submit(os.getpid)
+            while future is None and time.time() < deadline:
+                time.sleep(0.01)
+                future = pool.try_submit(os.getpid)
+            self.assertEqual(future.result(timeout=30), pids[0])
+        finally:
+            pool.shutdown()
+        pool.detach()
+        self.assertFalse(pool.is_available())
+        self.assertFalse(ExecutorPool(max_workers=0).is_available())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# run in a process of its own, the multiprocess mode of prometheus_client is chosen when the metrics are created
+MULTIPROCESS_SCRIPT = """
+import os
+import runpy
+import types
+
+import flask
+
+import monitor
+from monitor.metrics import LIVE_EXECUTORS, TASK_RUN_TIME
+from views.default_views import default_views
+
+app = flask.Flask(__name__)
+monitor.init_app(app)
+app.register_blueprint(default_views)
+client = app.test_client()
+client.get("/")
+
+# a forked task executor, which exits without decreasing the live executors
+pid = os.fork()
+if pid == 0:
+    LIVE_EXECUTORS.inc()
+    TASK_RUN_TIME.labels("psi", "PSITransform", "SUCCESS").observe(2)
+    os._exit(0)
+os.waitpid(pid, 0)
+print(client.get("/metrics").get_data(as_text=True))
+print("--- child exit ---")
+child_exit = runpy.run_path(os.path.join(os.environ["SRC_DIR"], "gunicorn.conf.py"))["child_exit"]
+child_exit(None, types.SimpleNamespace(pid=pid))
+print(client.get("/metrics").get_data(as_text=True))
+"""
+
+
+class TestMetrics(unittest.TestCase):
+
+    def _app(self):
+        import flask
+        import monitor
+        from views.default_views import default_views
+        app = flask.Flask(__name__)
+        monitor.init_app(app)
+        app.register_blueprint(default_views)
+        return app.test_client()
+
+    def test_metrics(self):
+        from sqlalchemy import create_engine, text
+        from monitor.metrics import LINK_RTT, observe_db_engine
+        client = self._app()
+        self.assertEqual(client.get("/").status_code, 200)
+        client.get("/missing")
+        engine = create_engine("sqlite://")
+        observe_db_engine(engine)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        LINK_RTT.labels("party_b").set(0.25)
+
+        metrics = client.get("/metrics").get_data(as_text=True)
+        self.assertIn('petplatform_request_latency_seconds_count{method="GET",route="/",status="200"}', metrics)
+        # unmatched paths share one label
+        self.assertIn('route="unmatched",status="404"', metrics)
+        self.assertIn('petplatform_db_query_latency_seconds_count{operation="SELECT"}', metrics)
+        self.assertIn('petplatform_link_rtt_seconds{party="party_b"} 0.25', metrics)
+
+    def test_multiprocess(self):
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": multiproc_dir, "SRC_DIR": SRC_DIR}
+            result = subprocess.run([sys.executable, "-c", textwrap.dedent(MULTIPROCESS_SCRIPT)],
+                                    env=env,
+                                    cwd=SRC_DIR,
+                                    capture_output=True,
+                                    text=True,
+                                    timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        before, after = result.stdout.split("--- child exit ---")
+        # the metrics of the worker and of its executor are aggregated
+        self.assertIn('petplatform_request_latency_seconds_count{method="GET",route="/",status="200"} 1.0', before)
+        self.assertIn('petplatform_task_run_seconds_count{mission="psi",operator="PSITransform",status="SUCCESS"} 1.0',
+                      before)
+        self.assertIn("petplatform_live_executors 1.0", before)
+        # the live gauges of an exited worker are dropped, its counters and histograms are kept
+        self.assertIn("petplatform_live_executors 0.0", after)
+        self.assertIn('petplatform_task_run_seconds_count{mission="psi",operator="PSITransform",status="SUCCESS"} 1.0',
+                      after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import stat
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class CachedPSI:
+    supports_psi_cache = True
+
+
+class TestMissionCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        settings.MISSION_CACHE_DIR = os.path.join(self.tmpdir.name, "cache")
+        get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_acquire_and_rotate(self):
+        from config.mission_cache import MissionCache
+        cache = MissionCache("psi", "psi.party_b", ttl=3600)
+        index = cache.acquire(job_id="j_1")
+        self.assertEqual(stat.S_IMODE(os.stat(index["key_file"]).st_mode), 0o600)
+        self.assertEqual(cache.acquire(job_id="j_2"), index)
+        # a job asking for rotation rotates once
+        rotated = cache.acquire(rotate=True, job_id="j_3")
+        self.assertNotEqual(rotated["generation"], index["generation"])
+        self.assertEqual(cache.acquire(rotate=True, job_id="j_3"), rotated)
+        # only the current and the previous generation are kept
+        cache.rotate()
+        self.assertEqual(len(os.listdir(cache.root)), 2)
+        self.assertFalse(os.path.exists(index["dir"]))
+
+    def test_attach_psi_cache(self):
+        import settings
+        from job_manager.dag import LogicTask
+        from job_manager.task import TaskExecutor
+        task = LogicTask("psi_a", "party_a", {}, "INIT", [], "CachedPSI", __name__)
+        executor = TaskExecutor("psi", "j_1", task)
+        configmap = {"common": {"psi_cache": {"ttl": 60}}, "party_a": {"psi_cache": {"added": "added.csv"}}}
+        executor._attach_psi_cache(configmap, {"party_a", "party_c", "party_b"}, CachedPSI)
+        psi_cache = configmap["party_a"]["psi_cache"]
+        self.assertEqual(psi_cache["added"], "added.csv")
+        self.assertEqual(psi_cache["peers"], ["party_b", "party_c"])
+        self.assertTrue(os.path.isfile(psi_cache["key_file"]))
+        # the next job against the same partners shares the generation
+        configmap = {"common": {"psi_cache": True}}
+        executor._attach_psi_cache(configmap, {"party_a", "party_b", "party_c"}, CachedPSI)
+        self.assertEqual(configmap["party_a"]["psi_cache"]["generation"], psi_cache["generation"])
+
+        # no cache for an operator that does not read it
+        configmap = {"common": {"psi_cache": True}, "party_a": {}}
+        executor._attach_psi_cache(configmap, {"party_a", "party_d"}, TestMissionCache)
+        self.assertEqual(configmap["party_a"], {})
+        self.assertFalse(os.path.exists(os.path.join(settings.MISSION_CACHE_DIR, "psi", "psi.party_d")))
+
+    def test_psi_cache_options(self):
+        from config.mission_cache import get_psi_cache_options
+        self.assertIsNone(get_psi_cache_options({"common": {}}, "party_a"))
+        self.assertEqual(get_psi_cache_options({"common": {"psi_cache": True}}, "party_a"), {})
+        configmap = {"common": {"psi_cache": True}, "party_a": {"psi_cache": {"ttl": 60}}}
+        self.assertEqual(get_psi_cache_options(configmap, "party_a"), {"ttl": 60})
+
+
+if __name__ == '__main__':
+    unittest.main()
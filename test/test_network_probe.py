@@ -0,0 +1,139 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from urllib.parse import parse_qs, urlparse
+
+os.environ["PARTY"] = "party_a"
+
+
+class CountingProber:
+
+    def __init__(self, prober):
+        self.prober = prober
+        self.calls = 0
+
+    def probe(self, party):
+        self.calls += 1
+        return self.prober.probe(party)
+
+
+class ProbeHandler(BaseHTTPRequestHandler):
+    """
+    The index and network probe endpoints of a partner platform.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api/v1/network/probe":
+            body, content_type = os.urandom(int(parse_qs(url.query)["size"][0])), "application/octet-stream"
+        else:
+            body, content_type = json.dumps({"message": "party_b app server is running!"}).encode(), "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestNetworkProbe(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        import settings
+        settings.NETWORK_PROBE_SIMULATE = ""
+        self.tmpdir.cleanup()
+
+    def test_choose_network(self):
+        from network.probe import choose_network
+        lan = {"rtt": 0.001, "throughput": 1e9}
+        wan = {"rtt": 0.08, "throughput": 1e8}
+        self.assertEqual(choose_network({"party_b": lan}), {"scheme": "socket", "channels": 1})
+        # the slowest link decides, 8MB in flight needs two channels of 4MB
+        self.assertEqual(choose_network({"party_b": lan, "party_c": wan}), {"scheme": "agent", "channels": 2})
+        self.assertEqual(choose_network({"party_b": {"rtt": 1, "throughput": 1e9}})["channels"], 4)
+        self.assertEqual(choose_network({}), {"scheme": "agent", "channels": 1})
+
+    def test_probe_cache(self):
+        import settings
+        from network.probe import LinkProbeCache, SimulatedLinkProber, get_prober
+        settings.NETWORK_PROBE_SIMULATE = json.dumps({"default": {"rtt": 0.002, "throughput": 5e8}})
+        self.assertIsInstance(get_prober(), SimulatedLinkProber)
+        prober = CountingProber(get_prober())
+        cache = LinkProbeCache(prober, ttl=60)
+        self.assertEqual(cache.get("party_b")["rtt"], 0.002)
+        # shared with the other executors of the party until it expires
+        self.assertEqual(LinkProbeCache(prober, ttl=60).get("party_b")["throughput"], 5e8)
+        self.assertEqual(prober.calls, 1)
+        cache.get("party_b", refresh=True)
+        self.assertEqual(prober.calls, 2)
+        with self.assertRaises(ValueError):
+            SimulatedLinkProber({}).probe("party_b")
+
+    def test_http_probe(self):
+        from network.probe import HttpLinkProber
+        from network.request import request_manager
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ProbeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        party_address = request_manager.party_address
+        request_manager.party_address = {"party_b": {"address": f"http://127.0.0.1:{server.server_address[1]}"}}
+        level = logging.getLogger().level
+        # the payload of the probe is not json, and must not be parsed as such when logged
+        logging.getLogger().setLevel(logging.DEBUG)
+        try:
+            link = HttpLinkProber().probe("party_b")
+        finally:
+            logging.getLogger().setLevel(level)
+            request_manager.party_address = party_address
+            server.shutdown()
+            server.server_close()
+        self.assertGreater(link["rtt"], 0)
+        self.assertGreater(link["throughput"], 0)
+
+    def test_agree_network(self):
+        from job_manager.barrier import StartBarrier, record_ready
+        from models.job import Job
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_net",
+                    mission_name="psi",
+                    mission_version=1,
+                    job_context=json.dumps({"common": {}}),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        barrier = StartBarrier("j_net", "psi_b", {"psi_a": "party_a"})
+        self.assertIsNone(barrier.network())
+        record_ready(self.session_maker, "j_net", "psi_a", "party_a", 50001, {"scheme": "socket", "channels": 2})
+        self.assertEqual(barrier.network(), {"scheme": "socket", "channels": 2})
+        self.assertEqual(barrier.ports(), {"party_a": 50001})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class TestPartyHealth(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        from network.health import party_health
+        party_health.reset()
+        self.tmpdir.cleanup()
+
+    def test_circuit_breaker(self):
+        from network.health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+        breaker = CircuitBreaker("party_b", failures=3, failure_rate=0.5, window=4, cooldown=60)
+        breaker.record(False, "refused")
+        breaker.record(False, "refused")
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+        breaker.record(False, "refused")
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertTrue(breaker.is_open())
+        self.assertGreater(breaker.retry_after(), 50)
+        self.assertEqual(breaker.snapshot()["last_error"], "refused")
+
+        # one trial call after the cooldown, its failure opens the circuit again
+        breaker.cooldown = 0
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(False, "refused")
+        self.assertEqual(breaker.state, OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+
+        # half of the recent calls failed, a successful ping closes the circuit right away
+        breaker = CircuitBreaker("party_b", failures=3, failure_rate=0.5, window=4, cooldown=60)
+        for success in [True, False, True, False]:
+            breaker.record(success)
+        self.assertEqual(breaker.state, OPEN)
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_fail_fast(self):
+        from exceptions.exceptions import PartyUnavailableError
+        from network.health import party_health
+        from network.request import request_manager
+        party_address = request_manager.party_address
+        request_manager.party_address = {"party_b": {"address": "http://127.0.0.1:1"}}
+        try:
+            for _ in range(3):
+                with self.assertRaises(Exception) as e:
+                    request_manager.submit("party_b", {})
+                self.assertNotIsInstance(e.exception, PartyUnavailableError)
+            with self.assertRaises(PartyUnavailableError):
+                request_manager.submit("party_b", {})
+            with self.assertRaises(PartyUnavailableError) as e:
+                party_health.check(["party_b"])
+            self.assertEqual(e.exception.code, 503)
+            self.assertFalse(request_manager.ping("party_b"))
+        finally:
+            request_manager.party_address = party_address
+
+    def test_outbox(self):
+        from network.outbox import PartyOutbox
+        from network.request import request_manager
+        party_address = request_manager.party_address
+        request_manager.party_address = {"party_b": {"address": "http://127.0.0.1:1"}}
+        try:
+            # notifications of a partner that is down are queued instead of failing the caller
+            request_manager.update_task("party_b", "j_1", "t_1", {"task_status": "SUCCESS"})
+            request_manager.cancel("party_b", "j_2")
+        finally:
+            request_manager.party_address = party_address
+        outbox = PartyOutbox(self.session_maker)
+        self.assertEqual(outbox.pending(), {"party_b": 2})
+
+        sent = []
+
+        def send(party, action, method, endpoint, payload):
+            if len(sent) == 1 and not sent[-1] == "fail":
+                sent.append("fail")
+                raise ConnectionError("still down")
+            sent.append((party, action, method, endpoint, payload))
+
+        # replayed in order, stopping at the first failure
+        self.assertEqual(outbox.flush("party_b", send), 1)
+        self.assertEqual(outbox.pending(), {"party_b": 1})
+        self.assertEqual(outbox.flush("party_b", send), 1)
+        self.assertEqual(outbox.pending(), {})
+        self.assertEqual(sent, [("party_b", "update_task", "PATCH", "api/v1/tasks/j_1/t_1", {
+            "task_status": "SUCCESS"
+        }), "fail", ("party_b", "cancel", "POST", "api/v1/jobs/j_2/cancel", None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
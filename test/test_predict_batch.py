@@ -0,0 +1,186 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class TestPredictBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        from models.mission import Mission
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        settings.SAFE_WORK_DIR = self.tmpdir.name
+        self.session_maker = get_session_maker(create_tables=True)
+        dag = {"operators": [{"name": "predict_a", "party": "party_a"}, {"name": "predict_b", "party": "party_b"}]}
+        with self.session_maker() as session:
+            session.add(Mission(name="xgboost_classifier_predict", version=1, dag=json.dumps(dag)))
+            session.commit()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _write_csv(self, name, rows):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write("id,x\n" + "".join(f"{i},{i * 2}\n" for i in rows))
+        return path
+
+    def _params(self, i, model="model_a.pkl"):
+        return {
+            "mission_name": "xgboost_classifier_predict",
+            "mission_params": {
+                "party_a": {
+                    "inputs": {
+                        "predict_data": self._write_csv(f"data_{i}.csv", range(i + 1)),
+                        "model_path": model
+                    },
+                    "outputs": {
+                        "inference_res_path": os.path.join(self.tmpdir.name, f"result_{i}.csv")
+                    }
+                },
+                "party_b": {
+                    "inputs": {
+                        "predict_data": f"data_{i}_b.csv",
+                        "model_path": "model_b.pkl"
+                    },
+                    "outputs": {
+                        "inference_res_path": f"result_{i}_b.csv"
+                    }
+                }
+            }
+        }
+
+    def test_batches(self):
+        import settings
+        from job_manager.predict_batch import PredictBatcher
+        batcher = PredictBatcher()
+        request_ids = [batcher.submit(self._params(i)) for i in range(3)]
+        other_model = batcher.submit(self._params(3, model="model_c.pkl"))
+        with self.assertRaises(ValueError):
+            batcher.submit({**self._params(4), "mission_name": "psi"})
+
+        settings.PREDICT_BATCH_MAX_REQUESTS = 2
+        # only the full batch is ready until the window has passed
+        batches = batcher.get_ready_batches()
+        self.assertEqual([[r["request_id"] for r in batch] for batch in batches], [request_ids[:2]])
+        batches = batcher.get_ready_batches(datetime.utcnow() + timedelta(seconds=settings.PREDICT_BATCH_WINDOW))
+        self.assertEqual([[r["request_id"] for r in batch] for batch in batches],
+                         [request_ids[:2], request_ids[2:], [other_model]])
+
+        params = batcher.build_params(batches[0])
+        self.assertEqual(params["mission_name"], "xgboost_classifier_predict_batch")
+        party_b = params["mission_params"]["party_b"]
+        self.assertEqual(party_b["inputs"], {"model_path": "model_b.pkl"})
+        self.assertEqual([item["predict_data"] for item in party_b["batch"]], ["data_0_b.csv", "data_1_b.csv"])
+        self.assertEqual(batcher.get(request_ids[0])["status"], "INIT")
+
+    def test_batches_per_user(self):
+        import settings
+        from models.predict_request import PredictRequest
+        from job_manager.predict_batch import PredictBatcher
+        batcher = PredictBatcher()
+        alice = [batcher.submit(self._params(i), "alice") for i in range(2)]
+        bob = batcher.submit(self._params(2), "bob")
+        with self.session_maker() as session:
+            keys = {r.request_id: r.batch_key for r in session.query(PredictRequest)}
+            self.assertEqual(keys[alice[0]], keys[alice[1]])
+            self.assertNotEqual(keys[alice[0]], keys[bob])
+            # even requests sharing a batch key are never merged across users
+            session.query(PredictRequest).filter_by(request_id=bob).update({"batch_key": keys[alice[0]]})
+            session.commit()
+        batches = batcher.get_ready_batches(datetime.utcnow() + timedelta(seconds=settings.PREDICT_BATCH_WINDOW))
+        self.assertEqual([[r["request_id"] for r in batch] for batch in batches], [alice, [bob]])
+        self.assertEqual([{r["user_name"] for r in batch} for batch in batches], [{"alice"}, {"bob"}])
+
+    def test_sync(self):
+        import settings
+        from models.job import Job
+        from job_manager.predict_batch import PredictBatcher
+        batcher = PredictBatcher()
+        request_ids = [batcher.submit(self._params(i)) for i in range(2)]
+        self.assertTrue(batcher._update_requests(request_ids, "INIT", {"status": "RUNNING", "job_id": "j_batch"}))
+        with self.session_maker() as session:
+            context = {"common": {"predict_batch": {"failed": {request_ids[1]: "disk full"}}}, "party_a": {}}
+            session.add(
+                Job(job_id="j_batch",
+                    mission_name="xgboost_classifier_predict_batch",
+                    mission_version=1,
+                    job_context=json.dumps(context),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="SUCCESS"))
+            session.commit()
+        self.assertEqual(batcher.sync(), 2)
+        self.assertEqual(batcher.get(request_ids[0])["status"], "SUCCESS")
+        self.assertEqual(batcher.get(request_ids[1])["errors"], "disk full")
+
+        # the worker submitting a batch died before its job was created
+        orphan = batcher.submit(self._params(2))
+        self.assertTrue(batcher._update_requests([orphan], "INIT", {"status": "RUNNING", "job_id": "j_lost"}))
+        self.assertEqual(batcher.sync(), 0)
+        self.assertEqual(batcher.get(orphan)["status"], "RUNNING")
+        later = datetime.utcnow() + timedelta(seconds=settings.PREDICT_BATCH_SUBMIT_TIMEOUT + 1)
+        self.assertEqual(batcher.sync(later), 1)
+        self.assertEqual(batcher.get(orphan)["status"], "INIT")
+        self.assertIsNone(batcher.get(orphan)["job_id"])
+
+    def test_concat_split(self):
+        from builtin_operators.predict_batch import ConcatInputs, SplitOutputs
+        from config.config_manager import ConfigManager
+        from models.job import Job
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_batch",
+                    mission_name="xgboost_classifier_predict_batch",
+                    mission_version=1,
+                    job_context=json.dumps({
+                        "party_a": {},
+                        "party_b": {},
+                        "common": {}
+                    }),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        batch = [{
+            "request_id": f"p_{i}",
+            "predict_data": self._write_csv(f"data_{i}.csv", range(i, i + 2 + i)),
+            "inference_res_path": os.path.join(self.tmpdir.name, "out", f"result_{i}.csv")
+        } for i in range(2)]
+        merged = os.path.join(self.tmpdir.name, "merged.csv")
+        config_manager = ConfigManager("xgboost_classifier_predict_batch", "j_batch")
+        configmap = {"party_a": {"batch": batch, "outputs": {"data": merged}, "inputs": {"data": merged}}}
+        self.assertTrue(ConcatInputs("party_a", config_manager).run(configmap=configmap))
+        with open(merged) as f:
+            self.assertEqual(f.read().split(), ["id,x", "0,0", "1,2", "1,2", "2,4", "3,6"])
+        # the partner has not published its rows yet
+        config_manager.job_context.set("predict_batch.rows.party_b", [2, 2], party="common")
+        with self.assertRaises(ValueError):
+            SplitOutputs("party_a", config_manager).run(configmap=configmap)
+        config_manager.job_context.set("predict_batch.rows.party_b", [2, 3], party="common")
+        self.assertTrue(SplitOutputs("party_a", config_manager).run(configmap=configmap))
+        with open(batch[1]["inference_res_path"]) as f:
+            self.assertEqual(f.read().split(), ["id,x", "1,2", "2,4", "3,6"])
+
+
+if __name__ == '__main__':
+    unittest.main()
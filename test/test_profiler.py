@@ -0,0 +1,106 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pstats
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class SumOperator:
+
+    def __init__(self, party, n):
+        self.party = party
+        self.n = n
+
+    def square(self, i):
+        return i * i
+
+    def run(self, configmap):
+        return sum(self.square(i) for i in range(self.n)) > 0
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.profile_dir = settings.PROFILE_DIR
+        settings.PROFILE_DIR = os.path.join(self.tmpdir.name, "profiles")
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        import settings
+        settings.PROFILE_DIR = self.profile_dir
+        self.tmpdir.cleanup()
+
+    def _profile(self):
+        from models.task_profile import TaskProfile
+        with self.session_maker() as session:
+            profiles = session.query(TaskProfile).filter_by(job_id="j_1", task_name="sum_a").all()
+            return [p.to_dict() for p in profiles]
+
+    def test_profile_operator(self):
+        import settings
+        from job_manager.profiler import OperatorProfiler
+        profiler = OperatorProfiler("j_1", "sum_a", top=5)
+        self.assertTrue(profiler.run(SumOperator("party_a", 1000).run, configmap={}))
+        profiler.save()
+
+        profiles = self._profile()
+        self.assertEqual(len(profiles), 1)
+        artifact, top = profiles[0]["artifact"], profiles[0]["top_functions"]
+        self.assertEqual(artifact, os.path.join(settings.PROFILE_DIR, "j_1", "sum_a.prof"))
+        # the raw stats load with pstats
+        self.assertTrue(pstats.Stats(artifact).stats)
+        # the top functions by cumulative time, the operator first
+        self.assertEqual(len(top), 5)
+        self.assertEqual([t["cumtime"] for t in top], sorted([t["cumtime"] for t in top], reverse=True))
+        self.assertTrue(top[0]["function"].endswith("(run)"))
+        square = [t for t in top if t["function"].endswith("(square)")]
+        self.assertEqual(square[0]["ncalls"], 1000)
+
+        # a rerun replaces the profile of the task
+        profiler = OperatorProfiler("j_1", "sum_a", top=2)
+        self.assertTrue(profiler.run(SumOperator("party_a", 10).run, configmap={}))
+        profiler.save()
+        profiles = self._profile()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(len(profiles[0]["top_functions"]), 2)
+
+    def test_profile_failed_operator(self):
+        from job_manager.profiler import OperatorProfiler
+        profiler = OperatorProfiler("j_1", "sum_a")
+        with self.assertRaises(TypeError):
+            profiler.run(SumOperator("party_a", None).run, configmap={})
+        profiler.save()
+        # the profile of a failed run is kept too
+        self.assertEqual(len(self._profile()), 1)
+
+    def test_is_profiling_enabled(self):
+        from job_manager.profiler import is_profiling_enabled
+        self.assertFalse(is_profiling_enabled({"common": {}, "party_a": {}}, "party_a"))
+        self.assertFalse(is_profiling_enabled({}, "party_a"))
+        self.assertTrue(is_profiling_enabled({"common": {"profile": True}}, "party_a"))
+        self.assertTrue(is_profiling_enabled({"party_a": {"profile": True}}, "party_a"))
+        # only the party asking for it is profiled
+        self.assertFalse(is_profiling_enabled({"party_b": {"profile": True}}, "party_a"))
+        self.assertFalse(is_profiling_enabled({"common": {"profile": False}}, "party_a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+@unittest.skipUnless(os.path.isdir("/proc"), "requires procfs")
+class TestResourceSampler(unittest.TestCase):
+
+    def test_process_tree(self):
+        from utils.proc_utils import get_process_tree
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(2)"])
+        try:
+            tree = get_process_tree(os.getpid())
+            self.assertEqual(tree[0], os.getpid())
+            self.assertIn(child.pid, tree)
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_process_tree_without_children_files(self):
+        from unittest import mock
+        from utils import proc_utils
+        # a grandchild, found through the children of the child
+        child = subprocess.Popen([
+            sys.executable, "-c", "import subprocess, sys; subprocess.run([sys.executable, '-c', "
+            "'import time; time.sleep(2)'])"
+        ])
+        try:
+            deadline = time.time() + 5
+            while not proc_utils.get_children(child.pid) and time.time() < deadline:
+                time.sleep(0.05)
+            grandchildren = proc_utils.get_children(child.pid)
+            self.assertEqual(len(grandchildren), 1)
+            with mock.patch.object(proc_utils, "HAS_CHILDREN_FILES", False):
+                self.assertEqual(proc_utils.get_children(child.pid), grandchildren)
+                tree = proc_utils.get_process_tree(os.getpid())
+            self.assertEqual(tree[0], os.getpid())
+            self.assertLess(tree.index(child.pid), tree.index(grandchildren[0]))
+            self.assertEqual(proc_utils.get_process_tree(child.pid), [child.pid, grandchildren[0]])
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_sampler(self):
+        from job_manager.resource import ResourceSampler
+        sampler = ResourceSampler(interval=0.01, max_samples=8)
+        sampler.start()
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            sum(i * i for i in range(1000))
+        summary = sampler.stop()
+        self.assertGreater(summary["cpu_seconds"], 0)
+        self.assertGreater(summary["peak_rss"], 0)
+        # the series is downsampled to stay under the limit
+        self.assertLess(len(sampler.samples), 8)
+        self.assertEqual(len(sampler.samples[0]), 7)
+
+    def test_peak_rss_of_earlier_task(self):
+        from job_manager.resource import ResourceSampler
+        from utils.proc_utils import read_process_stats
+        # an earlier task of a long-lived executor raised the high water mark of the process
+        blob = b"x" * (256 * 1024**2)
+        del blob
+        sampler = ResourceSampler(interval=0.01)
+        sampler.start()
+        time.sleep(0.1)
+        summary = sampler.stop()
+        self.assertGreater(summary["peak_rss"], 0)
+        self.assertLess(summary["peak_rss"], read_process_stats(os.getpid())["peak_rss"])
+
+
+if __name__ == '__main__':
+    unittest.main()
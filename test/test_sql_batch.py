@@ -0,0 +1,177 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class TestSQLBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.mission_cache_dir = settings.MISSION_CACHE_DIR
+        settings.MISSION_CACHE_DIR = os.path.join(self.tmpdir.name, "cache")
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        import settings
+        settings.MISSION_CACHE_DIR = self.mission_cache_dir
+        self.tmpdir.cleanup()
+
+    def test_expand_foreach(self):
+        from job_manager.sweep import expand_dag
+        dag = {
+            "operators": [{
+                "name": "plan_a",
+                "party": "party_a"
+            }, {
+                "name": "query_a",
+                "party": "party_a",
+                "foreach": "queries",
+                "depends": ["plan_a"],
+                "configmap": {
+                    "common": {
+                        "query_index": "${sweep.index}"
+                    }
+                }
+            }]
+        }
+        queries = [{"name": "q0", "sql": "SELECT 1"}, {"name": "q1", "sql": "SELECT 2"}, {"sql": "SELECT 3"}]
+        expanded = {o["name"]: o for o in expand_dag(dag, {"queries": queries, "parallelism": 2})["operators"]}
+        self.assertEqual(expanded["query_a.1"]["configmap"]["common"], {
+            "query_index": "1",
+            "name": "q1",
+            "sql": "SELECT 2"
+        })
+        self.assertEqual(expanded["query_a.2"]["depends"], ["plan_a", "query_a.0"])
+        self.assertNotIn("foreach", expanded["query_a.0"])
+        with self.assertRaises(ValueError):
+            expand_dag(dag, {"queries": []})
+
+    def test_query_key(self):
+        from builtin_operators.sql_batch import query_key
+        hashes = {"party_a": ["a"], "party_b": ["b"]}
+        key = query_key("SELECT 1", {"mode": "memory", "table_url": {"t": "data/t.csv"}}, hashes)
+        # the local paths of a party do not change the key, the inputs do
+        self.assertEqual(key, query_key("SELECT 1 ", {"mode": "memory", "table_url": {"t": "/work/t.csv"}}, hashes))
+        self.assertNotEqual(key, query_key("SELECT 1", {"mode": "memory"}, {"party_a": ["c"], "party_b": ["b"]}))
+        self.assertNotEqual(key, query_key("SELECT 2", {"mode": "memory"}, hashes))
+
+    def test_query_config_merged(self):
+        from builtin_operators.sql_batch import common_query_key, merge_query
+        from job_manager.sweep import expand_dag
+        shared = {"mode": "memory", "table_url": {"t": "data/t.csv"}, "options": {"a": 1, "b": 2}}
+        queries = [{"name": "q0", "sql": "SELECT 1", "config": {"options": {"b": 3}}}]
+        dag = {
+            "operators": [{
+                "name": "query_a",
+                "party": "party_a",
+                "foreach": "queries",
+                "configmap": {
+                    "common": {
+                        "config": shared
+                    }
+                }
+            }]
+        }
+        common = expand_dag(dag, {"queries": queries})["operators"][0]["configmap"]["common"]
+        # the config of a query only overrides the fields it sets
+        self.assertEqual(common["config"], {**shared, "options": {"a": 1, "b": 3}})
+        self.assertEqual(shared["options"], {"a": 1, "b": 2})
+
+        # the planning stage and the query derive the same key
+        hashes = {"party_a": ["a"], "party_b": ["b"]}
+        planned = merge_query({"config": shared, "queries": queries}, queries[0])
+        self.assertEqual(common_query_key(planned, hashes), common_query_key(common, hashes))
+        unmerged = {"config": shared, "sql": "SELECT 1"}
+        self.assertNotEqual(common_query_key(planned, hashes), common_query_key(unmerged, hashes))
+
+    def test_cached_query(self):
+        from builtin_operators.sql_batch import CachedPETSQL, SQLHashInputs, SQLPlanQueries, hash_file, query_key
+        from config.config_manager import ConfigManager
+        from models.job import Job
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_sql",
+                    mission_name="sql_batch",
+                    mission_version=1,
+                    job_context=json.dumps({
+                        "party_a": {},
+                        "party_b": {},
+                        "common": {}
+                    }),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        path = self.tmpdir.name
+        with open(os.path.join(path, "table_a.csv"), "w") as f:
+            f.write("id1,f1\n1,2\n")
+        config = {"mode": "memory", "task_id": "t"}
+        configmap = {
+            "common": {
+                "config": config,
+                "queries": [{
+                    "name": "q0",
+                    "sql": "SELECT 1"
+                }]
+            },
+            "party_a": {
+                "inputs": {
+                    "data": [os.path.join(path, "table_a.csv")]
+                },
+                "outputs": {
+                    "data": [os.path.join(path, "result_{name}.csv")]
+                }
+            }
+        }
+        config_manager = ConfigManager("sql_batch", "j_sql")
+        self.assertTrue(SQLHashInputs("party_a", config_manager).run(configmap=configmap))
+        config_manager.job_context.set("sql_batch.inputs.party_b", ["b"], party="common")
+        hashes = {"party_a": [hash_file(os.path.join(path, "table_a.csv"))], "party_b": ["b"]}
+        self.assertEqual(config_manager.job_context.get("sql_batch.inputs", party="common"), hashes)
+        self.assertTrue(SQLPlanQueries("party_a", config_manager).run(configmap=configmap))
+        self.assertEqual(config_manager.job_context.get("sql_batch.cached.party_a", party="common"), [])
+
+        # a result cached by an earlier job of the same query and inputs
+        key = query_key("SELECT 1", config, hashes)
+        with open(os.path.join(path, "earlier.csv"), "w") as f:
+            f.write("f1\n2\n")
+        CachedPETSQL._store(
+            CachedPETSQL("party_a", config_manager).cache.acquire(), key, [os.path.join(path, "earlier.csv")])
+        self.assertTrue(SQLPlanQueries("party_a", config_manager).run(configmap=configmap))
+        self.assertEqual(config_manager.job_context.get("sql_batch.cached.party_a", party="common"), [key])
+        config_manager.job_context.set("sql_batch.cached.party_b", [key], party="common")
+
+        query_configmap = {
+            "common": {
+                "config": config,
+                "name": "q0",
+                "sql": "SELECT 1"
+            },
+            "party_a": configmap["party_a"]
+        }
+        self.assertTrue(CachedPETSQL("party_a", config_manager).run(configmap=query_configmap))
+        with open(os.path.join(path, "result_q0.csv")) as f:
+            self.assertEqual(f.read(), "f1\n2\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
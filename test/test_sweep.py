@@ -0,0 +1,176 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import tempfile
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_expand_candidates(self):
+        from job_manager.sweep import expand_candidates
+        candidates = expand_candidates({"grid": {"max_depth": [2, 3], "learning_rate": [0.1, 0.3]}})
+        self.assertEqual(candidates[1], {"learning_rate": 0.1, "max_depth": 3})
+        self.assertEqual(len(candidates), 4)
+        spec = {
+            "random": {
+                "max_depth": {
+                    "min": 2,
+                    "max": 6,
+                    "int": True
+                },
+                "learning_rate": {
+                    "min": 0.01,
+                    "max": 0.3,
+                    "log": True
+                }
+            },
+            "n_candidates": 5,
+            "seed": 7
+        }
+        # every party expands the same candidates
+        self.assertEqual(expand_candidates(spec), expand_candidates(spec))
+        self.assertTrue(all(2 <= c["max_depth"] <= 6 for c in expand_candidates(spec)))
+        with self.assertRaises(ValueError):
+            expand_candidates({"grid": {"max_depth": list(range(1000))}})
+
+    def test_expand_dag(self):
+        from job_manager.sweep import expand_dag
+        dag = {
+            "operators": [
+                {
+                    "name": "psi_a",
+                    "party": "party_a"
+                },
+                {
+                    "name": "fit_a",
+                    "party": "party_a",
+                    "sweep": True,
+                    "depends": ["psi_a"],
+                    "configmap": {
+                        "outputs": {
+                            "model_path": "model_${sweep.index}.pkl"
+                        }
+                    }
+                },
+                {
+                    "name": "predict_a",
+                    "party": "party_a",
+                    "sweep": True,
+                    "depends": ["fit_a"]
+                },
+                {
+                    "name": "report_a",
+                    "party": "party_a",
+                    "depends": ["predict_a"]
+                },
+            ]
+        }
+        # missions without sweep operators are left as they are
+        plain = {"operators": dag["operators"][:1]}
+        self.assertIs(expand_dag(plain, {}), plain)
+        expanded = {
+            o["name"]: o for o in expand_dag(dag, {"sweep": {
+                "grid": {
+                    "max_depth": [2, 3, 4]
+                },
+                "parallelism": 2
+            }})["operators"]
+        }
+        self.assertEqual(len(expanded), 8)
+        self.assertEqual(expanded["fit_a.1"]["configmap"], {
+            "outputs": {
+                "model_path": "model_1.pkl"
+            },
+            "common": {
+                "max_depth": 3
+            }
+        })
+        self.assertEqual(expanded["predict_a.2"]["depends"], ["fit_a.2"])
+        # the third candidate waits for the first one
+        self.assertEqual(expanded["fit_a.2"]["depends"], ["psi_a", "fit_a.0", "predict_a.0"])
+        self.assertEqual(expanded["report_a"]["depends"], ["predict_a.0", "predict_a.1", "predict_a.2"])
+
+    def test_evaluate_report(self):
+        from builtin_operators.sweep import SweepEvaluate, SweepReport, compute_metric
+        from config.config_manager import ConfigManager
+        from models.job import Job
+        self.assertEqual(compute_metric("auc", [0, 0, 1, 1], [0.1, 0.4, 0.35, 0.8]), 0.75)
+        self.assertEqual(compute_metric("mae", [1, 2], [2, 2]), 0.5)
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_sweep",
+                    mission_name="xgboost_classifier_sweep",
+                    mission_version=1,
+                    job_context=json.dumps({
+                        "party_a": {},
+                        "party_b": {},
+                        "common": {}
+                    }),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        path = self.tmpdir.name
+        with open(os.path.join(path, "valid.csv"), "w") as f:
+            f.write("id,label\n0,0\n1,0\n2,1\n3,1\n")
+        for index, scores in enumerate([[0.1, 0.4, 0.35, 0.8], [0.1, 0.2, 0.7, 0.8]]):
+            with open(os.path.join(path, f"predict_{index}.csv"), "w") as f:
+                f.write("id,score\n" + "".join(f"{i},{s}\n" for i, s in enumerate(scores)))
+            with open(os.path.join(path, f"model_{index}.pkl"), "w") as f:
+                f.write(f"model {index}")
+        configmap = {
+            "common": {
+                "sweep": {
+                    "grid": {
+                        "max_depth": [2, 3]
+                    }
+                }
+            },
+            "party_a": {
+                "inputs": {
+                    "predict_data": os.path.join(path, "valid.csv"),
+                    "predictions": os.path.join(path, "predict_{index}.csv"),
+                    "models": os.path.join(path, "model_{index}.pkl")
+                },
+                "outputs": {
+                    "model_path": os.path.join(path, "best.pkl"),
+                    "report": os.path.join(path, "report.json")
+                }
+            }
+        }
+        config_manager = ConfigManager("xgboost_classifier_sweep", "j_sweep")
+        self.assertTrue(SweepEvaluate("party_a", config_manager).run(configmap=configmap))
+        self.assertTrue(SweepReport("party_a", config_manager).run(configmap=configmap))
+        with open(os.path.join(path, "best.pkl")) as f:
+            self.assertEqual(f.read(), "model 1")
+        with open(os.path.join(path, "report.json")) as f:
+            self.assertEqual(json.load(f)["best"]["params"], {"max_depth": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
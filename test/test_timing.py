@@ -0,0 +1,96 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ["PARTY"] = "party_a"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def _timings(self, task_name="psi_a"):
+        from job_manager.timing import get_job_timings
+        with self.session_maker() as session:
+            return get_job_timings(session, "j_1").get(task_name, {})
+
+    def test_mark_flush(self):
+        from job_manager.timing import Phase, TaskTimer
+        timer = TaskTimer("j_1", "psi_a")
+        timer.mark(Phase.SCHEDULED)
+        timer.mark(Phase.PROCESS_STARTED)
+        # marks are buffered until flushed
+        self.assertEqual(self._timings(), {})
+        timer.flush()
+        self.assertEqual(list(self._timings()), [Phase.SCHEDULED, Phase.PROCESS_STARTED])
+
+        # a later flush adds its marks and replaces the ones marked again, in the order they happened
+        first = self._timings()[Phase.PROCESS_STARTED]
+        timer.mark(Phase.PROCESS_STARTED)
+        timer.mark(Phase.RUN_STARTED)
+        timer.flush()
+        timings = self._timings()
+        self.assertEqual(list(timings), [Phase.SCHEDULED, Phase.PROCESS_STARTED, Phase.RUN_STARTED])
+        self.assertGreaterEqual(timings[Phase.PROCESS_STARTED], first)
+        self.assertEqual(self._timings("psi_b"), {})
+
+        # a rerun drops the marks of the previous run
+        timer = TaskTimer("j_1", "psi_a")
+        timer.mark(Phase.SCHEDULED)
+        timer.flush(reset=True)
+        self.assertEqual(list(self._timings()), [Phase.SCHEDULED])
+        # nothing left to write
+        timer.flush()
+        self.assertEqual(list(self._timings()), [Phase.SCHEDULED])
+
+    def test_cli_timings(self):
+        from click.testing import CliRunner
+        from client.cli import cli
+        start = datetime(2024, 1, 1)
+        # phases sorted by name, as the server serializes them
+        timings = {
+            "operator_run_finished": (start + timedelta(seconds=3)).isoformat(),
+            "operator_run_started": (start + timedelta(seconds=1)).isoformat(),
+            "scheduled": start.isoformat()
+        }
+        job = {"job_id": "j_1", "task_details": [{"name": "psi_a", "timings": json.loads(json.dumps(timings))}]}
+        with mock.patch.dict(os.environ, {"SERVER_URL": "http://127.0.0.1:1", "JWT_TOKEN": "token"}), \
+                mock.patch("client.cli.PlatformClient") as client_class:
+            client_class.return_value.get.return_value = job
+            result = CliRunner().invoke(cli, ["get-job", "j_1", "--timings"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        lines = [line.split() for line in result.output.splitlines()[2:]]
+        # durations between the phases in the order they happened
+        self.assertEqual(
+            lines, [["operator_run_started", "+1.000s"], ["operator_run_finished", "+2.000s"], ["total", "3.000s"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# Copyright 2024 TikTok Pte. Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+os.environ["PARTY"] = "party_a"
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    payloads = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        CollectorHandler.payloads.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trace_exporter, self.trace_file = settings.TRACE_EXPORTER, settings.TRACE_FILE
+        settings.TRACE_FILE = os.path.join(self.tmpdir.name, "traces.jsonl")
+
+    def tearDown(self) -> None:
+        import settings
+        settings.TRACE_EXPORTER, settings.TRACE_FILE = self.trace_exporter, self.trace_file
+        self.tmpdir.cleanup()
+
+    def _tracer(self, exporter):
+        import settings
+        from tracing.tracer import Tracer
+        settings.TRACE_EXPORTER = exporter
+        return Tracer()
+
+    def _exported(self):
+        with open(os.path.join(self.tmpdir.name, "traces.jsonl")) as f:
+            return [json.loads(line) for line in f]
+
+    def test_traceparent(self):
+        tracer = self._tracer("none")
+        self.assertEqual(tracer.extract({"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}), (TRACE_ID, PARENT_ID))
+        for header in ["", f"01-{TRACE_ID}-{PARENT_ID}-01", f"00-{TRACE_ID.upper()}-{PARENT_ID}-01", "00-abc-def-01"]:
+            self.assertEqual(tracer.extract({"traceparent": header}), (None, None))
+        self.assertEqual(tracer.extract({}), (None, None))
+
+        # nothing to inject outside of a trace
+        self.assertEqual(tracer.inject({}), {})
+        with tracer.span("root", trace_id=TRACE_ID) as span:
+            headers = tracer.inject({"Content-Type": "application/json"})
+            self.assertEqual(headers["traceparent"], f"00-{TRACE_ID}-{span.span_id}-01")
+            self.assertEqual(tracer.extract(headers), (TRACE_ID, span.span_id))
+
+    def test_child_span(self):
+        tracer = self._tracer("none")
+        # no orphan traces outside of a span
+        with tracer.child_span("orphan") as span:
+            self.assertIsNone(span)
+            self.assertIsNone(tracer.current_span)
+
+        with tracer.span("root") as root:
+            self.assertTrue(root.is_root)
+            with tracer.child_span("child") as child:
+                self.assertIs(tracer.current_span, child)
+                self.assertEqual((child.trace_id, child.parent_id), (root.trace_id, root.span_id))
+                self.assertFalse(child.is_root)
+                with tracer.child_span("grandchild") as grandchild:
+                    self.assertEqual(grandchild.parent_id, child.span_id)
+                self.assertIs(tracer.current_span, child)
+            self.assertIs(tracer.current_span, root)
+
+            # a thread running in a copy of the context continues the trace
+            spans = []
+
+            def work():
+                with tracer.child_span("thread") as span:
+                    spans.append(span)
+
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(work,))
+            thread.start()
+            thread.join()
+            self.assertEqual(spans[0].parent_id, root.span_id)
+            self.assertIs(tracer.current_span, root)
+        self.assertIsNone(tracer.current_span)
+
+    def test_file_exporter(self):
+        tracer = self._tracer("file")
+        with tracer.span("root", trace_id=TRACE_ID) as root:
+            with tracer.child_span("child", attributes={"task": "psi_a"}):
+                pass
+            # buffered until the root span ends
+            self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "traces.jsonl")))
+        with self.assertRaises(RuntimeError):
+            with tracer.span("failed"):
+                raise RuntimeError("boom")
+
+        spans = self._exported()
+        self.assertEqual([s["name"] for s in spans], ["child", "root", "failed"])
+        self.assertEqual(spans[0]["parent_id"], root.span_id)
+        self.assertEqual(spans[0]["attributes"], {"task": "psi_a"})
+        self.assertEqual({s["trace_id"] for s in spans[:2]}, {TRACE_ID})
+        self.assertEqual(spans[1]["party"], "party_a")
+        self.assertGreaterEqual(spans[1]["end_time"], spans[0]["end_time"])
+        self.assertEqual(spans[2]["error"], "boom")
+
+    def test_otlp_exporter(self):
+        import settings
+        server = ThreadingHTTPServer(("127.0.0.1", 0), CollectorHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.trace_otlp_endpoint = settings.TRACE_OTLP_ENDPOINT
+        settings.TRACE_OTLP_ENDPOINT = f"http://127.0.0.1:{server.server_address[1]}/"
+        try:
+            tracer = self._tracer("otlp")
+            with tracer.span("root", trace_id=TRACE_ID):
+                with tracer.child_span("child", attributes={"rows": 10}):
+                    pass
+        finally:
+            settings.TRACE_OTLP_ENDPOINT = self.trace_otlp_endpoint
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(len(CollectorHandler.payloads), 1)
+        path, payload = CollectorHandler.payloads[0]
+        self.assertEqual(path, "/v1/traces")
+        resource_spans = payload["resourceSpans"][0]
+        self.assertIn({"key": "party", "value": {"stringValue": "party_a"}}, resource_spans["resource"]["attributes"])
+        child, root = resource_spans["scopeSpans"][0]["spans"]
+        self.assertEqual((child["traceId"], child["parentSpanId"]), (TRACE_ID, root["spanId"]))
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(child["attributes"], [{"key": "rows", "value": {"stringValue": "10"}}])
+        self.assertEqual(root["status"], {"code": 1})
+
+    def test_request_span(self):
+        import sys
+        from flask import Flask
+        # the package exports the tracer instance under the name of its module
+        tracing = sys.modules["tracing.tracer"]
+        tracer = self._tracer("file")
+        app = Flask(__name__)
+        app.add_url_rule("/ping", "ping", lambda: "pong")
+        tracing_tracer = tracing.tracer
+        tracing.tracer = tracer
+        try:
+            tracing.init_app(app)
+            response = app.test_client().get("/ping", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+        finally:
+            tracing.tracer = tracing_tracer
+        # the request continues the trace of the caller
+        span = self._exported()[0]
+        self.assertEqual((span["name"], span["trace_id"], span["parent_id"]), ("GET /ping", TRACE_ID, PARENT_ID))
+        self.assertEqual(span["attributes"]["http.status_code"], 200)
+        self.assertEqual(response.headers["traceparent"], f"00-{TRACE_ID}-{span['span_id']}-01")
+
+
+class TestJobContext(unittest.TestCase):
+
+    def setUp(self) -> None:
+        import settings
+        from extensions import get_session_maker
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings.PLATFORM_DB_URI = f"sqlite:///{self.tmpdir.name}/petplatform.db"
+        self.session_maker = get_session_maker(create_tables=True)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_get_all(self):
+        from config.job_context import JobContext
+        from models.job import Job
+        context = {"party_a": {"inputs": ["a.csv"]}, "party_b": {}, "common": {"trace_id": TRACE_ID}}
+        with self.session_maker() as session:
+            session.add(
+                Job(job_id="j_1",
+                    mission_name="psi",
+                    mission_version=1,
+                    job_context=json.dumps(context),
+                    main_party="party_a",
+                    join_parties=json.dumps(["party_a", "party_b"]),
+                    status="RUNNING"))
+            session.commit()
+        job_context = JobContext("j_1")
+        self.assertEqual(job_context.get_all(), context)
+        # every party, not only the local one and common
+        job_context.set("outputs", ["b.csv"], party="party_b")
+        self.assertEqual(job_context.get_all()["party_b"], {"outputs": ["b.csv"]})
+        with self.assertRaises(ValueError):
+            JobContext("j_2").get_all()
+
+
+if __name__ == '__main__':
+    unittest.main()